@@ -0,0 +1,51 @@
+"""
+Compare the per-sample cost of the /proc fast path against psutil.
+
+Run from the repository root:
+
+    python -m benchmarks.procfs_benchmark [--samples N]
+"""
+import argparse
+import timeit
+from monitors import procfs
+from monitors.cpu_monitor import CPUMonitor
+from monitors.memory_monitor import MemoryMonitor
+from monitors.storage_monitor import StorageMonitor
+from monitors.network_monitor import NetworkMonitor
+
+# (label, monitor class, method sampled every tick)
+CASES = [
+    ("CPU usage", CPUMonitor, 'get_cpu_percent'),
+    ("Memory + swap", MemoryMonitor, 'get_all_info'),
+    ("Disk I/O", StorageMonitor, 'get_disk_io'),
+    ("Network I/O", NetworkMonitor, 'get_network_io')
+]
+
+
+def time_sample(monitor, method, samples):
+    """Get the average cost of one call in microseconds"""
+    call = getattr(monitor, method)
+    call()
+    return timeit.timeit(call, number=samples) / samples * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--samples', type=int, default=2000,
+                        help="calls timed per monitor and backend")
+    args = parser.parse_args()
+
+    if not procfs.available():
+        print("procfs is not available on this platform; nothing to compare")
+        return
+
+    print(f"{'Metric':<16}{'psutil (us)':>14}{'procfs (us)':>14}{'speed-up':>10}")
+    for label, monitor_class, method in CASES:
+        psutil_cost = time_sample(monitor_class('psutil'), method, args.samples)
+        procfs_cost = time_sample(monitor_class('procfs'), method, args.samples)
+        print(f"{label:<16}{psutil_cost:>14.1f}{procfs_cost:>14.1f}"
+              f"{psutil_cost / procfs_cost:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
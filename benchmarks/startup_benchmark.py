@@ -0,0 +1,116 @@
+"""
+Measure how long the dashboard takes to start.
+
+Each run launches a fresh interpreter that imports main_window, shows the
+main window and quits once the first system snapshot has been displayed.
+Reported times are measured from the moment the process was launched.
+Run from the repository root:
+
+    python -m benchmarks.startup_benchmark [--runs N] [--offscreen] [--max-first-frame MS]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Milestones reported by the child process, in order
+MILESTONES = ('imported', 'first_frame', 'first_snapshot')
+
+
+def child():
+    """Start the dashboard and print the time.time() of each milestone"""
+    from PyQt6.QtCore import QEvent, QObject, QTimer
+    from PyQt6.QtWidgets import QApplication
+    import main_window
+    print('imported', time.time(), flush=True)
+
+    class FirstPaint(QObject):
+        """Reports the first paint of the main window"""
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Type.Paint and not self.seen:
+                self.seen = True
+                print('first_frame', time.time(), flush=True)
+                # Nothing but the dashboard itself should be loaded by now
+                eager = [name for name, _ in main_window.MONITOR_WINDOWS.values()
+                         if name in sys.modules]
+                print('eager_windows', len(eager), flush=True)
+            return False
+
+    app = QApplication(sys.argv)
+    window = main_window.MainWindow()
+    first_paint = FirstPaint()
+    first_paint.seen = False
+    window.installEventFilter(first_paint)
+
+    update_info = window.update_info
+
+    def on_first_snapshot(info):
+        update_info(info)
+        print('first_snapshot', time.time(), flush=True)
+        QTimer.singleShot(0, app.quit)
+    window.update_info = on_first_snapshot
+
+    window.show()
+    app.exec()
+
+
+def run_once(offscreen):
+    """Launch one child and return the milestone times in milliseconds"""
+    env = dict(os.environ)
+    if offscreen:
+        env['QT_QPA_PLATFORM'] = 'offscreen'
+    start = time.time()
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.startup_benchmark', '--child'],
+                            env=env, capture_output=True, text=True, timeout=60,
+                            check=True).stdout
+
+    results = {}
+    for line in output.splitlines():
+        name, _, value = line.partition(' ')
+        if name in MILESTONES:
+            results[name] = (float(value) - start) * 1000
+        elif name == 'eager_windows':
+            results[name] = int(value)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help="number of launches")
+    parser.add_argument('--offscreen', action='store_true',
+                        help="use Qt's offscreen platform (no display needed)")
+    parser.add_argument('--max-first-frame', type=float, default=None,
+                        help="exit with an error if the median time to first frame "
+                             "exceeds this many milliseconds")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return 0
+
+    runs = [run_once(args.offscreen) for _ in range(args.runs)]
+
+    print(f"{'Milestone':<16}{'median (ms)':>14}{'min (ms)':>12}{'max (ms)':>12}")
+    for milestone in MILESTONES:
+        times = [run[milestone] for run in runs if milestone in run]
+        if times:
+            print(f"{milestone:<16}{statistics.median(times):>14.1f}"
+                  f"{min(times):>12.1f}{max(times):>12.1f}")
+
+    status = 0
+    if any(run.get('eager_windows') for run in runs):
+        print("Regression: monitor windows were imported before the first frame")
+        status = 1
+    first_frame = statistics.median(run['first_frame'] for run in runs)
+    if args.max_first_frame is not None and first_frame > args.max_first_frame:
+        print(f"Regression: first frame took {first_frame:.1f} ms "
+              f"(limit {args.max_first_frame:.1f} ms)")
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,12 +6,8 @@ from PyQt6.QtGui import QIcon, QPixmap, QPainter, QFont
 import platform
 import psutil
 import os
+import importlib
 from datetime import datetime
-from monitor_windows.cpu_window import CPUWindow
-from monitor_windows.memory_window import MemoryWindow
-from monitor_windows.storage_window import StorageWindow
-from monitor_windows.process_window import ProcessWindow
-from monitor_windows.network_window import NetworkWindow
 
 def create_emoji_icon(emoji, size=32):
     """Create a QIcon from an emoji character"""
@@ -79,21 +75,22 @@ class SystemInfoWindow(QMainWindow):
         self.timer.timeout.connect(self.update_dynamic_info)
         self.timer.start(1000)  # Update every second
         
-        # Initial update
-        self.update_dynamic_info()
+        # Initial update, once the event loop has painted the window
+        QTimer.singleShot(0, self.update_dynamic_info)
 
     def create_navigation_buttons(self, parent_layout):
         """Create navigation button section"""
         nav_group = QGroupBox("Detailed Monitors")
         nav_layout = QHBoxLayout()
         
-        # Define buttons with their respective window classes
+        # Define buttons with the module and class of their windows, which
+        # are only imported when first opened
         buttons = [
-            ("CPU Monitor", 'cpu', CPUWindow),
-            ("Memory Monitor", 'memory', MemoryWindow),
-            ("Storage Monitor", 'storage', StorageWindow),
-            ("Process Monitor", 'process', ProcessWindow),
-            ("Network Monitor", 'network', NetworkWindow)
+            ("CPU Monitor", 'cpu', ('monitor_windows.cpu_window', 'CPUWindow')),
+            ("Memory Monitor", 'memory', ('monitor_windows.memory_window', 'MemoryWindow')),
+            ("Storage Monitor", 'storage', ('monitor_windows.storage_window', 'StorageWindow')),
+            ("Process Monitor", 'process', ('monitor_windows.process_window', 'ProcessWindow')),
+            ("Network Monitor", 'network', ('monitor_windows.network_window', 'NetworkWindow'))
         ]
         
         for btn_text, key, window_class in buttons:
@@ -107,6 +104,8 @@ class SystemInfoWindow(QMainWindow):
     def show_monitor_window(self, key, window_class):
         """Show or create and show a monitor window"""
         if not self.monitor_windows[key]:
+            module_name, class_name = window_class
+            window_class = getattr(importlib.import_module(module_name), class_name)
             self.monitor_windows[key] = window_class()
         self.monitor_windows[key].show()
         self.monitor_windows[key].activateWindow()
@@ -1,18 +1,22 @@
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                           QHBoxLayout, QLabel, QPushButton, QGroupBox)
+                           QHBoxLayout, QLabel, QPushButton, QGroupBox, QComboBox)
 from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QIcon, QFont, QPainter, QPixmap
+import argparse
+import importlib
 import sys
 from datetime import datetime
-import platform
-import psutil
 import os
-from monitors.system_monitor import SystemMonitor
-from monitor_windows.cpu_window import CPUWindow
-from monitor_windows.memory_window import MemoryWindow
-from monitor_windows.storage_window import StorageWindow
-from monitor_windows.network_window import NetworkWindow
-from monitor_windows.process_window import ProcessWindow
+
+# Module and class of each monitor window. They are imported the first time
+# their window is opened so that the dashboard starts without them.
+MONITOR_WINDOWS = {
+    'cpu': ('monitor_windows.cpu_window', 'CPUWindow'),
+    'memory': ('monitor_windows.memory_window', 'MemoryWindow'),
+    'storage': ('monitor_windows.storage_window', 'StorageWindow'),
+    'network': ('monitor_windows.network_window', 'NetworkWindow'),
+    'process': ('monitor_windows.process_window', 'ProcessWindow')
+}
 
 def create_emoji_icon(emoji, size=32):
         """Create a QIcon from an emoji character"""
@@ -30,23 +34,24 @@ def create_emoji_icon(emoji, size=32):
         return QIcon(pixmap)
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, remote_hosts=(), token=None):
         super().__init__()
         self.setWindowTitle("System Resource Monitor")
         self.setMinimumSize(800, 600)
         self.setWindowIcon(create_emoji_icon('💻'))
         
-        # Initialize system monitor
-        self.system_monitor = SystemMonitor()
+        # The background collector is started after the first frame is
+        # painted, so that no system query delays the window appearing
+        self.collector = None
+        self.first_frame_painted = False
+        self.static_info = None
+        
+        # Addresses of remote agents to follow once the collector starts
+        self.remote_hosts = list(remote_hosts)
+        self.token = token
         
         # Initialize monitor_windows dictionary
-        self.monitor_windows = {
-            'cpu': None,
-            'memory': None,
-            'storage': None,
-            'network': None,
-            'process': None
-        }
+        self.monitor_windows = dict.fromkeys(MONITOR_WINDOWS)
         
         # Create main widget and layout
         main_widget = QWidget()
@@ -56,6 +61,9 @@ class MainWindow(QMainWindow):
         # Add welcome header
         self.create_welcome_header(layout)
         
+        # Add the host selector, used when following remote agents
+        self.create_host_selector(layout)
+        
         # Create navigation buttons
         nav_layout = QHBoxLayout()
         self.create_nav_buttons(nav_layout)
@@ -66,14 +74,52 @@ class MainWindow(QMainWindow):
         
         # Add credits footer
         self.create_credits_footer(layout)
-        
-        # Set up timer for updates
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_info)
-        self.timer.start(5000)  # Update every 5 seconds
-        
-        # Initial update
-        self.update_info()
+
+    def showEvent(self, event):
+        """Start receiving system snapshots while the window is visible"""
+        if self.collector is not None:
+            self.collector.subscribe('static', self)
+            self.collector.subscribe('system', self)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        """Stop sampling system information while the window is hidden"""
+        if self.collector is not None:
+            self.collector.unsubscribe('static', self)
+            self.collector.unsubscribe('system', self)
+        super().hideEvent(event)
+
+    def paintEvent(self, event):
+        """Start the collector once the first frame has been painted"""
+        super().paintEvent(event)
+        if not self.first_frame_painted:
+            self.first_frame_painted = True
+            QTimer.singleShot(0, self.start_collector)
+
+    def start_collector(self):
+        """Connect to the background collector and subscribe if visible"""
+        from monitor_windows.collector_thread import get_collector
+        self.collector = get_collector()
+        self.collector.snapshot_ready.connect(self.on_snapshot)
+        self.collector.collect_failed.connect(self.on_collect_failed)
+        self.collector.hosts_changed.connect(self.update_host_selector)
+        for address in self.remote_hosts:
+            self.collector.connect_remote(address, self.token)
+        self.update_host_selector()
+        if self.isVisible():
+            self.collector.subscribe('static', self)
+            self.collector.subscribe('system', self)
+
+    def on_snapshot(self, family, snapshot):
+        """Handle a snapshot published by the collector"""
+        if family == 'static':
+            self.update_static_info(snapshot)
+        elif family == 'system':
+            self.update_info(snapshot)
+
+    def on_collect_failed(self, family, message):
+        """Show that a monitor stopped producing data instead of freezing silently"""
+        self.statusBar().showMessage(f"Could not collect {family} data: {message}", 10000)
 
     def create_welcome_header(self, layout):
         """Create welcome header"""
@@ -81,6 +127,37 @@ class MainWindow(QMainWindow):
         header.setAlignment(Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(header)
 
+    def create_host_selector(self, layout):
+        """Create the combo box that switches between monitored hosts"""
+        host_layout = QHBoxLayout()
+        host_layout.addWidget(QLabel("Host:"))
+        self.host_selector = QComboBox()
+        self.host_selector.currentIndexChanged.connect(self.on_host_selected)
+        host_layout.addWidget(self.host_selector, 1)
+        self.host_selector_widget = QWidget()
+        self.host_selector_widget.setLayout(host_layout)
+        # Only shown when there is more than this computer to choose from
+        self.host_selector_widget.setVisible(bool(self.remote_hosts))
+        layout.addWidget(self.host_selector_widget)
+
+    def update_host_selector(self):
+        """Refresh the host list, keeping the current selection"""
+        hosts = self.collector.hosts()
+        self.host_selector.blockSignals(True)
+        self.host_selector.clear()
+        for key, label, connected in hosts:
+            self.host_selector.addItem(label if connected else f"{label} (offline)", key)
+        index = self.host_selector.findData(self.collector.current_host)
+        self.host_selector.setCurrentIndex(max(index, 0))
+        self.host_selector.blockSignals(False)
+        self.host_selector_widget.setVisible(len(hosts) > 1)
+
+    def on_host_selected(self, index):
+        """Show the selected host in every window"""
+        host = self.host_selector.itemData(index)
+        if host is not None and self.collector is not None:
+            self.collector.set_host(host)
+
     def create_credits_footer(self, layout):
         """Create credits footer"""
         footer = QLabel("Designed and built by Aimable M and Jash M")
@@ -149,10 +226,9 @@ class MainWindow(QMainWindow):
         self.user_group.setLayout(user_layout)
         layout.addWidget(self.user_group)
 
-    def update_info(self):
-        """Update all information labels"""
-        # Get system information
-        info = self.system_monitor.get_all_info()
+    def update_static_info(self, info):
+        """Update the labels that describe facts which never change"""
+        self.static_info = info
         
         # Update OS information
         os_info = info['os_info']
@@ -168,14 +244,29 @@ class MainWindow(QMainWindow):
         )
         self.os_info_label.setText(os_text)
         
-        # Update Hardware information
-        hardware_info = (
-            f"<b>Processor:</b> {os_info['processor']}<br>"
-            f"<b>Number of CPUs:</b> {psutil.cpu_count()} (Physical: {psutil.cpu_count(logical=False)})<br>"
-            f"<b>System Architecture:</b> {os_info['architecture'][0]}<br>"
-            f"<b>CPU Usage:</b> {psutil.cpu_percent()}%"
+        # Update Python information
+        python = info['python']
+        python_info = (
+            f"<b>Python Version:</b> {python['version']}<br>"
+            f"<b>Python Implementation:</b> {python['implementation']}<br>"
+            f"<b>Python Compiler:</b> {python['compiler']}<br>"
+            f"<b>Python Build:</b> {python['build'][0]} ({python['build'][1]})"
         )
-        self.hardware_info_label.setText(hardware_info)
+        self.python_info_label.setText(python_info)
+
+    def update_info(self, info):
+        """Update the dynamic information labels from a system snapshot"""
+        # Update Hardware information once the static facts are known
+        if self.static_info:
+            os_info = self.static_info['os_info']
+            cpu_count = self.static_info['cpu_count']
+            hardware_info = (
+                f"<b>Processor:</b> {os_info['processor']}<br>"
+                f"<b>Number of CPUs:</b> {cpu_count['logical']} (Physical: {cpu_count['physical']})<br>"
+                f"<b>System Architecture:</b> {os_info['architecture'][0]}<br>"
+                f"<b>CPU Usage:</b> {info['cpu_percent']}%"
+            )
+            self.hardware_info_label.setText(hardware_info)
         
         # Update boot information
         boot_timestamp = info['boot_time']
@@ -189,15 +280,6 @@ class MainWindow(QMainWindow):
         )
         self.boot_info_label.setText(boot_text)
         
-        # Update Python information
-        python_info = (
-            f"<b>Python Version:</b> {platform.python_version()}<br>"
-            f"<b>Python Implementation:</b> {platform.python_implementation()}<br>"
-            f"<b>Python Compiler:</b> {platform.python_compiler()}<br>"
-            f"<b>Python Build:</b> {platform.python_build()[0]} ({platform.python_build()[1]})"
-        )
-        self.python_info_label.setText(python_info)
-        
         # Update user information
         users = info['users']
         users_text = "<b>Logged in users:</b><br>"
@@ -210,39 +292,49 @@ class MainWindow(QMainWindow):
             <br>"""
         self.user_info_label.setText(users_text)
 
+    def show_monitor(self, key):
+        """Show a monitor window, importing and creating it on first use"""
+        if not self.monitor_windows[key]:
+            module_name, class_name = MONITOR_WINDOWS[key]
+            window_class = getattr(importlib.import_module(module_name), class_name)
+            self.monitor_windows[key] = window_class()
+        self.monitor_windows[key].show()
+        self.monitor_windows[key].activateWindow()
+
     def show_cpu_monitor(self):
-        if not self.monitor_windows['cpu']:
-            self.monitor_windows['cpu'] = CPUWindow()
-        self.monitor_windows['cpu'].show()
-        self.monitor_windows['cpu'].activateWindow()
+        self.show_monitor('cpu')
         
     def show_memory_monitor(self):
-        if not self.monitor_windows['memory']:
-            self.monitor_windows['memory'] = MemoryWindow()
-        self.monitor_windows['memory'].show()
-        self.monitor_windows['memory'].activateWindow()
+        self.show_monitor('memory')
 
     def show_storage_monitor(self):
-        if not self.monitor_windows['storage']:
-            self.monitor_windows['storage'] = StorageWindow()
-        self.monitor_windows['storage'].show()
-        self.monitor_windows['storage'].activateWindow()
+        self.show_monitor('storage')
         
     def show_network_monitor(self):
-        if not self.monitor_windows['network']:
-            self.monitor_windows['network'] = NetworkWindow()
-        self.monitor_windows['network'].show()
-        self.monitor_windows['network'].activateWindow()
+        self.show_monitor('network')
         
     def show_process_monitor(self):
-        if not self.monitor_windows['process']:
-            self.monitor_windows['process'] = ProcessWindow()
-        self.monitor_windows['process'].show()
-        self.monitor_windows['process'].activateWindow()
+        self.show_monitor('process')
 
 def main():
-    app = QApplication(sys.argv)
-    window = MainWindow()
+    parser = argparse.ArgumentParser(description="System Resource Monitor")
+    parser.add_argument('--connect', metavar='ADDRESS', action='append', default=[],
+                        help="follow a remote agent at HOST:PORT or unix:PATH "
+                             "(started with `python -m monitors --serve`); repeatable")
+    parser.add_argument('--token-file', default=None,
+                        help="file holding the token of agents started with --token-file")
+    # Anything else is left for Qt (e.g. -platform)
+    args, qt_args = parser.parse_known_args()
+    token = None
+    if args.token_file is not None:
+        from monitors.remote import read_token
+        try:
+            token = read_token(args.token_file)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot read the token: {e}")
+    
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = MainWindow(args.connect, token)
     window.show()
     sys.exit(app.exec())
 
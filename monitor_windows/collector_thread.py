@@ -0,0 +1,293 @@
+import math
+import os
+import sys
+import time
+import traceback
+from collections import defaultdict
+from PyQt6.QtCore import QObject, QThread, QTimer, Qt, pyqtSignal, pyqtSlot
+from PyQt6.QtWidgets import QApplication
+from monitors.collector import Collector
+from monitors.scheduler import Scheduler
+
+# Metric log of the dashboard, apart from the daemon's so both can run
+DASHBOARD_LOG_DIR = os.path.join(os.path.expanduser('~'), '.resource-monitor',
+                                 'dashboard-metrics')
+
+
+class CollectorWorker(QObject):
+    """
+    Runs inside the collector thread and samples every metric family that
+    has at least one subscriber, each on its own cadence
+    """
+    snapshot_ready = pyqtSignal(str, object)
+    # Emitted with the family and the error when a family cannot be collected
+    collect_failed = pyqtSignal(str, str)
+
+    def __init__(self, intervals=None, log_dir=DASHBOARD_LOG_DIR):
+        super().__init__()
+        self.collector = Collector(intervals)
+        self.log_dir = log_dir
+        self.scheduler = Scheduler()
+        self.subscribers = defaultdict(set)
+        self.timer = None
+        # Last error of each failing family, so it is only logged once
+        self.failures = {}
+
+    @pyqtSlot()
+    def open_log(self):
+        """
+        Persist samples to the metric log and start from the history it
+        holds. Runs in the collector thread before any family is sampled.
+        """
+        if self.log_dir is None:
+            return
+        from monitors.metric_log import MetricLogWriter, restore_history
+        try:
+            # Seals what an earlier run left open, so it is restored too
+            self.collector.metric_log = MetricLogWriter(self.log_dir)
+        except OSError as e:
+            # e.g. another dashboard is running; history stays in memory only
+            print(f"Not writing the metric log: {e}", file=sys.stderr)
+        try:
+            restore_history(self.collector.history, self.log_dir)
+        except (OSError, ValueError) as e:
+            print(f"Could not restore the history: {e}", file=sys.stderr)
+
+    @pyqtSlot(str, object)
+    def subscribe(self, family, owner):
+        """Start sampling a family for a subscriber"""
+        self.subscribers[family].add(owner)
+        if family in self.scheduler:
+            return
+
+        # Static families run once; collecting again just replays the cache
+        self.scheduler.add(family, self.collector.interval(family),
+                           lambda f=family: self.collect(f))
+        self.reschedule()
+
+    @pyqtSlot(str, object)
+    def configure(self, family, options):
+        """Change the options a family is collected with and resample it"""
+        self.collector.configure(family, options)
+        if family in self.scheduler:
+            self.collect(family)
+
+    @pyqtSlot(str, object)
+    def unsubscribe(self, family, owner):
+        """Stop sampling a family once its last subscriber is gone"""
+        self.subscribers[family].discard(owner)
+        if not self.subscribers[family]:
+            self.scheduler.remove(family)
+            self.reschedule()
+
+    def reschedule(self):
+        """Arm the timer for the next deadline of the scheduler"""
+        if self.timer is None:
+            # Created here so that the timer belongs to the worker thread
+            self.timer = QTimer(self)
+            self.timer.setSingleShot(True)
+            self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+            self.timer.timeout.connect(self.run_pending)
+
+        deadline = self.scheduler.next_deadline()
+        if deadline is None:
+            self.timer.stop()
+            return
+        delay = max(deadline - time.monotonic(), 0.0)
+        self.timer.start(math.ceil(delay * 1000))
+
+    def run_pending(self):
+        """Collect every family that is due"""
+        self.scheduler.run_pending()
+        self.reschedule()
+
+    def collect(self, family):
+        """Collect a family and publish the snapshot"""
+        try:
+            snapshot = self.collector.collect(family)
+        except Exception as e:
+            message = f"{type(e).__name__}: {e}"
+            if self.failures.get(family) != message:
+                print(f"Error collecting {family}:", file=sys.stderr)
+                traceback.print_exc()
+            self.failures[family] = message
+            self.collect_failed.emit(family, message)
+            return
+        self.failures.pop(family, None)
+        self.snapshot_ready.emit(family, snapshot)
+
+
+# Host key of the machine the dashboard runs on
+LOCAL_HOST = 'local'
+
+
+class CollectorThread(QObject):
+    """
+    GUI-side handle of the background collector. Windows subscribe to the
+    families they display and receive snapshots through queued signals.
+
+    Snapshots can also come from remote agents: snapshot_ready only carries
+    those of the selected host, and switching hosts replays its latest
+    snapshot of every family.
+    """
+    snapshot_ready = pyqtSignal(str, object)
+    # Emitted with the family and the error when a local family fails
+    collect_failed = pyqtSignal(str, str)
+    subscribe_requested = pyqtSignal(str, object)
+    unsubscribe_requested = pyqtSignal(str, object)
+    configure_requested = pyqtSignal(str, object)
+    remote_snapshot_ready = pyqtSignal(str, str, object)
+    hosts_changed = pyqtSignal()
+    host_changed = pyqtSignal(str)
+
+    def __init__(self, intervals=None, log_dir=DASHBOARD_LOG_DIR):
+        super().__init__()
+        self.latest = {}
+        self.options = {}
+        # Error of each local family whose last collection failed
+        self.errors = {}
+        self.current_host = LOCAL_HOST
+        self.aggregator = None
+        self.remote_snapshot_ready.connect(self.on_remote_snapshot,
+                                           Qt.ConnectionType.QueuedConnection)
+
+        self.worker_thread = QThread()
+        self.worker = CollectorWorker(intervals, log_dir)
+        self.worker.moveToThread(self.worker_thread)
+        # Emitted in the new thread before its event loop handles any request
+        self.worker_thread.started.connect(self.worker.open_log)
+
+        queued = Qt.ConnectionType.QueuedConnection
+        self.subscribe_requested.connect(self.worker.subscribe, queued)
+        self.unsubscribe_requested.connect(self.worker.unsubscribe, queued)
+        self.configure_requested.connect(self.worker.configure, queued)
+        self.worker.snapshot_ready.connect(self.on_snapshot, queued)
+        self.worker.collect_failed.connect(self.on_collect_failed, queued)
+        self.worker_thread.finished.connect(self.worker.deleteLater)
+
+        self.worker_thread.start()
+
+    def on_snapshot(self, family, snapshot):
+        """Remember the latest snapshot and forward it to the windows"""
+        self.latest[family] = snapshot
+        self.errors.pop(family, None)
+        if self.current_host == LOCAL_HOST:
+            self.snapshot_ready.emit(family, snapshot)
+
+    def on_collect_failed(self, family, message):
+        """Mark a family as failing and tell the windows"""
+        self.errors[family] = message
+        if self.current_host == LOCAL_HOST:
+            self.collect_failed.emit(family, message)
+
+    def on_remote_snapshot(self, host, family, snapshot):
+        """Forward a remote snapshot if its host is still the selected one"""
+        if host == self.current_host:
+            self.snapshot_ready.emit(family, snapshot)
+
+    def connect_remote(self, address, token=None):
+        """Follow a remote agent, starting the aggregator if needed"""
+        if self.aggregator is None:
+            from monitors.remote import Aggregator
+            self.aggregator = Aggregator(self.forward_remote_snapshot, self.hosts_changed.emit)
+            self.aggregator.start()
+        self.aggregator.add_host(address, token)
+        # Remote samples are recorded with the same options, e.g. pinned pids
+        host = self.aggregator.get_host(address)
+        for family, options in self.options.items():
+            host.recorder.configure(family, options)
+
+    def forward_remote_snapshot(self, host, family, snapshot):
+        """
+        Aggregator callback, run in the aggregator thread. Only the selected
+        host is forwarded, so unwatched hosts cost the GUI thread nothing.
+        """
+        if host == self.current_host:
+            self.remote_snapshot_ready.emit(host, family, snapshot)
+
+    def hosts(self):
+        """Get (host key, label, connected) for this computer and every agent"""
+        hosts = [(LOCAL_HOST, "This computer", True)]
+        if self.aggregator is not None:
+            for host in list(self.aggregator.hosts.values()):
+                hosts.append((host.address, host.label(), host.connected))
+        return hosts
+
+    def get_history(self, host=None):
+        """
+        Get the history store of a host (the selected one by default). It is
+        written by the collector or aggregator thread, so hold its lock
+        while reading its buffers.
+        """
+        host = host or self.current_host
+        if host == LOCAL_HOST:
+            return self.worker.collector.history
+        remote = self.aggregator.get_host(host) if self.aggregator else None
+        return remote.history if remote is not None else None
+
+    def search_processes(self, query):
+        """
+        Get the pids of local processes matching a query from the process
+        monitor's index, or None when no index is available (remote hosts,
+        or before processes were first sampled). Raises re.error for an
+        invalid cmd: regex.
+        """
+        if self.current_host != LOCAL_HOST:
+            return None
+        monitor = self.worker.collector.monitors.get('process')
+        if monitor is None:
+            return None
+        return monitor.index.search(query)
+
+    def set_host(self, host):
+        """Show another host in every window"""
+        if host == self.current_host:
+            return
+        self.current_host = host
+        self.host_changed.emit(host)
+
+        if host == LOCAL_HOST:
+            latest = self.latest
+        else:
+            remote = self.aggregator.get_host(host) if self.aggregator else None
+            latest = dict(remote.latest) if remote is not None else {}
+        for family, snapshot in latest.items():
+            self.snapshot_ready.emit(family, snapshot)
+
+    def subscribe(self, family, owner):
+        """Ask the collector to sample a family for the given owner"""
+        self.subscribe_requested.emit(family, id(owner))
+
+    def unsubscribe(self, family, owner):
+        """Tell the collector the owner no longer needs a family"""
+        self.unsubscribe_requested.emit(family, id(owner))
+
+    def configure(self, family, options):
+        """Change the options the collector samples a family with"""
+        options = self.options[family] = dict(options)
+        self.configure_requested.emit(family, options)
+        if self.aggregator is not None:
+            for host in list(self.aggregator.hosts.values()):
+                host.recorder.configure(family, options)
+
+    def stop(self):
+        """Stop the collector thread and wait for it to finish"""
+        if self.aggregator is not None:
+            self.aggregator.stop()
+        self.worker_thread.quit()
+        self.worker_thread.wait()
+        self.worker.collector.close()
+
+
+_collector = None
+
+
+def get_collector():
+    """Get the collector shared by every window, starting it if needed"""
+    global _collector
+    if _collector is None:
+        _collector = CollectorThread()
+        app = QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(_collector.stop)
+    return _collector
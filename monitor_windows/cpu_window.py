@@ -1,8 +1,8 @@
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                            QLabel, QGroupBox, QProgressBar, QScrollArea)
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QIcon, QFont, QPainter, QPixmap
-from monitors.cpu_monitor import CPUMonitor
+from monitor_windows.collector_thread import get_collector
 from monitor_windows.utils import create_emoji_icon
 
 class CPUWindow(QMainWindow):
@@ -12,8 +12,9 @@ class CPUWindow(QMainWindow):
         self.setMinimumSize(600, 800)
         self.setWindowIcon(create_emoji_icon('⚡'))
         
-        # Initialize CPU monitor
-        self.cpu_monitor = CPUMonitor()
+        # Receive CPU snapshots from the background collector
+        self.collector = get_collector()
+        self.collector.snapshot_ready.connect(self.on_snapshot)
         
         # Create scroll area for content
         scroll = QScrollArea()
@@ -37,14 +38,21 @@ class CPUWindow(QMainWindow):
         # Make the scroll area display our widget
         scroll.setWidget(main_widget)
         scroll.setWidgetResizable(True)
-        
-        # Set up timer for updates
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_info)
-        self.timer.start(1000)  # Update every second
-        
-        # Initial update
-        self.update_info()
+
+    def showEvent(self, event):
+        """Start receiving CPU snapshots while the window is visible"""
+        self.collector.subscribe('cpu', self)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        """Stop sampling the CPU while the window is hidden"""
+        self.collector.unsubscribe('cpu', self)
+        super().hideEvent(event)
+
+    def on_snapshot(self, family, snapshot):
+        """Handle a snapshot published by the collector"""
+        if family == 'cpu':
+            self.update_info(snapshot)
         
     def create_welcome_header(self, layout):
         """Create welcome header"""
@@ -81,32 +89,11 @@ class CPUWindow(QMainWindow):
         self.cores_group = QGroupBox("Per-Core Usage")
         cores_layout = QVBoxLayout()
         
-        # Create widgets for each CPU core
+        # Core widgets are created once the first snapshot tells us how
+        # many logical CPUs there are
         self.core_bars = []
         self.core_labels = []
-        
-        for i in range(self.cpu_monitor.get_cpu_count()['logical']):
-            core_layout = QHBoxLayout()
-            
-            # Create label for core number
-            label = QLabel(f"Core {i + 1}:")
-            label.setMinimumWidth(70)
-            core_layout.addWidget(label)
-            
-            # Create progress bar for core usage
-            bar = QProgressBar()
-            bar.setMinimum(0)
-            bar.setMaximum(100)
-            core_layout.addWidget(bar)
-            
-            # Create label for percentage
-            percent_label = QLabel()
-            percent_label.setMinimumWidth(50)
-            core_layout.addWidget(percent_label)
-            
-            cores_layout.addLayout(core_layout)
-            self.core_bars.append(bar)
-            self.core_labels.append(percent_label)
+        self.cores_layout = cores_layout
             
         self.cores_group.setLayout(cores_layout)
         layout.addWidget(self.cores_group)
@@ -129,15 +116,48 @@ class CPUWindow(QMainWindow):
         self.freq_group.setLayout(freq_layout)
         layout.addWidget(self.freq_group)
         
-    def update_info(self):
-        """Update all CPU information"""
-        # Get CPU info
-        cpu_info = self.cpu_monitor.get_all_info()
+    def create_core_widgets(self, count):
+        """Create a progress bar and label for each CPU core"""
+        for i in range(len(self.core_bars), count):
+            core_layout = QHBoxLayout()
+            
+            # Create label for core number
+            label = QLabel(f"Core {i + 1}:")
+            label.setMinimumWidth(70)
+            core_layout.addWidget(label)
+            
+            # Create progress bar for core usage
+            bar = QProgressBar()
+            bar.setMinimum(0)
+            bar.setMaximum(100)
+            core_layout.addWidget(bar)
+            
+            # Create label for percentage
+            percent_label = QLabel()
+            percent_label.setMinimumWidth(50)
+            core_layout.addWidget(percent_label)
+            
+            self.cores_layout.addLayout(core_layout)
+            self.core_bars.append(bar)
+            self.core_labels.append(percent_label)
+
+    def update_info(self, cpu_info):
+        """Update all CPU information from a collector snapshot"""
+        if len(cpu_info['usage']['per_cpu']) > len(self.core_bars):
+            self.create_core_widgets(len(cpu_info['usage']['per_cpu']))
         
         # Update overall usage
         total_usage = cpu_info['usage']['total']
         self.total_usage_bar.setValue(int(total_usage))
-        self.usage_label.setText(f"<b>Total CPU Usage: {total_usage}%</b>")
+        states = cpu_info['usage']['states']
+        self.usage_label.setText(
+            f"<b>Total CPU Usage: {total_usage}%</b><br>"
+            f"<b>User:</b> {states['user']}% &nbsp; "
+            f"<b>System:</b> {states['system']}% &nbsp; "
+            f"<b>I/O Wait:</b> {states['iowait']}% &nbsp; "
+            f"<b>Steal:</b> {states['steal']}% &nbsp; "
+            f"<b>IRQ:</b> {states['irq']}%"
+        )
         
         # Update per-core usage
         for i, (bar, label, percentage) in enumerate(zip(
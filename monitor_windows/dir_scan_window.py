@@ -0,0 +1,276 @@
+import os
+
+from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+                           QLabel, QGroupBox, QPushButton, QToolTip)
+from PyQt6.QtCore import Qt, QTimer, QRectF, pyqtSignal
+from PyQt6.QtGui import QColor, QPainter, QPen
+from monitors.dir_scanner import DirScanner, DirSizeCache
+from monitor_windows.table_models import Column, KeyedTableModel, create_table_view
+from monitor_windows.utils import create_emoji_icon
+
+# Milliseconds between refreshes of the partial results
+SCAN_REFRESH_MS = 250
+
+# Tiles drawn in the treemap; smaller entries are merged into one
+TREEMAP_TILES = 40
+
+
+def format_bytes(bytes_value):
+    """Convert bytes to human readable format"""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if bytes_value < 1024:
+            return f"{bytes_value:.1f} {unit}"
+        bytes_value /= 1024
+    return f"{bytes_value:.1f} PB"
+
+
+def worst_ratio(areas, length):
+    """Get the worst aspect ratio of areas laid out along a side of length"""
+    total = sum(areas)
+    return max(max(length * length * area / (total * total),
+                   total * total / (length * length * area)) for area in areas)
+
+
+def squarify(sizes, x, y, width, height):
+    """
+    Lay out sizes (sorted largest first) in a rectangle as a squarified
+    treemap; get one (x, y, width, height) rectangle per size
+    """
+    total = sum(sizes)
+    if total <= 0 or width <= 0 or height <= 0:
+        return []
+    scale = width * height / total
+    areas = [size * scale for size in sizes]
+    rects = []
+    row = []
+    i = 0
+    while i < len(areas) or row:
+        length = min(width, height)
+        if i < len(areas) and (not row or
+                               worst_ratio(row + [areas[i]], length) <= worst_ratio(row, length)):
+            row.append(areas[i])
+            i += 1
+            continue
+        # Lay the row out along the shorter side and carry on in what is left
+        thickness = sum(row) / length
+        offset = 0.0
+        for area in row:
+            extent = area / thickness
+            if width >= height:
+                rects.append((x, y + offset, thickness, extent))
+            else:
+                rects.append((x + offset, y, extent, thickness))
+            offset += extent
+        if width >= height:
+            x += thickness
+            width -= thickness
+        else:
+            y += thickness
+            height -= thickness
+        row = []
+    return rects
+
+
+class Treemap(QWidget):
+    """
+    Squarified treemap of (name, size) entries; double-clicking a tile
+    emits its name
+    """
+    activated = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMinimumHeight(260)
+        self.items = []
+        # (QRectF, name, size) of each tile, laid out for the current size
+        self.tiles = []
+
+    def set_items(self, items):
+        """Show (name, size) entries; a None name stands for the files directly inside"""
+        items = sorted(items, key=lambda item: item[1], reverse=True)
+        if len(items) > TREEMAP_TILES:
+            rest = sum(size for _, size in items[TREEMAP_TILES - 1:])
+            items = items[:TREEMAP_TILES - 1] + [("(other)", rest)]
+        if items != self.items:
+            self.items = items
+            self.layout_tiles()
+            self.update()
+
+    def layout_tiles(self):
+        rects = squarify([size for _, size in self.items], 0.0, 0.0,
+                         float(self.width()), float(self.height()))
+        self.tiles = [(QRectF(*rect), name, size)
+                      for rect, (name, size) in zip(rects, self.items)]
+
+    def resizeEvent(self, event):
+        self.layout_tiles()
+        super().resizeEvent(event)
+
+    def tile_at(self, pos):
+        for rect, name, size in self.tiles:
+            if rect.contains(pos):
+                return name, size
+        return None
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setPen(QPen(self.palette().window().color(), 2))
+        for i, (rect, name, size) in enumerate(self.tiles):
+            painter.setBrush(QColor.fromHsv((i * 37) % 360, 70, 230))
+            painter.drawRect(rect)
+            if rect.width() > 60 and rect.height() > 34:
+                painter.setPen(Qt.GlobalColor.black)
+                painter.drawText(rect.adjusted(4, 2, -4, -2),
+                                 Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop |
+                                 Qt.TextFlag.TextWordWrap,
+                                 f"{name or '(files)'}\n{format_bytes(size)}")
+                painter.setPen(QPen(self.palette().window().color(), 2))
+        painter.end()
+
+    def event(self, event):
+        if event.type() == event.Type.ToolTip:
+            tile = self.tile_at(event.position())
+            if tile is not None:
+                QToolTip.showText(event.globalPosition().toPoint(),
+                                  f"{tile[0] or '(files)'}: {format_bytes(tile[1])}", self)
+            else:
+                QToolTip.hideText()
+            return True
+        return super().event(event)
+
+    def mouseDoubleClickEvent(self, event):
+        tile = self.tile_at(event.position())
+        if tile is not None and tile[0] and tile[0] != "(other)":
+            self.activated.emit(tile[0])
+
+
+# Columns of the top-N directory table
+HEAVIEST_COLUMNS = [
+    Column("Directory", lambda d: d[0], width=420),
+    Column("Size", lambda d: d[1], format_bytes, width=100, numeric=True)
+]
+
+
+class DirScanWindow(QMainWindow):
+    """
+    Shows what is filling a filesystem while a DirScanner walks it. The
+    window keeps its directory size cache, so a rescan (or opening a
+    subdirectory) only lists the directories that changed.
+    """
+    def __init__(self, root, cache=None):
+        super().__init__()
+        self.top = os.path.abspath(root)
+        self.root = self.top
+        self.cache = cache if cache is not None else DirSizeCache()
+        self.scanner = None
+        self.setMinimumSize(700, 700)
+        self.setWindowIcon(create_emoji_icon('📂'))
+
+        main_widget = QWidget()
+        layout = QVBoxLayout(main_widget)
+        layout.setSpacing(12)
+        layout.setContentsMargins(20, 20, 20, 20)
+        self.setCentralWidget(main_widget)
+
+        # Scan status and controls
+        controls = QHBoxLayout()
+        self.status_label = QLabel()
+        self.status_label.setTextFormat(Qt.TextFormat.RichText)
+        self.status_label.setWordWrap(True)
+        controls.addWidget(self.status_label, 1)
+        self.up_button = QPushButton("Up")
+        self.up_button.clicked.connect(self.go_up)
+        self.rescan_button = QPushButton("Rescan")
+        self.rescan_button.clicked.connect(self.start_scan)
+        self.stop_button = QPushButton("Stop")
+        self.stop_button.clicked.connect(self.stop_scan)
+        for button in (self.up_button, self.rescan_button, self.stop_button):
+            controls.addWidget(button)
+        layout.addLayout(controls)
+
+        # First level below the scanned directory
+        self.treemap_group = QGroupBox()
+        treemap_layout = QVBoxLayout()
+        self.treemap = Treemap()
+        self.treemap.activated.connect(self.open_child)
+        treemap_layout.addWidget(self.treemap)
+        self.treemap_group.setLayout(treemap_layout)
+        layout.addWidget(self.treemap_group, 1)
+
+        # Directories holding the most bytes directly
+        heaviest_group = QGroupBox("Directories holding the most data (files directly inside)")
+        heaviest_layout = QVBoxLayout()
+        self.heaviest_model = KeyedTableModel(HEAVIEST_COLUMNS, lambda d: d[0])
+        self.heaviest_table, self.heaviest_proxy = create_table_view(self.heaviest_model,
+                                                                     sort_column=1)
+        heaviest_layout.addWidget(self.heaviest_table)
+        heaviest_group.setLayout(heaviest_layout)
+        layout.addWidget(heaviest_group, 1)
+
+        # Poll the scanner for partial results while it runs
+        self.timer = QTimer(self)
+        self.timer.setInterval(SCAN_REFRESH_MS)
+        self.timer.timeout.connect(self.refresh)
+
+        self.start_scan()
+
+    def start_scan(self):
+        """Scan the current directory from scratch, reusing the cache"""
+        if self.scanner is not None:
+            self.scanner.cancel()
+        self.setWindowTitle(f"Disk Usage - {self.root}")
+        self.treemap_group.setTitle(f"Largest entries in {self.root} (double-click to open)")
+        self.up_button.setEnabled(self.root != self.top)
+        self.scanner = DirScanner(self.root, self.cache)
+        self.scanner.start()
+        self.timer.start()
+        self.refresh()
+
+    def stop_scan(self):
+        """Stop the scan, keeping what it counted so far"""
+        self.scanner.cancel()
+        self.refresh()
+
+    def open_child(self, name):
+        """Scan a directory below the current one"""
+        self.root = os.path.join(self.root, name)
+        self.start_scan()
+
+    def go_up(self):
+        """Scan the parent directory, but not above the partition"""
+        if self.root != self.top:
+            self.root = os.path.dirname(self.root)
+            self.start_scan()
+
+    def refresh(self):
+        """Show the scanner's results so far"""
+        progress = self.scanner.progress()
+        if progress['cancelled']:
+            state = "Stopped"
+        elif progress['done']:
+            state = "Done"
+        else:
+            state = "Scanning..."
+        status = (
+            f"<b>{state}</b> {format_bytes(progress['size'])} in "
+            f"{progress['files']:,} files and {progress['directories']:,} directories "
+            f"({progress['cached_directories']:,} unchanged since the last scan), "
+            f"{progress['elapsed']:.1f} s"
+        )
+        if progress['errors']:
+            status += f", {progress['errors']} unreadable"
+        self.status_label.setText(status)
+        self.stop_button.setEnabled(not progress['done'])
+
+        self.treemap.set_items(progress['children'])
+        self.heaviest_model.set_rows(progress['heaviest'])
+
+        if progress['done']:
+            self.timer.stop()
+
+    def closeEvent(self, event):
+        """Stop scanning when the window is closed"""
+        self.timer.stop()
+        if self.scanner is not None:
+            self.scanner.cancel()
+        super().closeEvent(event)
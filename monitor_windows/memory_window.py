@@ -1,10 +1,45 @@
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                            QLabel, QGroupBox, QProgressBar, QScrollArea)
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QIcon, QFont, QPainter, QPixmap
-from monitors.memory_monitor import MemoryMonitor
+from monitors.history import slope
+from monitor_windows.collector_thread import get_collector
 from monitor_windows.utils import create_emoji_icon
 
+# Seconds of history the memory usage trend is fitted over, and the least
+# history needed before a trend is shown
+TREND_SECONDS = 300
+TREND_MIN_SECONDS = 30
+
+# Growth of used memory below this share of RAM per minute counts as stable
+STABLE_PERCENT_PER_MINUTE = 0.5
+
+# 10-second stall averages (percent) above which a resource is under pressure
+PRESSURE_WARNING = 10.0
+
+# Memory stalls of all tasks (percent), or major faults per second while
+# swapping in where pressure is not reported, that mean the system thrashes
+THRASHING_FULL_STALL = 5.0
+THRASHING_MAJOR_FAULTS = 100.0
+
+# Labels of the memory breakdown, in display order
+BREAKDOWN_LABELS = (
+    ('cached', "Page Cache"),
+    ('buffers', "Buffers"),
+    ('shmem', "Shared Memory"),
+    ('slab', "Kernel Slab"),
+    ('slab_reclaimable', "Reclaimable Slab"),
+    ('dirty', "Dirty"),
+    ('writeback', "Writeback"),
+    ('committed_as', "Committed"),
+    ('commit_limit', "Commit Limit"),
+    ('hugepages_total', "Huge Pages"),
+    ('hugepages_free', "Free Huge Pages")
+)
+
+# Resources with pressure stall information
+PRESSURE_RESOURCES = (('memory', "Memory"), ('cpu', "CPU"), ('io', "I/O"))
+
 class MemoryWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -12,8 +47,9 @@ class MemoryWindow(QMainWindow):
         self.setMinimumSize(600, 800)
         self.setWindowIcon(create_emoji_icon('🧠'))
         
-        # Initialize memory monitor
-        self.memory_monitor = MemoryMonitor()
+        # Receive memory snapshots from the background collector
+        self.collector = get_collector()
+        self.collector.snapshot_ready.connect(self.on_snapshot)
         
         # Create scroll area
         scroll = QScrollArea()
@@ -37,14 +73,21 @@ class MemoryWindow(QMainWindow):
         # Make the scroll area display our widget
         scroll.setWidget(main_widget)
         scroll.setWidgetResizable(True)
-        
-        # Set up timer for updates
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_info)
-        self.timer.start(1000)  # Update every second
-        
-        # Initial update
-        self.update_info()
+
+    def showEvent(self, event):
+        """Start receiving memory snapshots while the window is visible"""
+        self.collector.subscribe('memory', self)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        """Stop sampling memory while the window is hidden"""
+        self.collector.unsubscribe('memory', self)
+        super().hideEvent(event)
+
+    def on_snapshot(self, family, snapshot):
+        """Handle a snapshot published by the collector"""
+        if family == 'memory':
+            self.update_info(snapshot)
 
     def create_welcome_header(self, layout):
         """Create welcome header"""
@@ -133,6 +176,39 @@ class MemoryWindow(QMainWindow):
         self.swap_group.setLayout(swap_layout)
         layout.addWidget(self.swap_group)
         
+        # Memory Breakdown
+        self.breakdown_group = QGroupBox("Memory Breakdown")
+        breakdown_layout = QVBoxLayout()
+        self.breakdown_details = QLabel()
+        self.breakdown_details.setTextFormat(Qt.TextFormat.RichText)
+        breakdown_layout.addWidget(self.breakdown_details)
+        self.breakdown_group.setLayout(breakdown_layout)
+        layout.addWidget(self.breakdown_group)
+        
+        # Pressure and Paging
+        self.pressure_group = QGroupBox("Pressure and Paging")
+        pressure_layout = QVBoxLayout()
+        
+        # Share of the last 10 seconds some task was stalled, per resource
+        self.pressure_bars = {}
+        for resource, label_text in PRESSURE_RESOURCES:
+            bar = QProgressBar()
+            bar.setMinimum(0)
+            bar.setMaximum(100)
+            bar_layout = QHBoxLayout()
+            label = QLabel(f"{label_text} Stalls:")
+            label.setMinimumWidth(120)
+            bar_layout.addWidget(label)
+            bar_layout.addWidget(bar)
+            pressure_layout.addLayout(bar_layout)
+            self.pressure_bars[resource] = (label, bar)
+        
+        self.pressure_details = QLabel()
+        self.pressure_details.setTextFormat(Qt.TextFormat.RichText)
+        pressure_layout.addWidget(self.pressure_details)
+        self.pressure_group.setLayout(pressure_layout)
+        layout.addWidget(self.pressure_group)
+        
         # Memory Performance
         self.performance_group = QGroupBox("Memory Performance Metrics")
         performance_layout = QVBoxLayout()
@@ -149,10 +225,8 @@ class MemoryWindow(QMainWindow):
                 return f"{bytes_value:.2f} {unit}"
             bytes_value /= 1024
 
-    def update_info(self):
+    def update_info(self, memory_info):
         """Update all memory information"""
-        # Get memory info
-        memory_info = self.memory_monitor.get_all_info()
         ram_info = memory_info['ram']
         swap_info = memory_info['swap']
         
@@ -199,14 +273,95 @@ class MemoryWindow(QMainWindow):
         )
         self.swap_details.setText(swap_text)
         
+        # Update Memory Breakdown
+        breakdown = memory_info.get('breakdown', {})
+        breakdown_text = "<br>".join(
+            f"<b>{label}:</b> {self.format_bytes(breakdown[key])}"
+            for key, label in BREAKDOWN_LABELS if key in breakdown
+        )
+        self.breakdown_details.setText(breakdown_text or "Not reported on this system")
+        
+        # Update Pressure and Paging
+        pressure = memory_info.get('pressure', {})
+        paging = memory_info.get('paging', {})
+        self.update_pressure(pressure, paging)
+        
         # Update Performance Metrics
-        # You can add additional metrics here if your MemoryMonitor provides them
         performance_text = (
-            f"<b>Memory Usage Trend:</b> "
-            f"{'Increasing' if ram_info['percent'] > 80 else 'Stable'}<br>"
+            f"<b>Memory Usage Trend:</b> {self.usage_trend(total)}<br>"
+            f"<b>Memory Pressure Status:</b> {self.pressure_status(pressure, paging)}<br>"
             f"<b>Swap Usage Status:</b> "
             f"{'High' if swap_info['percent'] > 50 else 'Normal'}<br>"
             f"<b>Available Memory Status:</b> "
             f"{'Low' if available_percent < 20 else 'Adequate'}"
         )
-        self.performance_label.setText(performance_text)
\ No newline at end of file
+        self.performance_label.setText(performance_text)
+
+    def update_pressure(self, pressure, paging):
+        """Show stall percentages and paging rates"""
+        lines = []
+        for resource, label_text in PRESSURE_RESOURCES:
+            label, bar = self.pressure_bars[resource]
+            stalls = pressure.get(resource)
+            label.setVisible(stalls is not None)
+            bar.setVisible(stalls is not None)
+            if stalls is None:
+                continue
+            some = stalls.get('some', {})
+            bar.setValue(int(some.get('avg10', 0)))
+            line = (f"<b>{label_text}:</b> some {some.get('avg10', 0):.1f}% / "
+                    f"{some.get('avg60', 0):.1f}% / {some.get('avg300', 0):.1f}%")
+            full = stalls.get('full')
+            # The CPU "full" line is always zero at the system level
+            if full is not None and resource != 'cpu':
+                line += (f", full {full.get('avg10', 0):.1f}% / "
+                         f"{full.get('avg60', 0):.1f}% / {full.get('avg300', 0):.1f}%")
+            lines.append(line)
+        if lines:
+            lines.insert(0, "<i>Share of time tasks were stalled over 10 s / 1 min / 5 min</i>")
+        else:
+            lines.append("<i>Pressure stall information is not available on this system</i>")
+        
+        if 'major_faults' in paging:
+            lines.append(f"<b>Page Faults:</b> {paging['page_faults']:.0f}/s "
+                         f"({paging['major_faults']:.0f}/s major)")
+        if 'swap_in' in paging:
+            lines.append(f"<b>Swap In:</b> {self.format_bytes(paging['swap_in'])}/s, "
+                         f"<b>Swap Out:</b> {self.format_bytes(paging['swap_out'])}/s")
+        self.pressure_details.setText("<br>".join(lines))
+
+    def pressure_status(self, pressure, paging):
+        """Tell whether the system is thrashing, from stalls rather than usage"""
+        memory = pressure.get('memory')
+        if memory is not None:
+            if memory.get('full', {}).get('avg10', 0) > THRASHING_FULL_STALL:
+                return "Thrashing"
+            if memory.get('some', {}).get('avg10', 0) > PRESSURE_WARNING:
+                return "Under pressure"
+            return "Normal"
+        if paging.get('major_faults', 0) > THRASHING_MAJOR_FAULTS and paging.get('swap_in', 0) > 0:
+            return "Thrashing"
+        return "Normal"
+
+    def usage_trend(self, total):
+        """Describe how used memory changed over the last TREND_SECONDS"""
+        history = self.collector.get_history()
+        if history is None:
+            return "Collecting data"
+        # The buffer is written by the collector thread
+        with history.lock:
+            buffer = history.get('memory.ram.used')
+            latest = buffer.latest() if buffer is not None else None
+            if latest is None:
+                return "Collecting data"
+            segments = buffer.between(latest[0] - TREND_SECONDS, float('inf'))
+            if latest[0] - segments[0][0][0] < TREND_MIN_SECONDS:
+                return "Collecting data"
+            change = slope(segments)
+        if change is None:
+            return "Collecting data"
+        per_minute = change * 60
+        if abs(per_minute) < total * STABLE_PERCENT_PER_MINUTE / 100:
+            return "Stable"
+        direction = "Increasing" if per_minute > 0 else "Decreasing"
+        return f"{direction} ({self.format_bytes(abs(per_minute))}/min)"
@@ -1,15 +1,74 @@
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                           QLabel, QGroupBox, QProgressBar, QScrollArea, QTableWidget,
-                           QTableWidgetItem)
-from PyQt6.QtCore import Qt, QTimer
-from PyQt6.QtGui import QIcon, QFont, QPainter, QPixmap
-from monitors.network_monitor import NetworkMonitor
-import psutil
-import socket
-import subprocess
-import platform
+                           QLabel, QGroupBox, QProgressBar, QScrollArea, QComboBox)
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QIcon, QFont, QPainter, QPixmap, QColor
+from monitor_windows.collector_thread import get_collector
+from monitor_windows.table_models import Column, KeyedTableModel, create_table_view
 from monitor_windows.utils import create_emoji_icon
 
+
+def format_addr(addr):
+    """Format an (ip, port) address"""
+    return f"{addr[0]}:{addr[1]}" if addr else "N/A"
+
+
+# Columns of the connections table
+CONNECTION_COLUMNS = [
+    Column("Local Address", lambda c: format_addr(c['local_addr']), width=200),
+    Column("Remote Address", lambda c: format_addr(c['remote_addr']), width=200),
+    Column("Status", lambda c: c['status'], width=110),
+    Column("Type", lambda c: c.get('type', ''), width=60),
+    Column("Family", lambda c: c.get('family', ''), width=60)
+]
+
+# Connection kinds offered by the window: (label, kind)
+CONNECTION_KINDS = [
+    ("All", 'inet'),
+    ("TCP", 'tcp'),
+    ("UDP", 'udp'),
+    ("IPv4", 'inet4'),
+    ("IPv6", 'inet6')
+]
+
+def format_rate(bytes_per_sec):
+    """Convert bytes per second to human readable format"""
+    for unit in ['B/s', 'KB/s', 'MB/s', 'GB/s']:
+        if bytes_per_sec < 1024:
+            return f"{bytes_per_sec:.1f} {unit}"
+        bytes_per_sec /= 1024
+    return f"{bytes_per_sec:.1f} TB/s"
+
+
+def nic_rate(interface, *names):
+    """Sum some per-second rates of an interface row"""
+    rates = interface.get('rates') or {}
+    return sum(rates.get(name, 0.0) for name in names)
+
+
+# Columns of the interface table
+INTERFACE_COLUMNS = [
+    Column("Interface", lambda i: i['name'], width=110),
+    Column("IP Address", lambda i: i['ip'], width=130),
+    Column("Netmask", lambda i: i['netmask'], width=130),
+    Column("MAC Address", lambda i: i['mac'], width=150),
+    Column("Status", lambda i: i['status'], width=70,
+           foreground=lambda i: QColor(Qt.GlobalColor.green if i['status'] == 'Up'
+                                       else Qt.GlobalColor.red)),
+    Column("Download", lambda i: nic_rate(i, 'bytes_recv'), format_rate, width=90, numeric=True),
+    Column("Upload", lambda i: nic_rate(i, 'bytes_sent'), format_rate, width=90, numeric=True),
+    Column("Packets/s", lambda i: nic_rate(i, 'packets_recv', 'packets_sent'),
+           lambda v: f"{v:.0f}", width=80, numeric=True),
+    Column("Errors/s", lambda i: nic_rate(i, 'errin', 'errout', 'dropin', 'dropout'),
+           lambda v: f"{v:.1f}", width=70, numeric=True)
+]
+
+
+def connection_key(conn):
+    """Identify a connection by its protocol and endpoints"""
+    return (conn.get('proto'), tuple(conn['local_addr'] or ()),
+            tuple(conn['remote_addr'] or ()))
+
+
 class NetworkWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -17,12 +76,14 @@ class NetworkWindow(QMainWindow):
         self.setMinimumSize(800, 600)
         self.setWindowIcon(create_emoji_icon('🌐'))
         
-        # Initialize network monitor
-        self.network_monitor = NetworkMonitor()
-        
-        # Store previous network stats for speed calculation
-        self.prev_bytes_sent = 0
-        self.prev_bytes_recv = 0
+        # Receive network snapshots from the background collector
+        self.collector = get_collector()
+        self.collector.snapshot_ready.connect(self.on_snapshot)
+        self.collector.host_changed.connect(self.on_host_changed)
+
+
+        # Generation of the last connection sample applied to the table
+        self.connection_generation = None
         
         # Create scroll area
         scroll = QScrollArea()
@@ -49,14 +110,29 @@ class NetworkWindow(QMainWindow):
         # Make the scroll area display our widget
         scroll.setWidget(main_widget)
         scroll.setWidgetResizable(True)
-        
-        # Set up timer for updates
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_info)
-        self.timer.start(1000)  # Update every second
-        
-        # Initial update
-        self.update_info()
+
+    def showEvent(self, event):
+        """Start receiving network snapshots while the window is visible"""
+        self.collector.subscribe('network', self)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        """Stop sampling the network while the window is hidden"""
+        self.collector.unsubscribe('network', self)
+        super().hideEvent(event)
+
+    def on_snapshot(self, family, snapshot):
+        """Handle a snapshot published by the collector"""
+        if family == 'network':
+            self.update_info(snapshot)
+
+    def on_host_changed(self, host):
+        """Reload the connection table from the next snapshot"""
+        self.connection_generation = None
+
+    def on_kind_changed(self):
+        """Sample only the selected kind of connections"""
+        self.collector.configure('network', {'kind': self.kind_combo.currentData()})
 
     def create_welcome_header(self, layout):
         """Create welcome header"""
@@ -105,13 +181,28 @@ class NetworkWindow(QMainWindow):
         # Network Connections
         self.connections_group = QGroupBox("Active Network Connections")
         connections_layout = QVBoxLayout()
+
+        # Kind filter, applied by the collector
+        kind_layout = QHBoxLayout()
+        kind_layout.addWidget(QLabel("Show:"))
+        self.kind_combo = QComboBox()
+        for label, kind in CONNECTION_KINDS:
+            self.kind_combo.addItem(label, kind)
+        self.kind_combo.currentIndexChanged.connect(self.on_kind_changed)
+        kind_layout.addWidget(self.kind_combo)
+        kind_layout.addStretch(1)
+        connections_layout.addLayout(kind_layout)
+
+        # Counts by state and by remote host
+        self.connection_summary_label = QLabel()
+        self.connection_summary_label.setTextFormat(Qt.TextFormat.RichText)
+        self.connection_summary_label.setWordWrap(True)
+        connections_layout.addWidget(self.connection_summary_label)
         
         # Create connections table
-        self.connections_table = QTableWidget()
-        self.connections_table.setColumnCount(4)
-        self.connections_table.setHorizontalHeaderLabels([
-            "Local Address", "Remote Address", "Status", "Type"
-        ])
+        self.connections_model = KeyedTableModel(CONNECTION_COLUMNS, connection_key)
+        self.connections_table, self.connections_proxy = create_table_view(
+            self.connections_model)
         connections_layout.addWidget(self.connections_table)
         
         self.connections_group.setLayout(connections_layout)
@@ -137,21 +228,14 @@ class NetworkWindow(QMainWindow):
         """Convert bytes per second to human readable format"""
         return f"{self.format_bytes(bytes_per_sec)}/s"
 
-    def calculate_speed(self, current_bytes, previous_bytes):
-        """Calculate bytes per second"""
-        return current_bytes - previous_bytes
-    
     def create_interface_section(self, layout):
         """Create network interface information section"""
         self.interface_group = QGroupBox("Network Interfaces")
         interface_layout = QVBoxLayout()
         
         # Add interface details table
-        self.interface_table = QTableWidget()
-        self.interface_table.setColumnCount(5)
-        self.interface_table.setHorizontalHeaderLabels([
-            "Interface", "IP Address", "Netmask", "MAC Address", "Status"
-        ])
+        self.interface_model = KeyedTableModel(INTERFACE_COLUMNS, lambda i: i['name'])
+        self.interface_table, self.interface_proxy = create_table_view(self.interface_model)
         interface_layout.addWidget(self.interface_table)
         
         # Add WiFi details section if available
@@ -162,152 +246,31 @@ class NetworkWindow(QMainWindow):
         self.interface_group.setLayout(interface_layout)
         layout.addWidget(self.interface_group)
 
-    def get_wifi_info(self):
-        """Get WiFi information based on the operating system"""
-        wifi_info = {}
-        
-        try:
-            if platform.system() == "Windows":
-                # Windows WiFi info using netsh
-                output = subprocess.check_output(
-                    ["netsh", "wlan", "show", "interfaces"],
-                    universal_newlines=True
-                )
-                for line in output.split('\n'):
-                    if ': ' in line:
-                        key, value = line.split(': ', 1)
-                        key = key.strip()
-                        value = value.strip()
-                        wifi_info[key] = value
-                        
-            elif platform.system() == "Linux":
-                # Linux WiFi info using iwconfig
-                try:
-                    output = subprocess.check_output(
-                        ["iwconfig"],
-                        universal_newlines=True,
-                        stderr=subprocess.DEVNULL
-                    )
-                    wifi_info['raw'] = output
-                    # Parse basic info
-                    if "ESSID:" in output:
-                        essid = output.split('ESSID:"')[1].split('"')[0]
-                        wifi_info['SSID'] = essid
-                    if "Bit Rate=" in output:
-                        rate = output.split('Bit Rate=')[1].split(' ')[0]
-                        wifi_info['Bit Rate'] = rate
-                except:
-                    pass
-                    
-            elif platform.system() == "Darwin":  # macOS
-                # macOS WiFi info using airport
-                try:
-                    output = subprocess.check_output(
-                        ["/System/Library/PrivateFrameworks/Apple80211.framework/Versions/Current/Resources/airport", "-I"],
-                        universal_newlines=True
-                    )
-                    for line in output.split('\n'):
-                        if ': ' in line:
-                            key, value = line.split(': ', 1)
-                            key = key.strip()
-                            value = value.strip()
-                            wifi_info[key] = value
-                except:
-                    pass
-                    
-        except Exception as e:
-            wifi_info['error'] = str(e)
-            
-        return wifi_info
-
-    def update_interface_info(self):
+    def update_interface_info(self, table_data, wifi_info, per_nic_rates=None):
         """Update network interface information"""
-        interfaces = psutil.net_if_addrs()
-        stats = psutil.net_if_stats()
-        
-        # Prepare table data
-        table_data = []
-        for interface_name, addrs in interfaces.items():
-            interface_info = {
-                'name': interface_name,
-                'ip': '',
-                'netmask': '',
-                'mac': '',
-                'status': 'Down'
-            }
-            
-            # Get interface status
-            if interface_name in stats:
-                interface_info['status'] = 'Up' if stats[interface_name].isup else 'Down'
-            
-            # Get addresses
-            for addr in addrs:
-                if addr.family == socket.AF_INET:  # IPv4
-                    interface_info['ip'] = addr.address
-                    interface_info['netmask'] = addr.netmask
-                elif addr.family == psutil.AF_LINK:  # MAC address
-                    interface_info['mac'] = addr.address
-                    
-            table_data.append(interface_info)
-        
-        # Update interface table
-        self.interface_table.setRowCount(len(table_data))
-        for row, info in enumerate(table_data):
-            self.interface_table.setItem(row, 0, QTableWidgetItem(info['name']))
-            self.interface_table.setItem(row, 1, QTableWidgetItem(info['ip']))
-            self.interface_table.setItem(row, 2, QTableWidgetItem(info['netmask']))
-            self.interface_table.setItem(row, 3, QTableWidgetItem(info['mac']))
-            
-            status_item = QTableWidgetItem(info['status'])
-            if info['status'] == 'Up':
-                status_item.setForeground(Qt.GlobalColor.green)
-            else:
-                status_item.setForeground(Qt.GlobalColor.red)
-            self.interface_table.setItem(row, 4, status_item)
+        # Update interface table, with the throughput of each interface
+        per_nic_rates = per_nic_rates or {}
+        self.interface_model.set_rows([dict(interface, rates=per_nic_rates.get(interface['name']))
+                                       for interface in table_data])
         
-        self.interface_table.resizeColumnsToContents()
-        
-        # Update WiFi details if available
-        wifi_info = self.get_wifi_info()
+        # Update WiFi details if available; the monitor already picked the
+        # fields worth showing for its platform
         if wifi_info:
             wifi_text = "<b>WiFi Details:</b><br>"
-            
-            if platform.system() == "Windows":
-                relevant_keys = [
-                    'Name', 'State', 'SSID', 'Signal',
-                    'Channel', 'Authentication', 'Radio type'
-                ]
-            elif platform.system() == "Linux":
-                if 'SSID' in wifi_info:
-                    wifi_text += f"SSID: {wifi_info['SSID']}<br>"
-                if 'Bit Rate' in wifi_info:
-                    wifi_text += f"Bit Rate: {wifi_info['Bit Rate']}<br>"
-            elif platform.system() == "Darwin":
-                relevant_keys = [
-                    'SSID', 'channel', 'agrCtlRSSI',
-                    'agrCtlNoise', 'lastTxRate', 'maxRate'
-                ]
-            
-            if platform.system() in ["Windows", "Darwin"]:
-                for key in relevant_keys:
-                    if key in wifi_info:
-                        wifi_text += f"{key}: {wifi_info[key]}<br>"
-                        
+            for key, value in wifi_info.items():
+                wifi_text += f"{key}: {value}<br>"
             self.wifi_details.setText(wifi_text)
         else:
             self.wifi_details.setText("No WiFi information available")
 
-    def update_info(self):
+    def update_info(self, network_info):
         """Update all network information"""
-        # Get network info
-        network_info = self.network_monitor.get_all_info()
         io_info = network_info['io']
         
-        # Calculate speeds
-        bytes_sent_speed = self.calculate_speed(
-            io_info['bytes_sent'], self.prev_bytes_sent)
-        bytes_recv_speed = self.calculate_speed(
-            io_info['bytes_recv'], self.prev_bytes_recv)
+        # Speeds are measured by the collector against the time of each read
+        rates = network_info.get('rates') or {}
+        bytes_sent_speed = rates.get('bytes_sent', 0.0)
+        bytes_recv_speed = rates.get('bytes_recv', 0.0)
         
         # Update speed labels
         self.upload_speed_label.setText(self.format_speed(bytes_sent_speed))
@@ -322,32 +285,14 @@ class NetworkWindow(QMainWindow):
         )
         self.traffic_stats_label.setText(traffic_stats)
         
-        # Update connections table
-        connections = network_info['connections']
-        self.connections_table.setRowCount(len(connections))
-
-
         # Update interface information first
-        self.update_interface_info()
+        self.update_interface_info(network_info['interfaces'], network_info['wifi'],
+                                   network_info.get('per_nic_rates'))
         
-        for row, conn in enumerate(connections):
-            # Format local address
-            local_addr = f"{conn['local_addr'][0]}:{conn['local_addr'][1]}" if conn['local_addr'] else "N/A"
-            self.connections_table.setItem(row, 0, QTableWidgetItem(local_addr))
-            
-            # Format remote address
-            remote_addr = f"{conn['remote_addr'][0]}:{conn['remote_addr'][1]}" if conn['remote_addr'] else "N/A"
-            self.connections_table.setItem(row, 1, QTableWidgetItem(remote_addr))
-            
-            # Add status
-            self.connections_table.setItem(row, 2, QTableWidgetItem(conn['status']))
-            
-            # Add connection type (can be determined from port numbers)
-            conn_type = "TCP" if conn['local_addr'] and conn['local_addr'][1] < 1024 else "Application"
-            self.connections_table.setItem(row, 3, QTableWidgetItem(conn_type))
-        
-        # Auto-adjust column widths
-        self.connections_table.resizeColumnsToContents()
+        # Update connections table
+        connections = network_info['connections']
+        self.update_connections(connections, network_info.get('connection_changes'))
+        self.update_connection_summary(network_info.get('connection_summary'))
         
         # Update performance metrics
         performance_text = (
@@ -360,7 +305,30 @@ class NetworkWindow(QMainWindow):
             f"{'Active' if bytes_sent_speed + bytes_recv_speed > 0 else 'Idle'}"
         )
         self.performance_label.setText(performance_text)
-        
-        # Store current values for next update
-        self.prev_bytes_sent = io_info['bytes_sent']
-        self.prev_bytes_recv = io_info['bytes_recv']
\ No newline at end of file
+
+    def update_connections(self, connections, changes):
+        """
+        Apply the connection changes of a sample to the table, or the whole
+        table when a sample was missed (or came from another host)
+        """
+        generation = changes['generation'] if changes else None
+        previous = self.connection_generation
+        if generation is not None and previous is not None and generation == previous + 1:
+            self.connections_model.apply_changes(
+                changes['added'], [connection_key(conn) for conn in changes['closed']],
+                changes['changed'])
+        else:
+            self.connections_model.set_rows(connections)
+        self.connection_generation = generation
+
+    def update_connection_summary(self, summary):
+        """Show the connection counts by state and the busiest remote hosts"""
+        if not summary:
+            self.connection_summary_label.setText("")
+            return
+        states = sorted(summary['states'].items(), key=lambda item: -item[1])
+        text = "<b>By state:</b> " + ", ".join(f"{state} {count}" for state, count in states)
+        if summary['remote_hosts']:
+            text += "<br><b>Top remote hosts:</b> " + ", ".join(
+                f"{host} ({count})" for host, count in summary['remote_hosts'])
+        self.connection_summary_label.setText(text)
@@ -0,0 +1,192 @@
+from PyQt6.QtCore import QAbstractItemModel, QModelIndex, Qt
+from monitors.process_tree import ProcessTree, TreeListener
+from monitor_windows.table_models import SORT_ROLE, sort_key
+
+
+class ProcessTreeModel(QAbstractItemModel, TreeListener):
+    """
+    Shows a ProcessTree, following its changes as they happen.
+
+    Indexes carry the pid of their process. The tree reports every
+    insertion and removal, which are forwarded to views as row changes of
+    the affected parent only; changed values repaint just their rows, and
+    re-sorting only touches the sibling lists that saw changes.
+    """
+    def __init__(self, columns, parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self.tree = ProcessTree(self)
+        self.sort_column = None
+        self.sort_order = Qt.SortOrder.AscendingOrder
+        # Parents that got children during the current update
+        self.inserted = set()
+        # Pids of the rows expanded in the view; children of collapsed
+        # rows are not shown, so their changes are not signalled
+        self.expanded = set()
+
+    def watch(self, view):
+        """Follow which rows of a QTreeView are expanded"""
+        view.expanded.connect(lambda index: self.expanded.add(index.internalId()))
+        view.collapsed.connect(lambda index: self.expanded.discard(index.internalId()))
+
+    def node(self, index):
+        """Get the node of an index (the root for an invalid index), or None"""
+        if not index.isValid():
+            return self.tree.root
+        return self.tree.nodes.get(index.internalId())
+
+    def index_of(self, node, column=0):
+        """Get the index of a node"""
+        if node is None or node is self.tree.root:
+            return QModelIndex()
+        return self.createIndex(node.parent.position(node), column, node.pid)
+
+    def index_of_row(self, parent, row, column):
+        """Get the index of a child of a node by its position"""
+        return self.createIndex(row, column, parent.children[row].pid)
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.node(parent)
+        if node is None or not (0 <= row < len(node.children)) or \
+                not (0 <= column < len(self.columns)):
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row].pid)
+
+    def parent(self, index=QModelIndex()):
+        node = self.node(index)
+        if node is None or node.parent is None:
+            return QModelIndex()
+        return self.index_of(node.parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        node = self.node(parent)
+        return len(node.children) if node is not None else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.columns[section].header
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        node = self.node(index) if index.isValid() else None
+        if node is None:
+            return None
+        column = self.columns[index.column()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return column.text(column.value(node))
+        if role == SORT_ROLE:
+            return column.value(node)
+        if role == Qt.ItemDataRole.TextAlignmentRole and column.numeric:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        return None
+
+    def update(self, rows):
+        """Apply a new list of process rows"""
+        self.tree.update(rows)
+
+    def clear(self):
+        """Forget every process"""
+        self.beginResetModel()
+        self.tree.clear()
+        self.expanded.clear()
+        self.endResetModel()
+
+    # TreeListener
+
+    def begin_insert(self, parent, index, node):
+        # The subtree arrives sorted, so only its parent needs re-sorting
+        self.sort_subtree(node)
+        self.inserted.add(parent or self.tree.root)
+        self.beginInsertRows(self.index_of(parent), index, index)
+
+    def end_insert(self):
+        self.endInsertRows()
+
+    def begin_remove(self, parent, index):
+        self.beginRemoveRows(self.index_of(parent), index, index)
+
+    def end_remove(self):
+        self.endRemoveRows()
+
+    def changed(self, nodes):
+        """Repaint the changed rows and keep their siblings sorted"""
+        # One signal per shown parent, spanning its changed children
+        root = self.tree.root
+        expanded = self.expanded
+        ranges = {}
+        for node in nodes:
+            if node.parent is not root and node.parent.pid not in expanded:
+                continue
+            row = node.parent.position(node)
+            span = ranges.get(node.parent)
+            ranges[node.parent] = (min(span[0], row), max(span[1], row)) if span else (row, row)
+        last = len(self.columns) - 1
+        for parent, (top, bottom) in ranges.items():
+            self.dataChanged.emit(self.index_of_row(parent, top, 0),
+                                  self.index_of_row(parent, bottom, last))
+
+        parents = {node.parent for node in nodes} | self.inserted
+        self.inserted = set()
+        self.resort(parents)
+
+    # Sorting
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self.sort_column = column if column >= 0 else None
+        self.sort_order = order
+        parents = [self.tree.root]
+        for parent in parents:
+            parents.extend(child for child in parent.children if child.children)
+        self.resort(parents)
+
+    def sorted_children(self, node):
+        """Get the children of a node in display order"""
+        value = self.columns[self.sort_column].value
+        reverse = self.sort_order == Qt.SortOrder.DescendingOrder
+        try:
+            return sorted(node.children, key=value, reverse=reverse)
+        except TypeError:
+            # Mixed types (or None) in the column
+            return sorted(node.children, key=lambda child: sort_key(value(child)),
+                          reverse=reverse)
+
+    def sort_subtree(self, node):
+        """Sort a subtree that views do not know about yet"""
+        if self.sort_column is None:
+            return
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.children:
+                node.children = self.sorted_children(node)
+                node.positions = None
+                stack.extend(node.children)
+
+    def resort(self, parents):
+        """Re-sort the children of the given nodes, moving rows in one layout change"""
+        if self.sort_column is None:
+            return
+        orders = []
+        for parent in parents:
+            if len(parent.children) > 1:
+                children = self.sorted_children(parent)
+                if children != parent.children:
+                    orders.append((parent, children))
+        if not orders:
+            return
+
+        self.layoutAboutToBeChanged.emit()
+        old_indexes = self.persistentIndexList()
+        nodes = [self.node(index) for index in old_indexes]
+        for parent, children in orders:
+            parent.children = children
+            parent.positions = None
+        new_indexes = [self.index_of(node, index.column()) if node is not None else QModelIndex()
+                       for node, index in zip(nodes, old_indexes)]
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
@@ -1,8 +1,74 @@
-from PyQt6.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QLabel, QGroupBox, QTableWidget, QTableWidgetItem
-from PyQt6.QtCore import QTimer
-from monitors.process_monitor import ProcessMonitor
+import re
+from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
+                             QGroupBox, QLineEdit, QSpinBox, QComboBox, QPushButton,
+                             QCheckBox, QTreeView, QHeaderView)
+from PyQt6.QtCore import Qt
+from monitor_windows.collector_thread import get_collector
+from monitor_windows.process_tree_model import ProcessTreeModel
+from monitor_windows.sparkline import SparklineDelegate
+from monitor_windows.table_models import SORT_ROLE, Column, KeyedTableModel, create_table_view
 from monitor_windows.utils import create_emoji_icon
 
+# Columns of the process table
+PROCESS_COLUMNS = [
+    Column("PID", lambda p: p['pid'], width=80, numeric=True),
+    Column("Name", lambda p: p['name'], width=260),
+    Column("CPU %", lambda p: p['cpu_percent'], lambda v: f"{v:.1f}", width=80, numeric=True),
+    Column("Memory %", lambda p: p['memory_percent'], lambda v: f"{v:.1f}", width=90, numeric=True),
+    Column("I/O", lambda p: p.get('io_rate', 0.0), lambda v: format_rate(v), width=100, numeric=True),
+    Column("Threads", lambda p: p.get('num_threads', 0), width=70, numeric=True),
+    Column("Read", lambda p: p.get('read_rate', 0.0), lambda v: format_rate(v), width=100, numeric=True),
+    Column("Write", lambda p: p.get('write_rate', 0.0), lambda v: format_rate(v), width=100, numeric=True),
+    # None where the sockets of a process are not visible
+    Column("Sockets", lambda p: p.get('sockets'), lambda v: "" if v is None else str(v),
+           width=70, numeric=True)
+]
+
+# Sparkline columns of pinned processes: (header, history series, colour)
+SPARKLINE_COLUMNS = [
+    ("CPU history", 'cpu_percent', '#2196F3'),
+    ("Memory history", 'rss', '#4CAF50'),
+    ("I/O history", 'io_rate', '#FF9800')
+]
+
+# Columns of the process tree; numbers are totals over each subtree
+TREE_COLUMNS = [
+    Column("Name", lambda n: n.row.get('name', ''), width=260),
+    Column("PID", lambda n: n.pid, width=80, numeric=True),
+    Column("CPU %", lambda n: n.totals[0], lambda v: f"{v:.1f}", width=80, numeric=True),
+    Column("Memory", lambda n: n.totals[1], lambda v: format_bytes(v), width=100, numeric=True),
+    Column("Threads", lambda n: n.totals[2], width=70, numeric=True),
+    Column("I/O", lambda n: n.totals[3], lambda v: format_rate(v), width=100, numeric=True)
+]
+
+# Top-N modes: (label, collector sort_by, table column)
+SORT_MODES = [
+    ("CPU", 'cpu', 2),
+    ("Memory", 'memory', 3),
+    ("I/O", 'io', 4)
+]
+
+DEFAULT_LIMIT = 50
+
+
+def format_bytes(bytes_value):
+    """Convert bytes to human readable format"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if bytes_value < 1024:
+            return f"{bytes_value:.1f} {unit}"
+        bytes_value /= 1024
+    return f"{bytes_value:.1f} TB"
+
+
+def format_rate(bytes_per_sec):
+    """Convert bytes per second to human readable format"""
+    for unit in ['B/s', 'KB/s', 'MB/s', 'GB/s']:
+        if bytes_per_sec < 1024:
+            return f"{bytes_per_sec:.1f} {unit}"
+        bytes_per_sec /= 1024
+    return f"{bytes_per_sec:.1f} TB/s"
+
+
 class ProcessWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -10,8 +76,21 @@ class ProcessWindow(QMainWindow):
         self.setMinimumSize(600, 800)
         self.setWindowIcon(create_emoji_icon('💾'))
         
-        # Initialize process monitor
-        self.process_monitor = ProcessMonitor()
+        # Receive process snapshots from the background collector
+        self.collector = get_collector()
+        self.collector.snapshot_ready.connect(self.on_snapshot)
+        
+        # Only the top processes are sampled into snapshots; the limit
+        # grows as the table is scrolled to its end
+        self.limit = DEFAULT_LIMIT
+        self.sort_by = 'cpu'
+        
+        # Pinned pids are always sampled and their history is recorded
+        self.pinned = set()
+        self.searching = False
+        # Command lines are only read while the filter has a cmd: term
+        self.searching_cmdlines = False
+        self.collector.host_changed.connect(self.on_host_changed)
         
         # Create main widget and layout
         main_widget = QWidget()
@@ -20,14 +99,30 @@ class ProcessWindow(QMainWindow):
         
         # Create info sections
         self.create_info_sections(layout)
-        
-        # Set up timer for updates
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_info)
-        self.timer.start(2000)  # Update every 2 seconds
-        
-        # Initial update
-        self.update_info()
+
+    def showEvent(self, event):
+        """Start receiving process snapshots while the window is visible"""
+        self.apply_options()
+        self.collector.subscribe('process', self)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        """Stop sampling processes while the window is hidden"""
+        self.collector.unsubscribe('process', self)
+        super().hideEvent(event)
+
+    def on_snapshot(self, family, snapshot):
+        """Handle a snapshot published by the collector"""
+        if family == 'process':
+            self.update_info(snapshot)
+
+    def on_host_changed(self, host):
+        """Pins are pids of one host, so start over on another"""
+        self.pinned.clear()
+        self.tree_model.clear()
+        for delegate in self.sparkline_delegates:
+            delegate.clear()
+        self.apply_options()
         
     def create_info_sections(self, layout):
         """Create process information sections"""
@@ -43,41 +138,187 @@ class ProcessWindow(QMainWindow):
         self.table_group = QGroupBox("Running Processes")
         table_layout = QVBoxLayout()
         
-        # Create table
-        self.process_table = QTableWidget()
-        self.process_table.setColumnCount(4)
-        self.process_table.setHorizontalHeaderLabels([
-            "PID", "Name", "CPU %", "Memory %"
-        ])
+        # Top-N controls and filter by name
+        controls_layout = QHBoxLayout()
+        controls_layout.addWidget(QLabel("Show top"))
+        self.limit_spin = QSpinBox()
+        self.limit_spin.setRange(10, 100000)
+        self.limit_spin.setSingleStep(10)
+        self.limit_spin.setValue(self.limit)
+        self.limit_spin.valueChanged.connect(self.on_limit_changed)
+        controls_layout.addWidget(self.limit_spin)
+        controls_layout.addWidget(QLabel("by"))
+        self.sort_combo = QComboBox()
+        for label, sort_by, column in SORT_MODES:
+            self.sort_combo.addItem(label, sort_by)
+        self.sort_combo.currentIndexChanged.connect(self.on_sort_changed)
+        controls_layout.addWidget(self.sort_combo)
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Filter: name, user:NAME, state:STATE, cmd:REGEX")
+        self.filter_edit.setToolTip("Searches every process; all terms must match")
+        controls_layout.addWidget(self.filter_edit, 1)
+        self.pin_button = QPushButton("Pin / Unpin")
+        self.pin_button.setToolTip("Record the history of the selected processes")
+        self.pin_button.clicked.connect(self.toggle_pinned)
+        controls_layout.addWidget(self.pin_button)
+        self.tree_check = QCheckBox("Group by parent")
+        self.tree_check.toggled.connect(self.set_tree_mode)
+        controls_layout.addWidget(self.tree_check)
+        table_layout.addLayout(controls_layout)
+        
+        # Pinned processes get a marker and sparklines of their history
+        columns = list(PROCESS_COLUMNS)
+        columns.append(Column("📌", lambda p: p['pid'] in self.pinned,
+                              lambda v: "📌" if v else "", width=30))
+        first_sparkline = len(columns)
+        for header, series, color in SPARKLINE_COLUMNS:
+            columns.append(Column(header, lambda p, s=series: p.get(s) if p['pid'] in self.pinned else None,
+                                  lambda v: "", width=120))
+        
+        # Create table, keyed by (pid, create_time) so that reused pids are
+        # treated as new rows; sorted by CPU usage
+        self.process_model = KeyedTableModel(
+            columns, lambda p: (p['pid'], p.get('create_time')))
+        self.process_table, self.process_proxy = create_table_view(
+            self.process_model, sort_column=2, filter_column=1)
+        self.sparkline_delegates = []
+        for i, (header, series, color) in enumerate(SPARKLINE_COLUMNS):
+            delegate = SparklineDelegate(lambda pid, s=series: f'proc.{pid}.{s}', color,
+                                         self.process_table)
+            self.process_table.setItemDelegateForColumn(first_sparkline + i, delegate)
+            self.sparkline_delegates.append(delegate)
+        self.process_model.fetch_more = self.fetch_more
+        self.filter_edit.textChanged.connect(self.on_filter_changed)
         table_layout.addWidget(self.process_table)
         
+        # Tree of processes by parent, kept up to date incrementally
+        self.tree_model = ProcessTreeModel(TREE_COLUMNS)
+        self.process_tree = QTreeView()
+        self.process_tree.setModel(self.tree_model)
+        self.tree_model.setParent(self.process_tree)
+        self.tree_model.watch(self.process_tree)
+        self.process_tree.setUniformRowHeights(True)
+        self.process_tree.setAlternatingRowColors(True)
+        self.process_tree.setSortingEnabled(True)
+        self.process_tree.sortByColumn(2, Qt.SortOrder.DescendingOrder)
+        header = self.process_tree.header()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        for i, column in enumerate(TREE_COLUMNS):
+            header.resizeSection(i, column.width)
+        self.process_tree.hide()
+        table_layout.addWidget(self.process_tree)
+        
         self.table_group.setLayout(table_layout)
         layout.addWidget(self.table_group)
+
+    def apply_options(self):
+        """Tell the collector how many processes to sample, and by what"""
+        # Searching and the tree need every process, not just the top ones
+        limit = None if self.searching or self.tree_check.isChecked() else self.limit
+        self.collector.configure('process', {'limit': limit, 'sort_by': self.sort_by,
+                                             'pinned': frozenset(self.pinned),
+                                             'cmdlines': self.searching_cmdlines})
+
+    def toggle_pinned(self):
+        """Pin the selected processes, or unpin them if all are pinned"""
+        pids = {index.siblingAtColumn(0).data(SORT_ROLE)
+                for index in self.process_table.selectionModel().selectedRows()}
+        if not pids:
+            return
+        if pids <= self.pinned:
+            self.pinned -= pids
+        else:
+            self.pinned |= pids
+        self.apply_options()
+        self.process_proxy.refresh()
+
+    def set_tree_mode(self, enabled):
+        """Switch between the flat table and the tree grouped by parent"""
+        self.process_tree.setVisible(enabled)
+        self.process_table.setVisible(not enabled)
+        for widget in (self.limit_spin, self.sort_combo, self.filter_edit, self.pin_button):
+            widget.setEnabled(not enabled)
+        if not enabled:
+            self.tree_model.clear()
+        self.apply_options()
+
+    def on_limit_changed(self, value):
+        self.limit = value
+        self.apply_options()
+
+    def on_sort_changed(self, index):
+        """Rank processes by another resource and sort the table by it"""
+        label, self.sort_by, column = SORT_MODES[index]
+        self.process_table.sortByColumn(column, Qt.SortOrder.DescendingOrder)
+        self.apply_options()
+
+    def on_filter_changed(self, text):
+        """Re-filter the rows already shown; no process is sampled per keystroke"""
+        self.set_filter(self.process_model.rows)
+        self.process_proxy.refresh()
+        # Only switching between searching and not (or searching command
+        # lines and not) changes what is sampled
+        searching_cmdlines = any(word.startswith('cmd:') and len(word) > 4
+                                 for word in text.split())
+        if bool(text) != self.searching or searching_cmdlines != self.searching_cmdlines:
+            self.searching = bool(text)
+            self.searching_cmdlines = searching_cmdlines
+            self.apply_options()
+
+    def set_filter(self, processes):
+        """
+        Filter processes with the local process index, or by name where
+        there is none (remote hosts). Takes effect on the proxy's next
+        refresh.
+        """
+        proxy = self.process_proxy
+        text = self.filter_edit.text()
+        if not text:
+            proxy.filter_text, proxy.filter_keys = '', None
+            return
+        try:
+            pids = self.collector.search_processes(text)
+        except re.error:
+            # Keep the last filter while a regex is being typed
+            return
+        if pids is None:
+            proxy.filter_text, proxy.filter_keys = text.lower(), None
+        else:
+            proxy.filter_text = ''
+            proxy.filter_keys = {(p['pid'], p.get('create_time')) for p in processes
+                                 if p['pid'] in pids}
+
+    def fetch_more(self):
+        """The table was scrolled to its end: sample twice as many processes"""
+        self.limit_spin.setValue(min(self.limit * 2, self.limit_spin.maximum()))
             
-    def update_info(self):
+    def update_info(self, process_info):
         """Update all process information"""
-        # Get process info
-        process_info = self.process_monitor.get_all_info()
-        
         # Update process count
-        self.count_label.setText(f"Total Processes: {process_info['total_count']}")
-        
-        # Update process table
         processes = process_info['processes']
-        # Sort processes by CPU usage
-        processes.sort(key=lambda x: x['cpu_percent'], reverse=True)
+        total = process_info['total_count']
+        limit = process_info.get('limit')
+        count_text = f"Total Processes: {total}"
+        if limit is not None and len(processes) < total:
+            count_text += f" (showing the top {len(processes)} by {self.sort_combo.currentText()})"
+        self.count_label.setText(count_text)
+        
+        if self.tree_check.isChecked():
+            self.tree_model.update(processes)
+            return
         
-        # Update table
-        self.process_table.setRowCount(len(processes))
-        for i, proc in enumerate(processes):
-            # PID
-            self.process_table.setItem(i, 0, QTableWidgetItem(str(proc['pid'])))
-            # Name
-            self.process_table.setItem(i, 1, QTableWidgetItem(proc['name']))
-            # CPU %
-            self.process_table.setItem(i, 2, QTableWidgetItem(f"{proc['cpu_percent']:.1f}"))
-            # Memory %
-            self.process_table.setItem(i, 3, QTableWidgetItem(f"{proc['memory_percent']:.1f}"))
+        # Extend the sparklines before the table repaints
+        pinned = [p['pid'] for p in processes if p['pid'] in self.pinned]
+        history = self.collector.get_history()
+        for delegate in self.sparkline_delegates:
+            delegate.extend(history, pinned)
         
-        # Resize columns to content
-        self.process_table.resizeColumnsToContents()
\ No newline at end of file
+        # Update process table; the proxy keeps it sorted and filtered,
+        # searching again so that new processes are found
+        if self.searching:
+            self.set_filter(processes)
+        self.process_model.set_rows(processes)
+        if pinned:
+            # Sparklines grew even where the row itself did not change
+            self.process_table.viewport().update()
+        self.process_model.more_available = limit is not None and len(processes) < total
\ No newline at end of file
@@ -0,0 +1,129 @@
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QColor, QPainter, QPainterPath, QPen, QTransform
+from PyQt6.QtWidgets import QStyledItemDelegate
+from monitor_windows.table_models import SORT_ROLE
+
+# Seconds of history shown by a sparkline
+SPARKLINE_SECONDS = 300
+
+
+class Sparkline:
+    """
+    A cached QPainterPath of one history series.
+
+    Points are kept in data coordinates (timestamp, value) so new samples
+    are only appended to the path; painting maps it onto a cell with a
+    transform. Points that scrolled out of the window are dropped by
+    rebuilding the path, which happens once its length has doubled.
+    """
+    def __init__(self):
+        self.path = QPainterPath()
+        # Ring buffer sample count already in the path
+        self.seen = 0
+        self.points = 0
+        self.kept = 0
+        self.start = None
+        self.high = 0.0
+
+    def extend(self, buffer):
+        """Append the samples added to buffer since the last call"""
+        new = buffer.count - self.seen
+        if new <= 0:
+            return
+        if new > len(buffer) or self.points > 2 * self.kept + 32:
+            self.rebuild(buffer)
+            return
+        self.add(buffer.last(new))
+        self.seen = buffer.count
+
+    def rebuild(self, buffer):
+        """Start over from the samples of buffer inside the window"""
+        self.path = QPainterPath()
+        self.points = 0
+        self.start = None
+        self.high = 0.0
+        latest = buffer.latest()
+        self.seen = buffer.count
+        if latest is not None:
+            self.add(buffer.between(latest[0] - SPARKLINE_SECONDS, float('inf')))
+        self.kept = self.points
+
+    def add(self, segments):
+        """Append (timestamps, values) segments to the path"""
+        path = self.path
+        for timestamps, values in segments:
+            for timestamp, value in zip(timestamps, values):
+                if self.points:
+                    path.lineTo(timestamp, value)
+                else:
+                    path.moveTo(timestamp, value)
+                    self.start = timestamp
+                self.points += 1
+                if value > self.high:
+                    self.high = value
+
+    def transform(self, rect):
+        """
+        Map the last SPARKLINE_SECONDS of the path onto rect, or all of it
+        while it is shorter than that
+        """
+        end = self.path.currentPosition().x()
+        span = min(end - self.start, SPARKLINE_SECONDS) or SPARKLINE_SECONDS
+        sx = rect.width() / span
+        sy = (rect.height() - 4) / self.high if self.high > 0 else 0.0
+        return QTransform(sx, 0.0, 0.0, -sy,
+                          rect.left() + rect.width() - end * sx, rect.bottom() - 2)
+
+
+class SparklineDelegate(QStyledItemDelegate):
+    """
+    Draws the recent history of a per-process series in a table cell.
+
+    series(pid) names the history series of a row (None for no sparkline).
+    The window calls extend() once per sample; painting only draws the
+    cached paths, so repaints never read the history store.
+    """
+    def __init__(self, series, color, parent=None):
+        super().__init__(parent)
+        self.series = series
+        self.pen = QPen(QColor(color))
+        self.pen.setCosmetic(True)
+        self.pen.setWidthF(1.5)
+        self.sparklines = {}
+
+    def extend(self, history, pids):
+        """Extend the sparklines of pids, forgetting every other one"""
+        for pid in self.sparklines.keys() - set(pids):
+            del self.sparklines[pid]
+        if history is None:
+            return
+        # The buffers are written by the collector thread
+        with history.lock:
+            for pid in pids:
+                buffer = history.get(self.series(pid))
+                if buffer is None:
+                    continue
+                sparkline = self.sparklines.get(pid)
+                if sparkline is None:
+                    sparkline = self.sparklines[pid] = Sparkline()
+                sparkline.extend(buffer)
+
+    def clear(self):
+        """Forget every sparkline, e.g. when another host is shown"""
+        self.sparklines.clear()
+
+    def paint(self, painter, option, index):
+        super().paint(painter, option, index)
+        # The PID column carries the key of the row
+        sparkline = self.sparklines.get(index.siblingAtColumn(0).data(SORT_ROLE))
+        if sparkline is None or sparkline.points < 2:
+            return
+        rect = option.rect.adjusted(2, 0, -2, 0)
+        painter.save()
+        painter.setClipRect(rect)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setTransform(sparkline.transform(rect), True)
+        painter.setPen(self.pen)
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        painter.drawPath(sparkline.path)
+        painter.restore()
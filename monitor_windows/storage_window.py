@@ -1,10 +1,35 @@
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                           QLabel, QGroupBox, QProgressBar, QScrollArea)
-from PyQt6.QtCore import Qt, QTimer
+                           QLabel, QGroupBox, QProgressBar, QScrollArea, QPushButton)
+from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QIcon, QFont, QPainter, QPixmap
-from monitors.storage_monitor import StorageMonitor
+from monitor_windows.collector_thread import LOCAL_HOST, get_collector
+from monitor_windows.dir_scan_window import DirScanWindow
+from monitor_windows.table_models import Column, KeyedTableModel, create_table_view
 from monitor_windows.utils import create_emoji_icon
 
+
+def format_rate(bytes_per_sec):
+    """Convert bytes per second to human readable format"""
+    for unit in ['B/s', 'KB/s', 'MB/s', 'GB/s']:
+        if bytes_per_sec < 1024:
+            return f"{bytes_per_sec:.1f} {unit}"
+        bytes_per_sec /= 1024
+    return f"{bytes_per_sec:.1f} TB/s"
+
+
+# Columns of the per-disk table
+DISK_COLUMNS = [
+    Column("Disk", lambda d: d['name'], width=90),
+    Column("Mounted", lambda d: ", ".join(d['mountpoints']), width=160),
+    Column("Read IOPS", lambda d: d['read_iops'], lambda v: f"{v:.0f}", width=80, numeric=True),
+    Column("Write IOPS", lambda d: d['write_iops'], lambda v: f"{v:.0f}", width=80, numeric=True),
+    Column("Read", lambda d: d['read_rate'], format_rate, width=90, numeric=True),
+    Column("Write", lambda d: d['write_rate'], format_rate, width=90, numeric=True),
+    Column("Util %", lambda d: d['util_percent'], lambda v: f"{v:.1f}", width=60, numeric=True),
+    Column("Await ms", lambda d: d['await_ms'], lambda v: f"{v:.2f}", width=70, numeric=True),
+    Column("Queue", lambda d: d['queue_depth'], width=60, numeric=True)
+]
+
 class StorageWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -12,8 +37,9 @@ class StorageWindow(QMainWindow):
         self.setMinimumSize(600, 800)
         self.setWindowIcon(create_emoji_icon('💾'))
         
-        # Initialize storage monitor
-        self.storage_monitor = StorageMonitor()
+        # Receive storage snapshots from the background collector
+        self.collector = get_collector()
+        self.collector.snapshot_ready.connect(self.on_snapshot)
         
         # Create scroll area
         scroll = QScrollArea()
@@ -41,13 +67,24 @@ class StorageWindow(QMainWindow):
         # Dictionary to store partition widgets
         self.partition_widgets = {}
         
-        # Set up timer for updates
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_info)
-        self.timer.start(1000)  # Update every second
-        
-        # Initial update
-        self.update_info()
+        # Disk usage windows by mountpoint; each keeps its directory size
+        # cache, so analyzing a partition again only lists what changed
+        self.scan_windows = {}
+
+    def showEvent(self, event):
+        """Start receiving storage snapshots while the window is visible"""
+        self.collector.subscribe('storage', self)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        """Stop sampling storage while the window is hidden"""
+        self.collector.unsubscribe('storage', self)
+        super().hideEvent(event)
+
+    def on_snapshot(self, family, snapshot):
+        """Handle a snapshot published by the collector"""
+        if family == 'storage':
+            self.update_info(snapshot)
 
     def create_welcome_header(self, layout):
         """Create welcome header"""
@@ -103,6 +140,11 @@ class StorageWindow(QMainWindow):
         
         io_layout.addLayout(stats_layout)
         io_layout.addWidget(self.io_details_label)
+
+        # Per-disk IOPS, throughput, utilisation and latency
+        self.disk_model = KeyedTableModel(DISK_COLUMNS, lambda d: d['name'])
+        self.disk_table, self.disk_proxy = create_table_view(self.disk_model, sort_column=6)
+        io_layout.addWidget(self.disk_table)
         self.io_group.setLayout(io_layout)
         layout.addWidget(self.io_group)
         
@@ -139,14 +181,20 @@ class StorageWindow(QMainWindow):
             details = QLabel()
             details.setTextFormat(Qt.TextFormat.RichText)
             
+            # Find out what is using the space
+            analyze = QPushButton("Analyze...")
+            analyze.clicked.connect(lambda checked, device=device: self.analyze_partition(device))
+            
             layout.addWidget(progress)
             layout.addWidget(details)
+            layout.addWidget(analyze, alignment=Qt.AlignmentFlag.AlignRight)
             group.setLayout(layout)
             
             self.partition_widgets[device] = {
                 'group': group,
                 'progress': progress,
-                'details': details
+                'details': details,
+                'analyze': analyze
             }
             
             self.partitions_layout.addWidget(group)
@@ -154,6 +202,9 @@ class StorageWindow(QMainWindow):
         # Update widgets with current values
         widgets = self.partition_widgets[device]
         widgets['progress'].setValue(int(partition['percent']))
+        widgets['mountpoint'] = partition['mountpoint']
+        # Only this computer's filesystems can be walked
+        widgets['analyze'].setEnabled(self.collector.current_host == LOCAL_HOST)
         
         details_text = (
             f"<b>Filesystem:</b> {partition['fstype']}<br>"
@@ -163,21 +214,25 @@ class StorageWindow(QMainWindow):
             f"({partition['percent']}%)<br>"
             f"<b>Free Space:</b> {self.format_bytes(partition['free'])}"
         )
+        if partition.get('stale'):
+            # The filesystem did not answer in time; these are older figures
+            details_text += "<br><i>Not responding, showing the last known usage</i>"
         widgets['details'].setText(details_text)
 
-    def calculate_speed(self, current_bytes, prev_bytes, interval):
-        #Calculate bytes per second
-        return (current_bytes - prev_bytes) / interval if prev_bytes is not None else 0
+    def analyze_partition(self, device):
+        """Open (or bring back) the disk usage window of a partition"""
+        mountpoint = self.partition_widgets[device]['mountpoint']
+        window = self.scan_windows.get(mountpoint)
+        if window is None:
+            window = self.scan_windows[mountpoint] = DirScanWindow(mountpoint)
+        elif not window.isVisible():
+            # Closing stopped the scan; look again, reusing the cache
+            window.start_scan()
+        window.show()
+        window.activateWindow()
 
-    def update_info(self):
+    def update_info(self, storage_info):
         #Update all storage information
-        # Store previous I/O values for speed calculation
-        self.prev_io = getattr(self, 'current_io', None)
-        self.prev_time = getattr(self, 'current_time', None)
-        
-        # Get current storage info
-        storage_info = self.storage_monitor.get_all_info()
-        
         # Update partition information
         current_devices = set()
         for partition in storage_info['partitions']:
@@ -193,27 +248,25 @@ class StorageWindow(QMainWindow):
         # Update I/O statistics
         io_info = storage_info['io']
         
-        # Calculate read/write speeds
-        if self.prev_io and self.prev_time:
-            interval = 1  # Update interval in seconds
-            read_speed = self.calculate_speed(
-                io_info['read_bytes'], 
-                self.prev_io['read_bytes'],
-                interval
-            )
-            write_speed = self.calculate_speed(
-                io_info['write_bytes'],
-                self.prev_io['write_bytes'],
-                interval
-            )
-            
+        # Speeds are measured by the collector against the time of each read
+        rates = storage_info.get('rates')
+        if rates:
             self.read_speed_label.setText(
-                f"Read Speed:\n{self.format_bytes(read_speed)}/s"
+                f"Read Speed:\n{self.format_bytes(rates['read_bytes'])}/s"
             )
             self.write_speed_label.setText(
-                f"Write Speed:\n{self.format_bytes(write_speed)}/s"
+                f"Write Speed:\n{self.format_bytes(rates['write_bytes'])}/s"
             )
         
+        # Update per-disk statistics, listing the partitions of each disk
+        mountpoints = {}
+        for partition in storage_info['partitions']:
+            mountpoints.setdefault(partition.get('disk'), []).append(partition['mountpoint'])
+        self.disk_model.set_rows([
+            dict(stats, name=disk, mountpoints=mountpoints.get(disk, []))
+            for disk, stats in storage_info.get('disk_stats', {}).items()
+        ])
+        
         # Update total read/write
         self.read_total_label.setText(
             f"Total Read:\n{self.format_bytes(io_info['read_bytes'])}"
@@ -241,7 +294,4 @@ class StorageWindow(QMainWindow):
             f"<b>Storage Status:</b> "
             f"{'Critical' if overall_usage > 90 else 'Warning' if overall_usage > 80 else 'Normal'}"
         )
-        self.performance_label.setText(performance_text)
-        
-        # Store current I/O values for next update
-        self.current_io = io_info
\ No newline at end of file
+        self.performance_label.setText(performance_text)
\ No newline at end of file
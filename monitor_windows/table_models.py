@@ -0,0 +1,549 @@
+from bisect import bisect_right
+
+from PyQt6.QtCore import (QAbstractProxyModel, QAbstractTableModel, QModelIndex, Qt,
+                          pyqtSignal)
+from PyQt6.QtWidgets import QAbstractItemView, QHeaderView, QTableView
+
+# Role that carries the raw (unformatted) value used for sorting
+SORT_ROLE = Qt.ItemDataRole.UserRole
+
+# Above this many separate runs of removed rows, SortFilterProxyModel
+# applies a refresh as a single layout change
+MAX_REMOVAL_RUNS = 32
+
+# Above this many separate runs of changed rows, SortFilterProxyModel
+# signals one range spanning all of them
+MAX_CHANGED_RUNS = 32
+
+# Up to this many rows that moved are placed with bisect; more are sorted
+# and merged with the others in one pass
+MAX_BISECT_ROWS = 64
+
+
+class Column:
+    """
+    Describes one column of a KeyedTableModel
+    """
+    def __init__(self, header, value, text=str, width=100, numeric=False, foreground=None):
+        self.header = header
+        # value(row) gets the raw value; text(value) formats it for display
+        self.value = value
+        self.text = text
+        self.width = width
+        self.numeric = numeric
+        # Optional foreground(row) returning a colour
+        self.foreground = foreground
+
+
+class KeyedTableModel(QAbstractTableModel):
+    """
+    A table of rows identified by a key.
+
+    set_rows() diffs the new rows against the current ones by key and only
+    removes, inserts or signals changes for the rows that differ, so views
+    keep their scroll position and selection. Cells are formatted when a
+    view asks for them, which means only the visible rows are formatted.
+    """
+    # Emitted once set_rows() has applied every change; the keys of the
+    # rows it added or changed and of those it removed are in
+    # changed_keys and removed_keys until the next update
+    rows_applied = pyqtSignal()
+
+    def __init__(self, columns, key, parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self.key = key
+        self.keys = []
+        self.rows = []
+        self.positions = {}
+        self.changed_keys = set()
+        self.removed_keys = set()
+        # Called by fetchMore() when views scroll to the end and the owner
+        # has said more rows are available
+        self.fetch_more = None
+        self.more_available = False
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.more_available and self.fetch_more is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            # Only ask once per update; the owner resets it with new rows
+            self.more_available = False
+            self.fetch_more()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.columns[section].header
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        column = self.columns[index.column()]
+        row = self.rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return column.text(column.value(row))
+        if role == SORT_ROLE:
+            return column.value(row)
+        if role == Qt.ItemDataRole.TextAlignmentRole and column.numeric:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        if role == Qt.ItemDataRole.ForegroundRole and column.foreground is not None:
+            return column.foreground(row)
+        return None
+
+    def keyed(self, rows):
+        """Map keys to rows, disambiguating rows that share a key"""
+        keyed = {}
+        for row in rows:
+            key = self.key(row)
+            if key in keyed:
+                n = 1
+                while (key, n) in keyed:
+                    n += 1
+                key = (key, n)
+            keyed[key] = row
+        return keyed
+
+    def set_rows(self, rows):
+        """Apply a new set of rows as removals, changes and insertions"""
+        new = self.keyed(rows)
+
+        removed = [key for key in self.positions if key not in new]
+        self.remove_positions([self.positions[key] for key in removed])
+
+        # Update rows that changed, signalling a single range for all of them
+        changed = set()
+        top = bottom = None
+        for i, key in enumerate(self.keys):
+            row = new[key]
+            old = self.rows[i]
+            if row is not old and row != old:
+                self.rows[i] = row
+                changed.add(key)
+                if top is None:
+                    top = i
+                bottom = i
+        if top is not None:
+            self.dataChanged.emit(self.index(top, 0),
+                                  self.index(bottom, len(self.columns) - 1))
+
+        appended = [(key, new[key]) for key in new if key not in self.positions]
+        changed.update(key for key, _ in appended)
+        self.append_rows(appended)
+        self.changed_keys = changed
+        self.removed_keys = set(removed)
+        self.rows_applied.emit()
+
+    def apply_changes(self, added=(), removed=(), changed=()):
+        """
+        Apply changes that are already known instead of diffing every row:
+        added and changed are rows, removed are keys. Keys must be unique.
+        """
+        positions = self.positions
+        removed = [key for key in removed if key in positions]
+        self.remove_positions([positions[key] for key in removed])
+
+        key = self.key
+        top = bottom = None
+        appended = []
+        changed_keys = set()
+        for row in changed:
+            i = self.positions.get(key(row))
+            if i is None:
+                appended.append((key(row), row))
+                continue
+            self.rows[i] = row
+            changed_keys.add(key(row))
+            top = i if top is None else min(top, i)
+            bottom = i if bottom is None else max(bottom, i)
+        if top is not None:
+            self.dataChanged.emit(self.index(top, 0),
+                                  self.index(bottom, len(self.columns) - 1))
+
+        appended.extend((key(row), row) for row in added if key(row) not in self.positions)
+        changed_keys.update(key for key, _ in appended)
+        self.append_rows(appended)
+        self.changed_keys = changed_keys
+        self.removed_keys = set(removed)
+        self.rows_applied.emit()
+
+    def remove_positions(self, positions):
+        """Remove the rows at positions, in contiguous runs from the bottom up"""
+        removed = sorted(positions, reverse=True)
+        j = 0
+        while j < len(removed):
+            last = first = removed[j]
+            j += 1
+            while j < len(removed) and removed[j] == first - 1:
+                first = removed[j]
+                j += 1
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.rows[first:last + 1]
+            del self.keys[first:last + 1]
+            self.endRemoveRows()
+        if len(self.keys) != len(self.positions):
+            self.positions = {key: i for i, key in enumerate(self.keys)}
+
+    def append_rows(self, rows):
+        """Append (key, row) pairs in one batch"""
+        if not rows:
+            return
+        start = len(self.rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        for key, row in rows:
+            self.positions[key] = len(self.keys)
+            self.keys.append(key)
+            self.rows.append(row)
+        self.endInsertRows()
+
+
+def sort_key(value):
+    """Sort key that orders None before any value"""
+    return (value is not None, value if value is not None else 0)
+
+
+class SortFilterProxyModel(QAbstractProxyModel):
+    """
+    Sorts and filters a KeyedTableModel.
+
+    QSortFilterProxyModel compares rows one data() call at a time, which
+    for a Python model means hundreds of thousands of calls into Python per
+    update at tens of thousands of rows. This proxy instead sorts and
+    filters the source rows in bulk with sorted() when its settings change.
+    On updates of the source only the rows that changed are re-filtered
+    and, if their sort value changed, moved with bisect into the existing
+    order. Views are told which rows left, which arrived and where rows
+    moved, tracking rows by key so that selections follow them, and which
+    rows changed.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.sort_column = None
+        self.sort_order = Qt.SortOrder.AscendingOrder
+        self.filter_column = 0
+        self.filter_text = ''
+        # Optional set of source keys to show, applied on top of the text filter
+        self.filter_keys = None
+        # Source keys in display order, and their display positions
+        self.order = []
+        self.positions = {}
+        # Sort values of the rows in display order, when sorted
+        self.values = None
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        model.rows_applied.connect(self.update_rows)
+        model.modelReset.connect(self.refresh)
+        self.refresh()
+
+    def setFilterKeyColumn(self, column):
+        self.filter_column = column
+        self.refresh()
+
+    def setFilterFixedString(self, text):
+        """Only show rows whose filter column contains text (any case)"""
+        self.filter_text = text.lower()
+        self.refresh()
+
+    def setFilterKeys(self, keys):
+        """Only show the rows whose key is in keys (None shows every row)"""
+        self.filter_keys = keys
+        self.refresh()
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self.sort_column = column if column >= 0 else None
+        self.sort_order = order
+        self.refresh()
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not (0 <= row < len(self.order)) or \
+                not (0 <= column < self.columnCount()):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        model = self.sourceModel()
+        return 0 if parent.isValid() or model is None else model.columnCount()
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        return self.sourceModel().headerData(section, orientation, role)
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QModelIndex()
+        model = self.sourceModel()
+        row = model.positions.get(self.order[proxy_index.row()])
+        if row is None:
+            return QModelIndex()
+        return model.index(row, proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        row = self.positions.get(self.sourceModel().keys[source_index.row()])
+        if row is None:
+            return QModelIndex()
+        return self.index(row, source_index.column())
+
+    def accepts(self, key, row):
+        """Check whether a source row passes the filters"""
+        if self.filter_keys is not None and key not in self.filter_keys:
+            return False
+        if self.filter_text:
+            column = self.sourceModel().columns[self.filter_column]
+            return self.filter_text in column.text(column.value(row)).lower()
+        return True
+
+    def visible_keys(self):
+        """
+        Get the keys of the source rows to show, in display order, and their
+        sort values (None when unsorted)
+        """
+        model = self.sourceModel()
+        rows = model.rows
+        indices = range(len(rows))
+        if self.filter_text:
+            column = model.columns[self.filter_column]
+            needle = self.filter_text
+            indices = [i for i in indices
+                       if needle in column.text(column.value(rows[i])).lower()]
+        if self.filter_keys is not None:
+            accepted = self.filter_keys
+            keys = model.keys
+            indices = [i for i in indices if keys[i] in accepted]
+        keys = model.keys
+        if self.sort_column is None:
+            return [keys[i] for i in indices], None
+
+        value = model.columns[self.sort_column].value
+        reverse = self.sort_order == Qt.SortOrder.DescendingOrder
+        # Mixed types (or None) in a column sort by sort_key()
+        values = [sort_key(value(rows[i])) for i in indices]
+        ranks = sorted(range(len(values)), key=values.__getitem__, reverse=reverse)
+        return [keys[indices[j]] for j in ranks], [values[j] for j in ranks]
+
+    def insertion_point(self, value):
+        """Get where a row with a sort value goes, after rows that tie"""
+        values = self.values
+        if self.sort_order != Qt.SortOrder.DescendingOrder:
+            return bisect_right(values, value)
+        low, high = 0, len(values)
+        while low < high:
+            middle = (low + high) // 2
+            if values[middle] < value:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def updated_order(self, changed, removed):
+        """
+        Get the display order and sort values after the source rows of
+        changed were added or changed and those of removed were removed,
+        and the keys of the rows that left and of those that arrived
+        """
+        model = self.sourceModel()
+        value = model.columns[self.sort_column].value
+        positions = self.positions
+        left = [key for key in removed if key in positions]
+        arrived = []
+        moved = set(left)
+        placed = []
+        for key in changed:
+            row = model.rows[model.positions[key]]
+            i = positions.get(key)
+            if not self.accepts(key, row):
+                if i is not None:
+                    left.append(key)
+                    moved.add(key)
+                continue
+            new_value = sort_key(value(row))
+            if i is None:
+                arrived.append(key)
+                placed.append((key, new_value))
+            elif self.values[i] != new_value:
+                moved.add(key)
+                placed.append((key, new_value))
+
+        order, values = self.order, self.values
+        if len(moved) > MAX_BISECT_ROWS:
+            kept = [i for i, key in enumerate(order) if key not in moved]
+            order = [order[i] for i in kept]
+            values = [values[i] for i in kept]
+        else:
+            order, values = list(order), list(values)
+            for i in sorted((positions[key] for key in moved), reverse=True):
+                del order[i]
+                del values[i]
+        if len(placed) > MAX_BISECT_ROWS:
+            # The rows that stayed are one sorted run, which sorted() only
+            # merges with the others
+            order += [key for key, _ in placed]
+            values += [new_value for _, new_value in placed]
+            ranks = sorted(range(len(values)), key=values.__getitem__,
+                           reverse=self.sort_order == Qt.SortOrder.DescendingOrder)
+            return [order[j] for j in ranks], [values[j] for j in ranks], left, arrived
+
+        self.values = values
+        for key, new_value in placed:
+            i = self.insertion_point(new_value)
+            order.insert(i, key)
+            values.insert(i, new_value)
+        return order, values, left, arrived
+
+    def relayout(self, new_order, new_positions):
+        """Switch to a new order in one layout change, following rows by key"""
+        self.layoutAboutToBeChanged.emit()
+        old_indexes = self.persistentIndexList()
+        new_indexes = []
+        for index in old_indexes:
+            row = new_positions.get(self.order[index.row()])
+            new_indexes.append(self.createIndex(row, index.column()) if row is not None
+                               else QModelIndex())
+        self.order = new_order
+        self.positions = new_positions
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
+
+    def refresh(self):
+        """Re-sort and re-filter every row after the settings changed"""
+        if self.sourceModel() is None:
+            return
+        new_order, new_values = self.visible_keys()
+        self.apply_order(new_order, new_values)
+        # Views only repaint the rows they show
+        if self.order:
+            self.dataChanged.emit(self.index(0, 0),
+                                  self.index(len(self.order) - 1, self.columnCount() - 1))
+
+    def update_rows(self):
+        """Re-sort and re-filter the rows the source added, changed or removed"""
+        model = self.sourceModel()
+        if self.sort_column is None or self.values is None:
+            self.apply_order(*self.visible_keys())
+        else:
+            try:
+                self.apply_order(*self.updated_order(model.changed_keys, model.removed_keys))
+            except TypeError:
+                # A value that does not compare with the others
+                self.apply_order(*self.visible_keys())
+        self.emit_changed(model.changed_keys)
+
+    def apply_order(self, new_order, new_values, left=None, arrived=None):
+        """
+        Switch to a new display order, signalling the fewest changes. The
+        keys of the rows that left and arrived are found unless given.
+        """
+        new_positions = {key: i for i, key in enumerate(new_order)}
+
+        # Rows that are gone or filtered out, in runs from the bottom up
+        if left is None:
+            removed = [i for i, key in enumerate(self.order) if key not in new_positions]
+            removed.reverse()
+        else:
+            removed = sorted((self.positions[key] for key in left), reverse=True)
+        runs = []
+        j = 0
+        while j < len(removed):
+            last = first = removed[j]
+            j += 1
+            while j < len(removed) and removed[j] == first - 1:
+                first = removed[j]
+                j += 1
+            runs.append((first, last))
+
+        if len(runs) > MAX_REMOVAL_RUNS:
+            # A filter that leaves scattered rows: signalling thousands of
+            # removals costs more than one layout change in which rows
+            # that left map to invalid indexes
+            self.relayout(new_order, new_positions)
+        else:
+            for first, last in runs:
+                self.beginRemoveRows(QModelIndex(), first, last)
+                del self.order[first:last + 1]
+                self.endRemoveRows()
+
+            # New rows are appended, then moved into place with the others
+            if arrived is None:
+                current = set(self.order)
+                added = [key for key in new_order if key not in current]
+            else:
+                added = arrived
+            if added:
+                start = len(self.order)
+                self.beginInsertRows(QModelIndex(), start, start + len(added) - 1)
+                self.order.extend(added)
+                self.positions = {key: i for i, key in enumerate(self.order)}
+                self.endInsertRows()
+
+            if self.order != new_order:
+                self.relayout(new_order, new_positions)
+            else:
+                self.positions = new_positions
+        self.values = new_values
+
+    def emit_changed(self, keys):
+        """Signal the shown rows of keys as changed, in runs"""
+        rows = sorted(self.positions[key] for key in keys if key in self.positions)
+        if not rows:
+            return
+        last_column = self.columnCount() - 1
+        runs = []
+        first = last = rows[0]
+        for row in rows[1:]:
+            if row != last + 1:
+                runs.append((first, last))
+                first = row
+            last = row
+        runs.append((first, last))
+        if len(runs) > MAX_CHANGED_RUNS:
+            runs = [(rows[0], rows[-1])]
+        for first, last in runs:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, last_column))
+
+
+def create_table_view(model, sort_column=None, descending=True, filter_column=None):
+    """
+    Create a QTableView showing model through a sorting and filtering proxy.
+    Columns have fixed initial widths so that no update ever measures rows.
+    """
+    proxy = SortFilterProxyModel()
+    proxy.setSourceModel(model)
+    if filter_column is not None:
+        proxy.setFilterKeyColumn(filter_column)
+
+    view = QTableView()
+    view.setModel(proxy)
+    # The proxy is owned by the view so that it lives as long as the view
+    proxy.setParent(view)
+    view.setSortingEnabled(True)
+    view.setWordWrap(False)
+    view.setAlternatingRowColors(True)
+    view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+    view.verticalHeader().setVisible(False)
+    view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+    view.verticalHeader().setDefaultSectionSize(view.fontMetrics().height() + 6)
+
+    header = view.horizontalHeader()
+    header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+    for i, column in enumerate(model.columns):
+        header.resizeSection(i, column.width)
+    header.setStretchLastSection(True)
+
+    if sort_column is not None:
+        order = Qt.SortOrder.DescendingOrder if descending else Qt.SortOrder.AscendingOrder
+        view.sortByColumn(sort_column, order)
+    return view, proxy
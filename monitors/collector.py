@@ -0,0 +1,194 @@
+from types import MappingProxyType
+from .history import HistoryStore, sample_time
+from .scheduler import STATIC, SLOW, FAST, DEFAULT_INTERVALS
+
+
+def freeze(value):
+    """Recursively convert monitor output into read-only containers"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class Collector:
+    """
+    Owns one instance of every monitor and turns their output into
+    immutable snapshots that can be handed to other threads safely
+    """
+    # How often each metric family changes
+    FAMILIES = {
+        'static': STATIC,
+        'system': SLOW,
+        'cpu': FAST,
+        'memory': FAST,
+        'storage': FAST,
+        'network': FAST,
+        'process': SLOW
+    }
+
+    # Monitor that produces each metric family
+    MONITORS = {
+        'static': 'system'
+    }
+
+    def __init__(self, intervals=None, backend='auto', history=None, metric_log=None):
+        # Monitors are created on first use so that whichever thread runs
+        # the collection also pays for their initialization
+        self.monitors = {}
+        self.intervals = dict(DEFAULT_INTERVALS, **(intervals or {}))
+        self.backend = backend
+        self.static_snapshot = None
+
+        # Every numeric sample is also appended to the history store
+        self.history = history if history is not None else HistoryStore()
+        self.recorded_pids = set()
+
+        # Optional MetricLogWriter that persists every sample to disk
+        self.metric_log = metric_log
+
+        # Keyword arguments passed to get_all_info() of each family
+        self.options = {}
+
+    def interval(self, family):
+        """Get the refresh interval of a family, or None if it never changes"""
+        return self.intervals.get(self.FAMILIES[family])
+
+    def create_monitor(self, family):
+        """Create the monitor responsible for a metric family"""
+        if family == 'system':
+            from .system_monitor import SystemMonitor
+            return SystemMonitor()
+        if family == 'cpu':
+            from .cpu_monitor import CPUMonitor
+            return CPUMonitor(self.backend)
+        if family == 'memory':
+            from .memory_monitor import MemoryMonitor
+            return MemoryMonitor(self.backend)
+        if family == 'storage':
+            from .storage_monitor import StorageMonitor
+            return StorageMonitor(self.backend)
+        if family == 'network':
+            from .network_monitor import NetworkMonitor
+            return NetworkMonitor(self.backend)
+        if family == 'process':
+            from .process_monitor import ProcessMonitor
+            return ProcessMonitor(self.backend)
+        raise ValueError(f"Unknown metric family: {family}")
+
+    def get_monitor(self, family):
+        """Get (creating if needed) the monitor for a metric family"""
+        name = self.MONITORS.get(family, family)
+        if name not in self.monitors:
+            self.monitors[name] = self.create_monitor(name)
+        return self.monitors[name]
+
+    def configure(self, family, options):
+        """Set the options a family is collected with, e.g. a process limit"""
+        self.options[family] = dict(options)
+
+    def collect(self, family):
+        """Collect one immutable snapshot for a metric family"""
+        if family == 'static':
+            # Static facts are only ever gathered once
+            if self.static_snapshot is None:
+                self.static_snapshot = freeze(self.get_monitor(family).get_static_info())
+            return self.static_snapshot
+        if family == 'system':
+            return freeze(self.get_monitor(family).get_dynamic_info())
+
+        info = self.get_monitor(family).get_all_info(**self.options.get(family, {}))
+        self.record(family, info, sample_time())
+        return freeze(info)
+
+    def record(self, family, info, timestamp):
+        """Append the numeric parts of a sample to the history (and log)"""
+        recorder = getattr(self, f'record_{family}', None)
+        if recorder is not None:
+            # Readers on other threads see whole samples, not half a tick
+            with self.history.lock:
+                recorder(info, timestamp)
+            if self.metric_log is not None:
+                self.metric_log.maybe_flush()
+
+    def append(self, name, timestamp, value):
+        """Append one sample to the history store and the metric log"""
+        self.history.append(name, timestamp, value)
+        if self.metric_log is not None:
+            self.metric_log.append(name, timestamp, value)
+
+    def close(self):
+        """Flush and seal the metric log, if any"""
+        if self.metric_log is not None:
+            self.metric_log.close()
+
+    def record_cpu(self, info, timestamp):
+        """Record total, per-core and per-state CPU usage"""
+        append = self.append
+        usage = info['usage']
+        append('cpu.total', timestamp, usage['total'])
+        for i, percent in enumerate(usage['per_cpu']):
+            append(f'cpu.core.{i}', timestamp, percent)
+        for state, percent in usage['states'].items():
+            append(f'cpu.state.{state}', timestamp, percent)
+
+    def record_memory(self, info, timestamp):
+        """
+        Record RAM and swap usage, the memory breakdown, 10-second pressure
+        stall averages and paging rates
+        """
+        append = self.append
+        for section in ('ram', 'swap'):
+            for key in ('used', 'percent'):
+                append(f'memory.{section}.{key}', timestamp, info[section][key])
+        append('memory.ram.available', timestamp, info['ram']['available'])
+        for key, value in info.get('breakdown', {}).items():
+            append(f'memory.{key}', timestamp, value)
+        for resource, lines in info.get('pressure', {}).items():
+            for kind, values in lines.items():
+                append(f'pressure.{resource}.{kind}', timestamp, values['avg10'])
+        for key, value in info.get('paging', {}).items():
+            append(f'memory.paging.{key}', timestamp, value)
+
+    def record_storage(self, info, timestamp):
+        """
+        Record the IOPS, throughput, utilisation, latency and queue depth of
+        every whole disk, and per-partition usage. Cumulative counters and
+        partitions, loop devices and the like are left out.
+        """
+        append = self.append
+        for disk, stats in info.get('disk_stats', {}).items():
+            for key, value in stats.items():
+                append(f'disk.{disk}.{key}', timestamp, value)
+        for partition in info['partitions']:
+            append(f"partition.{partition['mountpoint']}.percent", timestamp,
+                   partition['percent'])
+
+    def record_network(self, info, timestamp):
+        """Record per-interface I/O counters"""
+        append = self.append
+        for nic, counters in info['per_nic'].items():
+            for key, value in counters.items():
+                append(f'net.{nic}.{key}', timestamp, value)
+
+    def record_process(self, info, timestamp):
+        """
+        Record CPU, RSS, thread count and I/O of the pinned processes,
+        forgetting processes that exited or were unpinned
+        """
+        append = self.append
+        pinned = self.options.get('process', {}).get('pinned', ())
+        pids = set()
+        for proc in info['processes']:
+            pid = proc['pid']
+            if pid not in pinned:
+                continue
+            pids.add(pid)
+            append(f'proc.{pid}.cpu_percent', timestamp, proc['cpu_percent'] or 0.0)
+            append(f'proc.{pid}.rss', timestamp, proc['rss'])
+            append(f'proc.{pid}.num_threads', timestamp, proc.get('num_threads', 0))
+            append(f'proc.{pid}.io_rate', timestamp, proc.get('io_rate', 0.0))
+        for pid in self.recorded_pids - pids:
+            self.history.drop(f'proc.{pid}.')
+        self.recorded_pids = pids
@@ -1,40 +1,123 @@
 import psutil
 import time
 from datetime import datetime
+from . import procfs
 
 class CPUMonitor:
     """
     A simple class to monitor CPU statistics
     """
-    def __init__(self):
+    # CPU states reported as a percentage of elapsed time
+    STATES = ('user', 'system', 'iowait', 'steal', 'irq')
+
+    # Guest time is already accounted for in user/nice time on Linux
+    GUEST_FIELDS = ('guest', 'guest_nice')
+
+    def __init__(self, backend='auto'):
+        # Use the /proc fast path when possible, psutil otherwise
+        self.proc_stat = procfs.open_reader(procfs.CPUTimesReader, backend)
+
         # Initialize any required variables
-        self.prev_cpu_times = psutil.cpu_times()
-    
-    def get_cpu_percent(self):
-        """Get CPU usage percentage"""
+        self.prev_cpu_times = self.read_cpu_times()
+        self.set_fields(getattr(self.prev_cpu_times[0], '_fields', procfs.CPU_FIELDS))
+
+        # Core counts and frequency limits never change, so read them once
+        self.cpu_count = None
+        self.freq_limits = None
+
+    def read_cpu_times(self):
+        """Read the time counters of every logical CPU in one call"""
+        if self.proc_stat is not None:
+            try:
+                return self.proc_stat.read()
+            except (OSError, ValueError, IndexError):
+                # Fall back to psutil for the rest of the session
+                self.proc_stat = None
+        return psutil.cpu_times(percpu=True)
+
+    def set_fields(self, fields):
+        """Remember where each CPU state lives in a cpu_times vector"""
+        self.fields = tuple(fields)
+        self.state_index = [
+            (state, self.fields.index(state))
+            for state in self.STATES if state in self.fields
+        ]
+        self.idle_index = [self.fields.index(name)
+                           for name in ('idle', 'iowait') if name in self.fields]
+        self.guest_index = [self.fields.index(name)
+                            for name in self.GUEST_FIELDS if name in self.fields]
+
+    def compute_percentages(self, previous, current):
+        """Turn two cpu_times readings into total, per-core and per-state usage"""
+        # A CPU was hot-plugged: there is nothing to compare against yet
+        if len(previous) != len(current):
+            previous = current
+
+        # Counters can step backwards slightly on some kernels
+        deltas = [[max(c - p, 0.0) for c, p in zip(cur, prev)]
+                  for prev, cur in zip(previous, current)]
+        total_delta = [sum(column) for column in zip(*deltas)] or [0.0] * len(self.fields)
+        per_cpu = [self.busy_percent(delta) for delta in deltas]
+
+        elapsed = self.elapsed(total_delta)
+        states = {state: 0.0 for state in self.STATES}
+        if elapsed > 0:
+            for state, i in self.state_index:
+                states[state] = round(total_delta[i] / elapsed * 100, 1)
+
         return {
-            'total': psutil.cpu_percent(interval=1),
-            'per_cpu': psutil.cpu_percent(interval=1, percpu=True)
+            'total': self.busy_percent(total_delta),
+            'per_cpu': per_cpu,
+            'states': states
         }
-    
+
+    def elapsed(self, delta):
+        """Get the elapsed CPU time covered by a delta vector"""
+        return sum(delta) - sum(delta[i] for i in self.guest_index)
+
+    def busy_percent(self, delta):
+        """Get the busy percentage of a delta vector"""
+        elapsed = self.elapsed(delta)
+        if elapsed <= 0:
+            return 0.0
+        idle = sum(delta[i] for i in self.idle_index)
+        return round(min(max((elapsed - idle) / elapsed * 100, 0.0), 100.0), 1)
+
+    def get_cpu_percent(self):
+        """Get CPU usage percentage since the previous call"""
+        current = self.read_cpu_times()
+        previous = self.prev_cpu_times
+        self.prev_cpu_times = current
+
+        fields = getattr(current[0], '_fields', None)
+        if fields is not None and fields != self.fields:
+            # psutil took over from the /proc reader; start a fresh baseline
+            self.set_fields(fields)
+            previous = current
+        return self.compute_percentages(previous, current)
+
     def get_cpu_freq(self):
         """Get CPU frequency information"""
         freq = psutil.cpu_freq()
         if freq:
+            if self.freq_limits is None:
+                self.freq_limits = (freq.min, freq.max)
             return {
                 'current': freq.current,
-                'min': freq.min,
-                'max': freq.max
+                'min': self.freq_limits[0],
+                'max': self.freq_limits[1]
             }
         return None
-    
+
     def get_cpu_count(self):
         """Get CPU core count"""
-        return {
-            'physical': psutil.cpu_count(logical=False),
-            'logical': psutil.cpu_count(logical=True)
-        }
-    
+        if self.cpu_count is None:
+            self.cpu_count = {
+                'physical': psutil.cpu_count(logical=False),
+                'logical': psutil.cpu_count(logical=True)
+            }
+        return self.cpu_count
+
     def get_all_info(self):
         """Get all CPU information"""
         return {
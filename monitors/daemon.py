@@ -0,0 +1,184 @@
+"""
+Headless collector daemon.
+
+Runs the collectors on their cadences without any GUI and persists every
+sample to the metric log. Nothing here (or in anything it imports) may
+import PyQt6, so the daemon starts quickly and stays small on servers.
+Run it with `python -m monitors`.
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+from .collector import Collector
+from .scheduler import Scheduler, SLOW, FAST
+
+# Families that produce numeric series worth recording
+DEFAULT_FAMILIES = ('cpu', 'memory', 'storage', 'network')
+# The metrics endpoint also exports the busiest processes
+EXPORTER_FAMILIES = DEFAULT_FAMILIES + ('process',)
+# An agent streams everything a dashboard can display
+AGENT_FAMILIES = tuple(Collector.FAMILIES)
+
+DEFAULT_LOG_DIR = os.path.join(os.path.expanduser('~'), '.resource-monitor', 'metrics')
+
+
+class Daemon:
+    """
+    Samples a set of metric families on a Scheduler until stopped
+    """
+    def __init__(self, collector, families):
+        self.collector = collector
+        self.families = families
+        self.scheduler = Scheduler()
+        self.stopping = threading.Event()
+        self.exporter = None
+        self.agent = None
+        # Callables invoked with (family, snapshot) after every sample
+        self.listeners = []
+
+        for family in families:
+            self.scheduler.add(family, collector.interval(family),
+                               lambda f=family: self.collect(f))
+
+    def collect(self, family):
+        """Collect a family and hand the snapshot to the listeners"""
+        try:
+            snapshot = self.collector.collect(family)
+        except Exception as e:
+            print(f"Error collecting {family}: {e}", file=sys.stderr)
+            return
+        for listener in self.listeners:
+            listener(family, snapshot)
+
+    def run(self):
+        """Collect until stop() is called, then flush everything"""
+        if self.exporter is not None:
+            self.exporter.start()
+        if self.agent is not None:
+            self.agent.start()
+        try:
+            while not self.stopping.is_set():
+                deadline = self.scheduler.next_deadline()
+                if deadline is None:
+                    break
+                delay = deadline - time.monotonic()
+                if delay > 0 and self.stopping.wait(delay):
+                    break
+                self.scheduler.run_pending()
+        finally:
+            if self.exporter is not None:
+                self.exporter.stop()
+            if self.agent is not None:
+                self.agent.stop()
+            self.collector.close()
+
+    def stop(self, *args):
+        """Ask the run loop to exit; safe to use as a signal handler"""
+        self.stopping.set()
+
+
+def parse_args(argv=None):
+    """Parse the daemon's command line"""
+    parser = argparse.ArgumentParser(
+        prog='python -m monitors',
+        description="Collect system metrics without a GUI")
+    parser.add_argument('--collectors', default=None,
+                        help="comma-separated families to collect, from: "
+                             + ', '.join(AGENT_FAMILIES)
+                             + f" (default: {','.join(DEFAULT_FAMILIES)}, plus process with "
+                             "--metrics-port, or all with --serve)")
+    parser.add_argument('--fast-interval', type=float, default=None,
+                        help="seconds between cpu, memory, storage and network samples")
+    parser.add_argument('--slow-interval', type=float, default=None,
+                        help="seconds between process samples")
+    parser.add_argument('--backend', choices=('auto', 'procfs', 'psutil'), default='auto',
+                        help="where to read counters from (default: auto)")
+    parser.add_argument('--log-dir', default=DEFAULT_LOG_DIR,
+                        help=f"metric log directory (default: {DEFAULT_LOG_DIR})")
+    parser.add_argument('--no-log', action='store_true',
+                        help="do not write the metric log")
+    parser.add_argument('--flush-interval', type=float, default=5.0,
+                        help="seconds between metric log writes (default: 5)")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="serve OpenMetrics on this port (default: disabled)")
+    parser.add_argument('--metrics-host', default='127.0.0.1',
+                        help="address the metrics endpoint binds to (default: 127.0.0.1)")
+    parser.add_argument('--top-processes', type=int, default=10,
+                        help="processes exported by the metrics endpoint (default: 10)")
+    parser.add_argument('--serve', metavar='ADDRESS', default=None,
+                        help="stream snapshots to dashboards on PORT, HOST:PORT or "
+                             "unix:PATH (a bare port binds to 127.0.0.1)")
+    parser.add_argument('--token-file', default=None,
+                        help="only stream to dashboards that know the token in this file")
+    args = parser.parse_args(argv)
+
+    if args.collectors is None:
+        if args.serve:
+            args.collectors = ','.join(AGENT_FAMILIES)
+        elif args.metrics_port is not None:
+            args.collectors = ','.join(EXPORTER_FAMILIES)
+        else:
+            args.collectors = ','.join(DEFAULT_FAMILIES)
+    args.families = [family.strip() for family in args.collectors.split(',') if family.strip()]
+    unknown = sorted(set(args.families) - set(AGENT_FAMILIES))
+    if unknown:
+        parser.error(f"unknown collectors: {', '.join(unknown)}")
+    for name in ('fast_interval', 'slow_interval', 'flush_interval'):
+        value = getattr(args, name)
+        if value is not None and value <= 0:
+            parser.error(f"--{name.replace('_', '-')} must be positive")
+    return args
+
+
+def build_daemon(args):
+    """Create the collector, metric log and daemon described by args"""
+    intervals = {}
+    if args.fast_interval is not None:
+        intervals[FAST] = args.fast_interval
+    if args.slow_interval is not None:
+        intervals[SLOW] = args.slow_interval
+
+    metric_log = None
+    if not args.no_log:
+        from .metric_log import MetricLogWriter
+        try:
+            metric_log = MetricLogWriter(args.log_dir, flush_interval=args.flush_interval)
+        except OSError as e:
+            sys.exit(f"Cannot write the metric log: {e} (see --log-dir and --no-log)")
+
+    collector = Collector(intervals, backend=args.backend, metric_log=metric_log)
+    daemon = Daemon(collector, args.families)
+
+    if args.metrics_port is not None:
+        from .exporter import MetricsExporter
+        daemon.exporter = MetricsExporter(args.metrics_host, args.metrics_port,
+                                          args.top_processes)
+        daemon.listeners.append(daemon.exporter.update)
+        if args.serve is None:
+            # Only the busiest processes are exported, so only they need
+            # sampling on every tick (agents stream the full list)
+            collector.configure('process', {'limit': args.top_processes})
+
+    if args.serve is not None:
+        from .remote import AgentServer, read_token
+        token = None
+        if args.token_file is not None:
+            try:
+                token = read_token(args.token_file)
+            except (OSError, ValueError) as e:
+                sys.exit(f"Cannot read the token: {e}")
+        daemon.agent = AgentServer(args.serve, token=token)
+        daemon.listeners.append(daemon.agent.publish)
+    return daemon
+
+
+def main(argv=None):
+    """Entry point of `python -m monitors`"""
+    daemon = build_daemon(parse_args(argv))
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run()
+    return 0
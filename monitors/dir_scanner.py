@@ -0,0 +1,353 @@
+"""
+Parallel directory size scanner, to find out what is filling a partition.
+
+A DirScanner walks a tree with os.scandir from a pool of daemon threads,
+depth first so the queue of pending directories stays small, and never
+leaves the filesystem it started on. Sizes are allocated bytes (what
+counts against the partition), hard-linked files are counted once and
+symlinks are never followed.
+
+Only aggregates are kept while scanning: directories that are still being
+walked, the first level below the root (for a treemap) and a bounded heap
+of the directories holding the most bytes directly, so memory does not
+grow with the number of files. Results stream: progress() can be called at
+any time for a consistent snapshot of what has been counted so far.
+
+A DirSizeCache remembers, per directory, its (inode, mtime) and the names
+it directly contains. A directory's mtime changes whenever an entry is
+added, removed or renamed in it, so on a re-scan an unchanged directory is
+not listed again. Its entries are still stat'ed by name, relative to the
+open directory where the platform allows it: a file that grows in place
+does not change its directory's mtime, and subdirectories have to be
+checked for changes of their own. Hard-linked files are counted once per
+scan by inode, whether a directory was listed or came from the cache.
+Listings that failed are not cached, and the least recently used ones are
+dropped beyond MAX_CACHED_DIRECTORIES.
+"""
+import heapq
+import os
+import queue
+import stat
+import threading
+import time
+
+# Directories listed in the top-N of progress()
+TOP_DIRECTORIES = 50
+
+# Worker threads walking the tree
+SCAN_WORKERS = 8
+
+# Directory listings a DirSizeCache keeps
+MAX_CACHED_DIRECTORIES = 100000
+
+
+def allocated(info):
+    """Get the bytes a file takes up, where the platform reports them"""
+    blocks = getattr(info, 'st_blocks', None)
+    return blocks * 512 if blocks is not None else info.st_size
+
+
+class CachedDirectory:
+    """
+    The names one directory directly contains, as of its (inode, mtime)
+    """
+    def __init__(self, mtime, files, subdirs):
+        self.mtime = mtime
+        # Names of the entries that are not directories
+        self.files = files
+        # Names of the subdirectories
+        self.subdirs = subdirs
+
+
+class DirectoryContents:
+    """
+    What one scan found directly in a directory
+    """
+    def __init__(self):
+        # Bytes and count of the files that are not hard-linked
+        self.size = 0
+        self.files = 0
+        # (inode, bytes) of the hard-linked files, deduplicated per scan
+        self.linked = []
+
+    def add(self, info):
+        """Count a file from its stat result"""
+        if info.st_nlink > 1:
+            # Counted once per scan, in DirScanner.scan()
+            self.linked.append((info.st_ino, allocated(info)))
+        else:
+            self.size += allocated(info)
+            self.files += 1
+
+
+class DirSizeCache:
+    """
+    Directory contents by (device, inode), shared between scans of a tree,
+    in least recently used order
+    """
+    def __init__(self, capacity=MAX_CACHED_DIRECTORIES):
+        self.lock = threading.Lock()
+        self.capacity = capacity
+        self.directories = {}
+
+    def __len__(self):
+        return len(self.directories)
+
+    def get(self, key, mtime):
+        """Get the cached contents of a directory if it did not change"""
+        with self.lock:
+            cached = self.directories.pop(key, None)
+            if cached is None or cached.mtime != mtime:
+                return None
+            self.directories[key] = cached
+        return cached
+
+    def put(self, key, cached):
+        """Cache the contents of a directory, evicting the least recently used"""
+        with self.lock:
+            self.directories.pop(key, None)
+            self.directories[key] = cached
+            while len(self.directories) > self.capacity:
+                del self.directories[next(iter(self.directories))]
+
+
+class ScanNode:
+    """
+    A directory whose subtree is still being walked
+    """
+    def __init__(self, path, parent, top):
+        self.path = path
+        self.parent = parent
+        # Index of the first-level directory this one belongs to (None for the root)
+        self.top = top
+        # Subdirectories still being walked, plus one for the listing itself
+        self.pending = 1
+
+
+class DirScanner:
+    """
+    Walks one filesystem below root in the background; see the module
+    docstring. start() returns immediately, cancel() stops the walk.
+    """
+    def __init__(self, root, cache=None, workers=SCAN_WORKERS, top=TOP_DIRECTORIES):
+        self.root = os.path.abspath(root)
+        self.cache = cache if cache is not None else DirSizeCache()
+        self.workers = workers
+        self.top = top
+        self.lock = threading.Lock()
+        self.queue = queue.LifoQueue()
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+        self.threads = []
+        self.device = None
+
+        # Totals so far
+        self.size = 0
+        self.files = 0
+        self.directories = 0
+        self.cached_directories = 0
+        self.errors = 0
+        self.started = None
+        self.elapsed = 0.0
+        # First-level entries: names and their sizes so far (files directly
+        # in the root are summed under None)
+        self.top_names = []
+        self.top_sizes = []
+        self.root_files = 0
+        # Min-heap of (bytes directly inside, path)
+        self.heaviest = []
+        # Inodes of hard-linked files already counted
+        self.linked = set()
+
+    def start(self):
+        """Start walking in the background"""
+        try:
+            info = os.stat(self.root)
+        except OSError:
+            self.finished.set()
+            self.errors += 1
+            return
+        self.device = info.st_dev
+        self.started = time.monotonic()
+        self.queue.put((ScanNode(self.root, None, None), info))
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self.run, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def cancel(self):
+        """Stop walking; the partial results stay available"""
+        self.cancelled.set()
+
+    def done(self):
+        """Check whether the walk finished (or was cancelled)"""
+        return self.finished.is_set() or self.cancelled.is_set()
+
+    def run(self):
+        """Worker thread: list directories until the walk is over"""
+        while not self.done():
+            try:
+                node, info = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            self.scan(node, info)
+
+    def scan(self, node, info):
+        """List one directory (or reuse its cached listing) and queue its subdirectories"""
+        key = (info.st_dev, info.st_ino)
+        cached = self.cache.get(key, info.st_mtime_ns)
+        from_cache = cached is not None
+        if from_cache:
+            measured = self.measure_directory(node.path, cached)
+        else:
+            measured = self.list_directory(node.path, info.st_mtime_ns)
+        if measured is None:
+            return
+        listing, contents, subdirs = measured
+        # An unreadable directory is tried again by the next scan
+        if not from_cache and listing.mtime is not None:
+            self.cache.put(key, listing)
+
+        with self.lock:
+            # Hard-linked files count in the first directory this scan sees them in
+            size = contents.size
+            files = contents.files
+            for inode, linked_size in contents.linked:
+                if inode not in self.linked:
+                    self.linked.add(inode)
+                    size += linked_size
+                    files += 1
+            self.directories += 1
+            self.cached_directories += from_cache
+            self.files += files
+            if node.parent is None:
+                self.root_files += size
+            for path, name, sub in subdirs:
+                top = node.top
+                if node.parent is None:
+                    top = len(self.top_names)
+                    self.top_names.append(name)
+                    self.top_sizes.append(0)
+                node.pending += 1
+                self.queue.put((ScanNode(path, node, top), sub))
+            if size:
+                entry = (size, node.path)
+                if len(self.heaviest) < self.top:
+                    heapq.heappush(self.heaviest, entry)
+                elif entry > self.heaviest[0]:
+                    heapq.heapreplace(self.heaviest, entry)
+            # The directory's own blocks count too, as they do for du
+            self.add_size(node, size + getattr(info, 'st_blocks', 0) * 512)
+            self.complete(node)
+
+    def accept_subdir(self, path, name, info, subdirs):
+        """Keep a subdirectory to walk if it is on the scanned filesystem"""
+        if stat.S_ISDIR(info.st_mode) and info.st_dev == self.device:
+            subdirs.append((os.path.join(path, name), name, info))
+
+    def list_directory(self, path, mtime):
+        """
+        List and measure a directory: get (listing to cache, contents,
+        subdirectories as (path, name, stat result)), or None if the scan
+        was cancelled meanwhile. The mtime of a listing that failed is None.
+        """
+        names = []
+        subdir_names = []
+        contents = DirectoryContents()
+        subdirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if self.cancelled.is_set():
+                        # A partial listing must not be cached
+                        return None
+                    try:
+                        info = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        subdir_names.append(entry.name)
+                        self.accept_subdir(path, entry.name, info, subdirs)
+                    else:
+                        names.append(entry.name)
+                        contents.add(info)
+        except OSError:
+            with self.lock:
+                self.errors += 1
+            mtime = None
+        return CachedDirectory(mtime, tuple(names), tuple(subdir_names)), contents, subdirs
+
+    def measure_directory(self, path, cached):
+        """
+        Stat the entries of a cached listing, since files may have grown
+        in place: get (listing, contents, subdirectories) as
+        list_directory() does, or None if the scan was cancelled meanwhile
+        """
+        contents = DirectoryContents()
+        subdirs = []
+        directory = None
+        if os.stat in os.supports_dir_fd:
+            try:
+                directory = os.open(path, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+            except OSError:
+                pass
+        try:
+            for names, is_subdir in ((cached.files, False), (cached.subdirs, True)):
+                for name in names:
+                    if self.cancelled.is_set():
+                        return None
+                    try:
+                        if directory is not None:
+                            info = os.stat(name, dir_fd=directory, follow_symlinks=False)
+                        else:
+                            info = os.stat(os.path.join(path, name), follow_symlinks=False)
+                    except OSError:
+                        # Removed since, without the directory changing
+                        continue
+                    if is_subdir:
+                        self.accept_subdir(path, name, info, subdirs)
+                    elif not stat.S_ISDIR(info.st_mode):
+                        contents.add(info)
+        finally:
+            if directory is not None:
+                os.close(directory)
+        return cached, contents, subdirs
+
+    def add_size(self, node, size):
+        """Count bytes found in a directory (the lock must be held)"""
+        self.size += size
+        if node.top is not None:
+            self.top_sizes[node.top] += size
+
+    def complete(self, node):
+        """Mark one pending part of node done, finishing ancestors as they complete (lock held)"""
+        while node is not None:
+            node.pending -= 1
+            if node.pending:
+                return
+            if node.parent is None:
+                self.elapsed = time.monotonic() - self.started
+                self.finished.set()
+                return
+            node = node.parent
+
+    def progress(self):
+        """Get a snapshot of the results so far"""
+        with self.lock:
+            elapsed = self.elapsed if self.finished.is_set() else \
+                time.monotonic() - self.started if self.started else 0.0
+            children = sorted(zip(self.top_sizes, self.top_names), reverse=True)
+            return {
+                'root': self.root,
+                'done': self.done(),
+                'cancelled': self.cancelled.is_set() and not self.finished.is_set(),
+                'size': self.size,
+                'files': self.files,
+                'directories': self.directories,
+                'cached_directories': self.cached_directories,
+                'errors': self.errors,
+                'elapsed': elapsed,
+                'children': [(name, size) for size, name in children if size]
+                            + ([(None, self.root_files)] if self.root_files else []),
+                'heaviest': [(path, size) for size, path in sorted(self.heaviest, reverse=True)]
+            }
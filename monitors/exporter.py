@@ -0,0 +1,247 @@
+"""
+OpenMetrics (Prometheus) exporter.
+
+The exporter is a collector listener: every time a family is sampled its
+metrics are rendered to text once and the complete payload is rebuilt.
+HTTP scrapes only ever send that cached payload, so any number of
+concurrent scrapers cost no extra collection work.
+"""
+import gzip
+import heapq
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+PREFIX = 'resmon_'
+
+# Families in the order they appear in the payload
+FAMILY_ORDER = ('cpu', 'memory', 'storage', 'network', 'process')
+
+
+def escape(value):
+    """Escape a label value"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    """Format a dict of labels as {name="value",...}"""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class MetricWriter:
+    """
+    Accumulates the text of metric families for one section of the payload
+    """
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, metric_type, help_text, samples, unit=None):
+        """
+        Write one metric family. samples is a list of (labels, value);
+        counters get the _total suffix on their samples.
+        """
+        name = PREFIX + name
+        self.lines.append(f'# TYPE {name} {metric_type}')
+        if unit:
+            self.lines.append(f'# UNIT {name} {unit}')
+        self.lines.append(f'# HELP {name} {help_text}')
+        suffix = '_total' if metric_type == 'counter' else ''
+        for labels, value in samples:
+            if value is None:
+                continue
+            self.lines.append(f'{name}{suffix}{format_labels(labels)} {value}')
+
+    def text(self):
+        """Get the rendered section"""
+        return '\n'.join(self.lines) + '\n' if self.lines else ''
+
+
+def render_cpu(out, info):
+    """Render CPU usage and frequency"""
+    usage = info['usage']
+    out.family('cpu_usage_percent', 'gauge', "Total CPU usage",
+               [({}, usage['total'])])
+    out.family('cpu_core_usage_percent', 'gauge', "Usage of each logical CPU",
+               [({'core': i}, percent) for i, percent in enumerate(usage['per_cpu'])])
+    out.family('cpu_state_percent', 'gauge', "Share of CPU time spent in each state",
+               [({'state': state}, percent) for state, percent in usage['states'].items()])
+    frequency = info['frequency']
+    if frequency:
+        out.family('cpu_frequency_megahertz', 'gauge', "Current CPU frequency",
+                   [({}, frequency['current'])])
+
+
+def render_memory(out, info):
+    """Render RAM and swap usage, the memory breakdown and stall times"""
+    for section, label in (('ram', 'memory'), ('swap', 'swap')):
+        values = info[section]
+        for key in ('total', 'used', 'free'):
+            out.family(f'{label}_{key}_bytes', 'gauge', f"{label.capitalize()} {key}",
+                       [({}, values[key])], unit='bytes')
+        out.family(f'{label}_usage_percent', 'gauge', f"{label.capitalize()} usage",
+                   [({}, values['percent'])])
+    out.family('memory_available_bytes', 'gauge', "Memory available without swapping",
+               [({}, info['ram']['available'])], unit='bytes')
+    for key, value in info.get('breakdown', {}).items():
+        out.family(f'memory_{key}_bytes', 'gauge', f"Memory {key.replace('_', ' ')}",
+                   [({}, value)], unit='bytes')
+    pressure = info.get('pressure', {})
+    if pressure:
+        out.family('pressure_stalled_seconds', 'counter',
+                   "Time some or all tasks were stalled waiting for a resource",
+                   [({'resource': resource, 'kind': kind}, values['total'] / 1e6)
+                    for resource, lines in pressure.items() for kind, values in lines.items()],
+                   unit='seconds')
+
+
+def render_storage(out, info):
+    """Render per-partition usage and per-disk counters"""
+    partitions = info['partitions']
+    for key in ('total', 'used', 'free'):
+        out.family(f'partition_{key}_bytes', 'gauge', f"Partition space {key}",
+                   [({'device': p['device'], 'mountpoint': p['mountpoint'],
+                      'fstype': p['fstype']}, p[key]) for p in partitions], unit='bytes')
+    out.family('partition_usage_percent', 'gauge', "Partition space usage",
+               [({'device': p['device'], 'mountpoint': p['mountpoint'],
+                  'fstype': p['fstype']}, p['percent']) for p in partitions])
+
+    per_disk = info['per_disk']
+    for key, name, help_text in (
+            ('read_bytes', 'disk_read_bytes', "Bytes read from the disk"),
+            ('write_bytes', 'disk_written_bytes', "Bytes written to the disk"),
+            ('read_count', 'disk_reads_completed', "Reads completed"),
+            ('write_count', 'disk_writes_completed', "Writes completed")):
+        out.family(name, 'counter', help_text,
+                   [({'device': disk}, counters[key]) for disk, counters in per_disk.items()],
+                   unit='bytes' if key.endswith('bytes') else None)
+    # Timings are in milliseconds, and not available on every platform
+    for key, name, help_text in (
+            ('read_time', 'disk_read_time_seconds', "Time spent on reads"),
+            ('write_time', 'disk_write_time_seconds', "Time spent on writes"),
+            ('busy_time', 'disk_io_time_seconds', "Time the disk was busy with I/O")):
+        out.family(name, 'counter', help_text,
+                   [({'device': disk}, counters[key] / 1000)
+                    for disk, counters in per_disk.items() if key in counters],
+                   unit='seconds')
+    out.family('disk_utilisation_percent', 'gauge', "Share of time the disk was busy",
+               [({'device': disk}, stats['util_percent'])
+                for disk, stats in info.get('disk_stats', {}).items()])
+
+
+def render_network(out, info):
+    """Render per-interface counters"""
+    per_nic = info['per_nic']
+    for key, name, help_text in (
+            ('bytes_recv', 'network_receive_bytes', "Bytes received"),
+            ('bytes_sent', 'network_transmit_bytes', "Bytes sent"),
+            ('packets_recv', 'network_receive_packets', "Packets received"),
+            ('packets_sent', 'network_transmit_packets', "Packets sent"),
+            ('errin', 'network_receive_errors', "Receive errors"),
+            ('errout', 'network_transmit_errors', "Transmit errors"),
+            ('dropin', 'network_receive_drops', "Received packets dropped"),
+            ('dropout', 'network_transmit_drops', "Packets dropped on transmit")):
+        out.family(name, 'counter', help_text,
+                   [({'interface': nic}, counters[key]) for nic, counters in per_nic.items()],
+                   unit='bytes' if key.startswith('bytes') else None)
+
+
+def render_process(out, info, top_n):
+    """Render the process count and the busiest processes"""
+    processes = info['processes']
+    out.family('processes', 'gauge', "Number of processes", [({}, info['total_count'])])
+    top = heapq.nlargest(top_n, processes, key=lambda p: p['cpu_percent'] or 0.0)
+    out.family('process_cpu_percent', 'gauge', f"CPU usage of the top {top_n} processes",
+               [({'pid': p['pid'], 'name': p['name']}, p['cpu_percent'] or 0.0) for p in top])
+    out.family('process_resident_memory_bytes', 'gauge',
+               f"Resident memory of the top {top_n} processes",
+               [({'pid': p['pid'], 'name': p['name']}, p['rss']) for p in top], unit='bytes')
+
+
+class MetricsExporter:
+    """
+    Keeps a pre-rendered OpenMetrics payload of the latest snapshots and
+    serves it over HTTP
+    """
+    def __init__(self, host='127.0.0.1', port=9839, top_n=10):
+        self.host = host
+        self.port = port
+        self.top_n = top_n
+        self.sections = {}
+        self.payload = b'# EOF\n'
+        self.compressed = None
+        self.lock = threading.Lock()
+        self.server = None
+        self.server_thread = None
+
+    def update(self, family, snapshot):
+        """Collector listener: re-render a family and rebuild the payload"""
+        out = MetricWriter()
+        if family == 'cpu':
+            render_cpu(out, snapshot)
+        elif family == 'memory':
+            render_memory(out, snapshot)
+        elif family == 'storage':
+            render_storage(out, snapshot)
+        elif family == 'network':
+            render_network(out, snapshot)
+        elif family == 'process':
+            render_process(out, snapshot, self.top_n)
+        else:
+            return
+
+        self.sections[family] = out.text()
+        payload = ''.join(self.sections.get(name, '') for name in FAMILY_ORDER) + '# EOF\n'
+        with self.lock:
+            self.payload = payload.encode()
+            self.compressed = None
+
+    def get_payload(self, compress=False):
+        """Get the cached payload, gzip-compressed at most once per sample"""
+        with self.lock:
+            if not compress:
+                return self.payload
+            if self.compressed is None:
+                self.compressed = gzip.compress(self.payload, compresslevel=1)
+            return self.compressed
+
+    def start(self):
+        """Serve /metrics from a background thread"""
+        self.server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        self.server.daemon_threads = True
+        self.server.exporter = self
+        # Port 0 picks a free port; report the real one
+        self.port = self.server.server_address[1]
+        self.server_thread = threading.Thread(target=self.server.serve_forever,
+                                              name='metrics-exporter', daemon=True)
+        self.server_thread.start()
+
+    def stop(self):
+        """Stop serving"""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Answers scrapes with the exporter's cached payload
+    """
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        compress = 'gzip' in self.headers.get('Accept-Encoding', '')
+        body = self.server.exporter.get_payload(compress)
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Scrapes are frequent; do not log each one"""
@@ -0,0 +1,349 @@
+import sys
+import threading
+import time
+from array import array
+
+# Bucket width (seconds) and number of buckets of each rollup tier:
+# one hour of 10 s buckets, one day of 1 min buckets, one week of 1 h buckets
+DEFAULT_TIERS = ((10, 360), (60, 1440), (3600, 168))
+
+# Series that get rollup tiers; per-core and per-process series only keep
+# raw samples
+ROLLUP_PREFIXES = ('cpu.total', 'cpu.state.', 'memory.', 'pressure.', 'disk.', 'net.',
+                   'partition.')
+
+# Caps on the number of series, and of series with rollup tiers. A series
+# takes 16 bytes per raw sample (9.6 KB at the default capacity) and the
+# default tiers another 40 bytes per bucket (79 KB), so the store is bounded
+# to about 10 MB of raw samples plus 10 MB of rollups.
+MAX_SERIES = 1024
+MAX_ROLLUPS = 128
+
+# Steady clock behind sample timestamps: CLOCK_BOOTTIME keeps counting
+# while the machine is suspended, unlike time.monotonic() on Linux
+BOOT_CLOCK = getattr(time, 'CLOCK_BOOTTIME', None)
+
+
+def steady_clock():
+    """Get seconds from a clock that never steps"""
+    if BOOT_CLOCK is not None:
+        return time.clock_gettime(BOOT_CLOCK)
+    return time.monotonic()
+
+
+# Fixed once, so that wall clock steps (NTP, manual changes) never reorder
+# samples, which ring searches and rollup buckets rely on
+EPOCH_OFFSET = time.time() - steady_clock()
+
+
+def sample_time():
+    """Get a timestamp for a sample: seconds since the epoch, never decreasing"""
+    return EPOCH_OFFSET + steady_clock()
+
+
+def ring_ranges(count, capacity, start, stop):
+    """
+    Map logical indexes start..stop of a ring that has seen count items
+    (0 is the oldest retained item) to up to two physical index ranges
+    """
+    size = min(count, capacity)
+    start = max(0, min(start, size))
+    stop = max(start, min(stop, size))
+    if start == stop:
+        return []
+
+    # Physical index of the oldest retained item
+    first = (count - size) % capacity
+    begin = (first + start) % capacity
+    end = begin + (stop - start)
+    if end <= capacity:
+        return [(begin, end)]
+    return [(begin, capacity), (0, end - capacity)]
+
+
+def ring_search(column, count, capacity, timestamp):
+    """Get the logical index of the first entry of column at or after timestamp"""
+    size = min(count, capacity)
+    first = (count - size) % capacity
+    lo, hi = 0, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if column[(first + mid) % capacity] < timestamp:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def slope(segments):
+    """
+    Get the least-squares slope (change per second) of (timestamps, values)
+    segments, or None with fewer than two samples
+    """
+    count = 0
+    sum_t = sum_v = 0.0
+    for timestamps, values in segments:
+        count += len(timestamps)
+        sum_t += sum(timestamps)
+        sum_v += sum(values)
+    if count < 2:
+        return None
+    # Centre the timestamps so their squares keep their precision
+    mean_t = sum_t / count
+    mean_v = sum_v / count
+    covariance = variance = 0.0
+    for timestamps, values in segments:
+        for timestamp, value in zip(timestamps, values):
+            dt = timestamp - mean_t
+            covariance += dt * (value - mean_v)
+            variance += dt * dt
+    return covariance / variance if variance else None
+
+
+class RingBuffer:
+    """
+    A fixed-capacity series of (timestamp, value) samples.
+
+    Both columns are preallocated arrays of doubles that are overwritten in
+    place once full, so appending never allocates and the memory used by a
+    series is known up front.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        # Total number of samples ever appended
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp, value):
+        """Add a sample, overwriting the oldest one when full"""
+        i = self.count % self.capacity
+        self.timestamps[i] = timestamp
+        self.values[i] = value
+        self.count += 1
+
+    def latest(self):
+        """Get the most recent (timestamp, value) sample, or None"""
+        if not self.count:
+            return None
+        i = (self.count - 1) % self.capacity
+        return self.timestamps[i], self.values[i]
+
+    def segments(self, start, stop):
+        """
+        Get samples start..stop (0 is the oldest retained sample) as a list
+        of up to two (timestamps, values) memoryview pairs, oldest first.
+        The views share memory with the buffer: nothing is copied.
+        """
+        timestamps = memoryview(self.timestamps)
+        values = memoryview(self.values)
+        return [(timestamps[begin:end], values[begin:end])
+                for begin, end in ring_ranges(self.count, self.capacity, start, stop)]
+
+    def last(self, count):
+        """Get the most recent count samples as memoryview segments"""
+        size = len(self)
+        return self.segments(size - count, size)
+
+    def index_of(self, timestamp):
+        """Get the logical index of the first sample at or after timestamp"""
+        return ring_search(self.timestamps, self.count, self.capacity, timestamp)
+
+    def between(self, start_time, end_time):
+        """Get the samples with start_time <= timestamp < end_time"""
+        return self.segments(self.index_of(start_time), self.index_of(end_time))
+
+
+class RollupTier:
+    """
+    Downsamples a series into fixed-width time buckets.
+
+    Each bucket keeps the min, max, mean and last value of the samples that
+    fell into it. The open bucket is updated incrementally as samples
+    arrive and is written to preallocated columns when the next bucket
+    starts, so raw samples are never rescanned.
+    """
+    def __init__(self, width, capacity):
+        self.width = width
+        self.capacity = capacity
+        self.starts = array('d', bytes(8 * capacity))
+        self.mins = array('d', bytes(8 * capacity))
+        self.maxs = array('d', bytes(8 * capacity))
+        self.means = array('d', bytes(8 * capacity))
+        self.lasts = array('d', bytes(8 * capacity))
+        # Total number of buckets ever completed
+        self.count = 0
+
+        # The bucket currently being filled
+        self.open_start = None
+        self.open_min = self.open_max = self.open_sum = self.open_last = 0.0
+        self.open_samples = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def add(self, timestamp, value):
+        """Fold one raw sample into the open bucket"""
+        start = timestamp - timestamp % self.width
+        if start != self.open_start:
+            self.close()
+            self.open_start = start
+            self.open_min = self.open_max = self.open_sum = self.open_last = value
+            self.open_samples = 1
+            return
+
+        if value < self.open_min:
+            self.open_min = value
+        if value > self.open_max:
+            self.open_max = value
+        self.open_sum += value
+        self.open_last = value
+        self.open_samples += 1
+
+    def close(self):
+        """Write the open bucket to the tier"""
+        if not self.open_samples:
+            return
+        i = self.count % self.capacity
+        self.starts[i] = self.open_start
+        self.mins[i] = self.open_min
+        self.maxs[i] = self.open_max
+        self.means[i] = self.open_sum / self.open_samples
+        self.lasts[i] = self.open_last
+        self.count += 1
+        self.open_samples = 0
+
+    def segments(self, start, stop):
+        """
+        Get completed buckets start..stop as a list of up to two
+        (starts, mins, maxs, means, lasts) memoryview tuples, oldest first
+        """
+        columns = [memoryview(column) for column in
+                   (self.starts, self.mins, self.maxs, self.means, self.lasts)]
+        return [tuple(column[begin:end] for column in columns)
+                for begin, end in ring_ranges(self.count, self.capacity, start, stop)]
+
+    def between(self, start_time, end_time):
+        """Get the completed buckets starting in [start_time, end_time)"""
+        return self.segments(
+            ring_search(self.starts, self.count, self.capacity, start_time),
+            ring_search(self.starts, self.count, self.capacity, end_time))
+
+
+class HistoryStore:
+    """
+    Keeps a bounded ring buffer of samples for every metric series.
+
+    Series whose name starts with one of rollup_prefixes are also
+    downsampled into coarser rollup tiers so that long time ranges stay
+    cheap to keep and to read. Memory is allocated when a series is created
+    and the number of series is capped: once max_series series exist, new
+    series are not recorded (and this is reported once) until some are
+    dropped, so live series never lose their history. Once max_rollups
+    series have tiers, further series only keep raw samples until one of
+    them is dropped.
+
+    The collector writes the store while windows read it from the GUI
+    thread: every method holds the store's lock, and readers of the
+    buffers returned by get() must hold it while they use them.
+    """
+    def __init__(self, capacity=600, max_series=MAX_SERIES, tiers=DEFAULT_TIERS,
+                 rollup_prefixes=ROLLUP_PREFIXES, max_rollups=MAX_ROLLUPS):
+        self.capacity = capacity
+        self.max_series = max_series
+        self.max_rollups = max_rollups
+        self.tiers = tuple(tiers)
+        self.rollup_prefixes = tuple(rollup_prefixes)
+        self.series = {}
+        self.rollups = {}
+        # Whether a series was refused because the store is full
+        self.full = False
+        # Reentrant so that a writer can hold it across a batch of appends
+        self.lock = threading.RLock()
+
+    def __contains__(self, name):
+        with self.lock:
+            return name in self.series
+
+    def get(self, name):
+        """Get the ring buffer of a series, or None (see the class docstring)"""
+        with self.lock:
+            return self.series.get(name)
+
+    def names(self, prefix=''):
+        """Get the names of all series starting with prefix"""
+        with self.lock:
+            return [name for name in self.series if name.startswith(prefix)]
+
+    def append(self, name, timestamp, value):
+        """Record one sample of a series"""
+        with self.lock:
+            buffer = self.series.get(name)
+            if buffer is None:
+                buffer = self.create(name)
+                if buffer is None:
+                    return
+            else:
+                # Remote agents send their own clock; keep each series ordered
+                latest = buffer.latest()
+                if timestamp < latest[0]:
+                    timestamp = latest[0]
+            buffer.append(timestamp, value)
+
+            for tier in self.rollups.get(name, ()):
+                tier.add(timestamp, value)
+
+    def create(self, name):
+        """
+        Allocate the ring buffer (and rollup tiers) of a new series, or
+        return None when the store is full (lock held)
+        """
+        if len(self.series) >= self.max_series:
+            if not self.full:
+                self.full = True
+                print(f"History holds {self.max_series} series; new series such as "
+                      f"{name} are not recorded", file=sys.stderr)
+            return None
+        buffer = self.series[name] = RingBuffer(self.capacity)
+        if name.startswith(self.rollup_prefixes) and len(self.rollups) < self.max_rollups:
+            self.rollups[name] = [RollupTier(width, capacity)
+                                  for width, capacity in self.tiers]
+        return buffer
+
+    def remove(self, name):
+        """Forget a series"""
+        with self.lock:
+            self.series.pop(name, None)
+            self.rollups.pop(name, None)
+
+    def drop(self, prefix):
+        """Forget every series whose name starts with prefix"""
+        with self.lock:
+            for name in self.names(prefix):
+                self.remove(name)
+
+    def query(self, name, start_time, end_time, resolution=0):
+        """
+        Read a time range of a series at (at most) the given resolution.
+
+        The coarsest tier whose bucket width does not exceed resolution
+        seconds is used; raw samples are used when no tier qualifies.
+        Returns (width, segments) where width is 0 for raw samples and each
+        segment is a (timestamps, mins, maxs, means, lasts) memoryview
+        tuple. For raw samples the four value columns are the same view.
+        The views are only safe to read while holding the lock.
+        """
+        buffer = self.get(name)
+        if buffer is None:
+            return 0, []
+
+        tiers = [tier for tier in self.rollups.get(name, ()) if tier.width <= resolution]
+        if tiers:
+            tier = max(tiers, key=lambda tier: tier.width)
+            return tier.width, tier.between(start_time, end_time)
+
+        return 0, [(timestamps, values, values, values, values)
+                   for timestamps, values in buffer.between(start_time, end_time)]
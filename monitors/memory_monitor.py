@@ -1,14 +1,46 @@
+import os
 import psutil
 import time
+from . import procfs
+from .rates import RateCalculator
+
+try:
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    # Windows has no sysconf; it never reads /proc/vmstat anyway
+    PAGE_SIZE = 4096
+
 class MemoryMonitor:
     """
     A simple class to monitor memory statistics
     """
-    def __init__(self):
-        pass
+    def __init__(self, backend='auto'):
+        # Use the /proc fast path when possible, psutil otherwise
+        self.meminfo = procfs.open_reader(procfs.MeminfoReader, backend)
+        self.vmstat = procfs.open_reader(procfs.VmstatReader, backend)
+        # Pressure stall information has no psutil equivalent and needs a
+        # recent kernel, so it is optional even with the procfs backend
+        self.pressure = procfs.open_reader(procfs.PressureReader,
+                                           'psutil' if backend == 'psutil' else 'auto')
+        # Per-second page fault and swap rates
+        self.rates = RateCalculator()
     
-    def get_memory_info(self):
+    def read_meminfo(self):
+        """Read /proc/meminfo once, or return None to use psutil"""
+        if self.meminfo is None:
+            return None
+        try:
+            return self.meminfo.read()
+        except (OSError, ValueError):
+            # Fall back to psutil for the rest of the session
+            self.meminfo = None
+            return None
+    
+    def get_memory_info(self, mem=None):
         """Get basic memory information"""
+        mem = mem or self.read_meminfo()
+        if mem is not None:
+            return procfs.MeminfoReader.memory_info(mem)
         mem = psutil.virtual_memory()
         return {
             'total': mem.total,
@@ -18,8 +50,68 @@ class MemoryMonitor:
             'percent': mem.percent
         }
     
-    def get_swap_info(self):
+    def get_memory_breakdown(self, mem=None):
+        """
+        Get where the memory goes: page cache, buffers, shared memory, slab,
+        dirty and writeback pages, committed memory and huge pages, in
+        bytes. Only the fields the platform reports are included.
+        """
+        mem = mem or self.read_meminfo()
+        if mem is not None:
+            return procfs.MeminfoReader.breakdown(mem)
+        mem = psutil.virtual_memory()
+        breakdown = {}
+        for key, field in (('cached', 'cached'), ('buffers', 'buffers'),
+                           ('shmem', 'shared'), ('slab', 'slab')):
+            value = getattr(mem, field, None)
+            if value is not None:
+                breakdown[key] = value
+        return breakdown
+
+    def get_pressure(self):
+        """
+        Get the pressure stall information of CPU, memory and I/O (see
+        procfs.PressureReader), or {} where the kernel does not provide it
+        """
+        if self.pressure is None:
+            return {}
+        try:
+            return self.pressure.read()
+        except (OSError, ValueError):
+            self.pressure = None
+            return {}
+
+    def read_paging(self):
+        """Get cumulative page faults and bytes swapped in and out"""
+        if self.vmstat is not None:
+            try:
+                vmstat = self.vmstat.read()
+                return {
+                    'page_faults': vmstat.get('pgfault', 0),
+                    'major_faults': vmstat['pgmajfault'],
+                    'swap_in': vmstat.get('pswpin', 0) * PAGE_SIZE,
+                    'swap_out': vmstat.get('pswpout', 0) * PAGE_SIZE
+                }
+            except (OSError, ValueError):
+                # Fall back to psutil for the rest of the session
+                self.vmstat = None
+        # psutil has no system-wide fault counts
+        swap = psutil.swap_memory()
+        return {'swap_in': swap.sin, 'swap_out': swap.sout}
+
+    def get_paging_rates(self):
+        """
+        Get page faults, major faults (pages read back from disk) and bytes
+        swapped in and out, per second since the previous call
+        """
+        counters = self.read_paging()
+        return self.rates.update('paging', counters, time.monotonic())
+
+    def get_swap_info(self, mem=None):
         """Get swap memory information"""
+        mem = mem or self.read_meminfo()
+        if mem is not None:
+            return procfs.MeminfoReader.swap_info(mem)
         swap = psutil.swap_memory()
         return {
             'total': swap.total,
@@ -30,7 +122,12 @@ class MemoryMonitor:
     
     def get_all_info(self):
         """Get all memory information"""
+        # Both sections come from the same /proc/meminfo read
+        mem = self.read_meminfo()
         return {
-            'ram': self.get_memory_info(),
-            'swap': self.get_swap_info()
-        }
\ No newline at end of file
+            'ram': self.get_memory_info(mem),
+            'swap': self.get_swap_info(mem),
+            'breakdown': self.get_memory_breakdown(mem),
+            'pressure': self.get_pressure(),
+            'paging': self.get_paging_rates()
+        }
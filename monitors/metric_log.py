@@ -0,0 +1,533 @@
+"""
+Append-only, columnar on-disk log of metric series.
+
+Samples are buffered in memory and written in batches, one os.write() per
+flush, to segment files that rotate by age and size. A segment is laid
+out as:
+
+    header   b'RMONSEG1' + version (u32) + padding
+    records  tag (4 bytes) + payload length (u32) + crc32 (u32) + padding,
+             followed by the payload padded to a multiple of 8 bytes
+    trailer  footer offset (u64) + b'RMONEND1'   (sealed segments only)
+
+Record tags:
+
+    SERS  series dictionary: (id u32, name length u16, utf-8 name)...
+    DATA  one batch: series count (u32) + padding, then for each series
+          id (u32) + row count (u32), timestamps (f64 x rows) and
+          values (f64 x rows)
+    FOOT  written when a segment is sealed: DATA record count, time range,
+          the full series dictionary and the offset of every DATA record
+
+Nothing is fsync'd per write. A segment is fsync'd and gets its footer
+when it is rotated or closed. After a crash, the CRC of each record shows
+where the valid data ends. The next writer truncates the torn tail and
+seals the segment. Readers mmap segments and return memoryview slices of
+the timestamp and value columns, so range scans copy nothing.
+
+Only one writer may use a directory at a time (a lock file enforces it
+where flock is available), since a writer seals every segment it finds
+unsealed. restore_history() replays the newest segments into a
+HistoryStore, so a restarted dashboard starts with its recent history.
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows; writers are then not protected from each other
+    fcntl = None
+
+MAGIC = b'RMONSEG1'
+END_MAGIC = b'RMONEND1'
+VERSION = 1
+
+FILE_HEADER = struct.Struct('<8sI4x')
+RECORD_HEADER = struct.Struct('<4sII4x')
+TRAILER = struct.Struct('<Q8s')
+BLOCK_HEADER = struct.Struct('<I4x')
+COLUMN_HEADER = struct.Struct('<II')
+SERIES_ENTRY = struct.Struct('<IH')
+FOOTER_HEADER = struct.Struct('<IIdd')
+
+SEGMENT_SUFFIX = '.seg'
+LOCK_NAME = 'writer.lock'
+
+# Seconds of history restore_history() replays by default: the raw ring
+# of a series at 1 Hz, which is what sparklines and trends look at
+RESTORE_SECONDS = 600.0
+
+# Samples are stored as native doubles so that mmap'd columns can be cast
+# directly; the format is therefore little-endian only
+if sys.byteorder != 'little':
+    raise ImportError("the metric log format requires a little-endian host")
+
+
+def padding(length):
+    """Get the number of bytes needed to align length to 8 bytes"""
+    return -length % 8
+
+
+def encode_record(tag, payload):
+    """Frame a payload as a record"""
+    return b''.join((
+        RECORD_HEADER.pack(tag, len(payload), zlib.crc32(payload)),
+        payload,
+        bytes(padding(len(payload)))
+    ))
+
+
+def encode_series(entries):
+    """Encode (id, name) pairs for a SERS record or footer"""
+    parts = []
+    for series_id, name in entries:
+        encoded = name.encode()
+        parts.append(SERIES_ENTRY.pack(series_id, len(encoded)))
+        parts.append(encoded)
+    return b''.join(parts)
+
+
+def decode_series(data, count=None):
+    """Decode (id, name) pairs, returning them and the bytes consumed"""
+    entries = []
+    offset = 0
+    while offset < len(data) and (count is None or len(entries) < count):
+        series_id, length = SERIES_ENTRY.unpack_from(data, offset)
+        offset += SERIES_ENTRY.size
+        entries.append((series_id, bytes(data[offset:offset + length]).decode()))
+        offset += length
+    return entries, offset
+
+
+def scan_records(data, offset=FILE_HEADER.size):
+    """
+    Yield (tag, payload offset, payload length, next record offset) for every
+    intact record, stopping at the first torn or corrupt one
+    """
+    end = len(data)
+    while offset + RECORD_HEADER.size <= end:
+        tag, length, crc = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        stop = start + length
+        if stop > end or tag not in (b'SERS', b'DATA', b'FOOT'):
+            return
+        if zlib.crc32(data[start:stop]) != crc:
+            return
+        following = stop + padding(length)
+        yield tag, start, length, following
+        offset = following
+
+
+class MetricLogWriter:
+    """
+    Buffers samples of many series and appends them to rotating segments
+    """
+    def __init__(self, directory, flush_interval=5.0, segment_duration=3600.0,
+                 segment_size=64 * 1024 * 1024, clock=time.monotonic):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.segment_duration = segment_duration
+        self.segment_size = segment_size
+        self.clock = clock
+        os.makedirs(directory, exist_ok=True)
+        self.lock_file = lock_directory(directory)
+
+        # Seal whatever a previous run left open before writing anything new
+        for path in list_segments(directory):
+            recover_segment(path)
+
+        self.fd = None
+        self.pending = {}
+        self.last_flush = clock()
+
+    def append(self, name, timestamp, value):
+        """Buffer one sample; nothing is written until the next flush"""
+        columns = self.pending.get(name)
+        if columns is None:
+            columns = self.pending[name] = (array('d'), array('d'))
+        columns[0].append(timestamp)
+        columns[1].append(value)
+
+    def maybe_flush(self):
+        """Flush if the flush interval has elapsed"""
+        if self.clock() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def open_segment(self, timestamp):
+        """Start a new segment file"""
+        stamp = int(timestamp * 1000)
+        while True:
+            path = os.path.join(self.directory, f"metrics-{stamp:015d}{SEGMENT_SUFFIX}")
+            try:
+                self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND,
+                                  0o644)
+                break
+            except FileExistsError:
+                # Another segment was started in the same millisecond
+                stamp += 1
+        os.write(self.fd, FILE_HEADER.pack(MAGIC, VERSION))
+        self.path = path
+        self.size = FILE_HEADER.size
+        self.opened = self.clock()
+        self.series_ids = {}
+        self.block_offsets = []
+        self.first_time = None
+        self.last_time = None
+
+    def flush(self):
+        """Write every buffered sample as a single DATA record"""
+        self.last_flush = self.clock()
+        if not self.pending:
+            return
+
+        if self.fd is not None and (self.size >= self.segment_size or
+                                    self.clock() - self.opened >= self.segment_duration):
+            self.seal()
+        if self.fd is None:
+            self.open_segment(time.time())
+
+        pending, self.pending = self.pending, {}
+        new_series = []
+        parts = [BLOCK_HEADER.pack(len(pending))]
+        for name, (timestamps, values) in pending.items():
+            series_id = self.series_ids.get(name)
+            if series_id is None:
+                series_id = self.series_ids[name] = len(self.series_ids)
+                new_series.append((series_id, name))
+            parts.append(COLUMN_HEADER.pack(series_id, len(timestamps)))
+            parts.append(timestamps.tobytes())
+            parts.append(values.tobytes())
+
+            if self.first_time is None or timestamps[0] < self.first_time:
+                self.first_time = timestamps[0]
+            if self.last_time is None or timestamps[-1] > self.last_time:
+                self.last_time = timestamps[-1]
+
+        records = []
+        if new_series:
+            records.append(encode_record(b'SERS', encode_series(new_series)))
+        data_offset = self.size + sum(len(record) for record in records)
+        records.append(encode_record(b'DATA', b''.join(parts)))
+
+        payload = b''.join(records)
+        os.write(self.fd, payload)
+        self.block_offsets.append(data_offset)
+        self.size += len(payload)
+
+    def seal(self):
+        """Write the footer of the current segment and close it"""
+        if self.fd is None:
+            return
+        footer = build_footer(self.block_offsets, self.first_time, self.last_time,
+                              sorted((i, name) for name, i in self.series_ids.items()))
+        os.write(self.fd, footer_bytes(self.size, footer))
+        os.fsync(self.fd)
+        os.close(self.fd)
+        self.fd = None
+
+    def close(self):
+        """Flush buffered samples, seal the current segment and release the directory"""
+        self.flush()
+        self.seal()
+        self.lock_file.close()
+
+
+def lock_directory(directory):
+    """
+    Take the writer lock of a log directory and get the open lock file.
+    Raises OSError when another writer holds it.
+    """
+    lock_file = open(os.path.join(directory, LOCK_NAME), 'a')
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise OSError(f"{directory} is being written by another process")
+    return lock_file
+
+
+def build_footer(block_offsets, first_time, last_time, series):
+    """Build the payload of a FOOT record"""
+    return b''.join((
+        FOOTER_HEADER.pack(len(block_offsets), len(series),
+                           first_time or 0.0, last_time or 0.0),
+        struct.pack(f'<{len(block_offsets)}Q', *block_offsets),
+        encode_series(series)
+    ))
+
+
+def footer_bytes(offset, footer):
+    """Frame a footer payload and the trailer that points at it"""
+    return encode_record(b'FOOT', footer) + TRAILER.pack(offset, END_MAGIC)
+
+
+def list_segments(directory):
+    """Get the segment files of a log directory, oldest first"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in sorted(names)
+            if name.startswith('metrics-') and name.endswith(SEGMENT_SUFFIX)]
+
+
+def parse_trailer(tail, size):
+    """
+    Get the footer offset of a sealed segment of size bytes from its last
+    bytes (at least TRAILER.size of them), or None
+    """
+    if size < FILE_HEADER.size + TRAILER.size:
+        return None
+    offset, magic = TRAILER.unpack_from(tail, len(tail) - TRAILER.size)
+    if magic != END_MAGIC or offset >= size:
+        return None
+    return offset
+
+
+def read_trailer(data):
+    """Get the footer offset of a sealed segment, or None"""
+    return parse_trailer(data, len(data))
+
+
+def recover_segment(path):
+    """Seal a segment left open by a crash, dropping any torn tail"""
+    with open(path, 'r+b') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size < FILE_HEADER.size:
+            return
+        f.seek(0)
+        if f.read(8) != MAGIC:
+            return
+        # A sealed segment is recognised from its trailer alone; only an
+        # unsealed one (normally just the newest) is read and scanned
+        if size >= FILE_HEADER.size + TRAILER.size:
+            f.seek(size - TRAILER.size)
+            if parse_trailer(f.read(TRAILER.size), size) is not None:
+                return
+        f.seek(0)
+        data = f.read()
+
+        series = []
+        block_offsets = []
+        first_time = last_time = None
+        end = FILE_HEADER.size
+        for tag, start, length, following in scan_records(data):
+            if tag == b'SERS':
+                series.extend(decode_series(data[start:start + length])[0])
+            elif tag == b'DATA':
+                block_offsets.append(start - RECORD_HEADER.size)
+                for _, timestamps, _ in iter_columns(memoryview(data)[start:start + length]):
+                    if len(timestamps):
+                        first_time = timestamps[0] if first_time is None else min(first_time, timestamps[0])
+                        last_time = timestamps[-1] if last_time is None else max(last_time, timestamps[-1])
+            end = following
+
+        f.truncate(end)
+        f.seek(end)
+        f.write(footer_bytes(end, build_footer(block_offsets, first_time, last_time, series)))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def iter_columns(block):
+    """Yield (series id, timestamps, values) memoryviews of a DATA payload"""
+    count, = BLOCK_HEADER.unpack_from(block, 0)
+    offset = BLOCK_HEADER.size
+    for _ in range(count):
+        series_id, rows = COLUMN_HEADER.unpack_from(block, offset)
+        offset += COLUMN_HEADER.size
+        width = rows * 8
+        timestamps = block[offset:offset + width].cast('d')
+        values = block[offset + width:offset + 2 * width].cast('d')
+        offset += 2 * width
+        yield series_id, timestamps, values
+
+
+class SegmentReader:
+    """
+    Memory-maps one segment and indexes its series and DATA records
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self.map)
+        if self.data[:8] != MAGIC:
+            raise ValueError(f"{path} is not a metric log segment")
+
+        self.series = {}
+        self.block_offsets = []
+        self.first_time = self.last_time = None
+        footer_offset = read_trailer(self.data)
+        if footer_offset is not None:
+            self.load_footer(footer_offset)
+        else:
+            # Still being written (or torn): index it by scanning records
+            self.scan()
+
+    def load_footer(self, offset):
+        """Index a sealed segment from its footer"""
+        _, start, length, _ = next(scan_records(self.data, offset))
+        blocks, series, first_time, last_time = FOOTER_HEADER.unpack_from(self.data, start)
+        position = start + FOOTER_HEADER.size
+        self.block_offsets = list(struct.unpack_from(f'<{blocks}Q', self.data, position))
+        position += blocks * 8
+        entries, _ = decode_series(self.data[position:start + length], series)
+        self.series = {name: series_id for series_id, name in entries}
+        if blocks:
+            self.first_time, self.last_time = first_time, last_time
+
+    def scan(self):
+        """Index an unsealed segment by walking its intact records"""
+        for tag, start, length, _ in scan_records(self.data):
+            if tag == b'SERS':
+                entries, _ = decode_series(self.data[start:start + length])
+                self.series.update((name, series_id) for series_id, name in entries)
+            elif tag == b'DATA':
+                self.block_offsets.append(start - RECORD_HEADER.size)
+
+    def blocks(self):
+        """Yield (series id, timestamps, values) of every column of every DATA record"""
+        for offset in self.block_offsets:
+            _, length, _ = RECORD_HEADER.unpack_from(self.data, offset)
+            start = offset + RECORD_HEADER.size
+            yield from iter_columns(self.data[start:start + length])
+
+    def read(self, name, start_time, end_time):
+        """Yield (timestamps, values) memoryviews of a series in a time range"""
+        series_id = self.series.get(name)
+        if series_id is None:
+            return
+        if self.first_time is not None and (self.last_time < start_time or
+                                            self.first_time >= end_time):
+            return
+
+        for offset in self.block_offsets:
+            _, length, _ = RECORD_HEADER.unpack_from(self.data, offset)
+            start = offset + RECORD_HEADER.size
+            for column_id, timestamps, values in iter_columns(self.data[start:start + length]):
+                if column_id != series_id:
+                    continue
+                first = bisect_left(timestamps, start_time)
+                last = bisect_left(timestamps, end_time)
+                if first < last:
+                    yield timestamps[first:last], values[first:last]
+                break
+
+    def close(self):
+        """Unmap the segment"""
+        self.data.release()
+        self.map.close()
+
+
+def restore_history(history, directory, seconds=RESTORE_SECONDS, now=None, skip=('proc.',)):
+    """
+    Append the last seconds of every series of a log directory (except
+    those starting with one of skip, e.g. processes of an earlier run) to
+    a HistoryStore. Only the segments that overlap the range are read.
+    """
+    start_time = (now if now is not None else time.time()) - seconds
+    reader = MetricLogReader(directory)
+    try:
+        with history.lock:
+            for segment in reader.open_segments():
+                if segment.last_time is not None and segment.last_time < start_time:
+                    continue
+                names = {series_id: name for name, series_id in segment.series.items()
+                         if not name.startswith(skip)}
+                for series_id, timestamps, values in segment.blocks():
+                    name = names.get(series_id)
+                    if name is None:
+                        continue
+                    for i in range(bisect_left(timestamps, start_time), len(timestamps)):
+                        history.append(name, timestamps[i], values[i])
+    finally:
+        reader.close()
+
+
+class MetricLogReader:
+    """
+    Reads series back from every segment of a log directory
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.segments = {}
+
+    def open_segments(self):
+        """Open (or reuse) a reader for every segment, oldest first"""
+        readers = []
+        for path in list_segments(self.directory):
+            reader = self.segments.get(path)
+            # Unsealed segments may have grown since they were mapped
+            if reader is not None and reader.first_time is None:
+                self.segments.pop(path)
+                try:
+                    reader.close()
+                except BufferError:
+                    # A caller still holds views into it; the map is freed
+                    # with the last view
+                    pass
+                reader = None
+            if reader is None:
+                try:
+                    reader = self.segments[path] = SegmentReader(path)
+                except (OSError, ValueError):
+                    continue
+            readers.append(reader)
+        return readers
+
+    def series_names(self):
+        """Get the names of every series in the log"""
+        names = set()
+        for reader in self.open_segments():
+            names.update(reader.series)
+        return sorted(names)
+
+    def read(self, name, start_time=0.0, end_time=float('inf')):
+        """Yield (timestamps, values) memoryviews of a series in a time range"""
+        for reader in self.open_segments():
+            yield from reader.read(name, start_time, end_time)
+
+    def close(self):
+        """Unmap every segment"""
+        for reader in self.segments.values():
+            try:
+                reader.close()
+            except BufferError:
+                # A caller still holds views into this segment
+                pass
+        self.segments = {}
+
+
+def main():
+    """Dump series from a metric log directory, e.g. for a post-mortem"""
+    parser = argparse.ArgumentParser(description="Dump series from a metric log")
+    parser.add_argument('directory', help="metric log directory")
+    parser.add_argument('series', nargs='*', help="series to dump (default: list them)")
+    parser.add_argument('--since', type=float, default=0.0,
+                        help="only samples at or after this Unix timestamp")
+    parser.add_argument('--until', type=float, default=float('inf'),
+                        help="only samples before this Unix timestamp")
+    args = parser.parse_args()
+
+    reader = MetricLogReader(args.directory)
+    if not args.series:
+        print('\n'.join(reader.series_names()))
+        return
+    for name in args.series:
+        for timestamps, values in reader.read(name, args.since, args.until):
+            for timestamp, value in zip(timestamps, values):
+                print(f"{name}\t{timestamp:.3f}\t{value}")
+
+
+if __name__ == "__main__":
+    main()
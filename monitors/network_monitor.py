@@ -2,19 +2,40 @@ import psutil
 import time
 from datetime import datetime
 from collections import defaultdict
-import subprocess
 import socket
+from . import procfs
+from .connections import ConnectionTracker
+from .rates import RateCalculator, sum_rates
+from .wireless import WirelessMonitor
 
 class NetworkMonitor:
     """
     A simple class to monitor network statistics
     """
-    def __init__(self):
-        self.prev_net_io = psutil.net_io_counters()
-        self.prev_time = time.time()
+    def __init__(self, backend='auto'):
+        # Use the /proc fast path when possible, psutil otherwise
+        self.net_dev = procfs.open_reader(procfs.NetDevReader, backend)
+        self.connections = ConnectionTracker(backend)
+        self.wireless = WirelessMonitor()
+        # Per-second rates of the per-interface counters
+        self.nic_rates = RateCalculator()
     
-    def get_network_io(self):
+    def read_net_dev(self):
+        """Read /proc/net/dev once, or return None to use psutil"""
+        if self.net_dev is None:
+            return None
+        try:
+            return self.net_dev.read()
+        except (OSError, ValueError):
+            # Fall back to psutil for the rest of the session
+            self.net_dev = None
+            return None
+    
+    def get_network_io(self, interfaces=None):
         """Get network I/O statistics"""
+        interfaces = interfaces or self.read_net_dev()
+        if interfaces is not None:
+            return self.net_dev.network_io(interfaces)
         net_io = psutil.net_io_counters()
         return {
             'bytes_sent': net_io.bytes_sent,
@@ -23,23 +44,98 @@ class NetworkMonitor:
             'packets_recv': net_io.packets_recv
         }
     
-    def get_connections(self):
-        """Get current network connections"""
-        connections = []
-        for conn in psutil.net_connections():
-            try:
-                connections.append({
-                    'local_addr': conn.laddr,
-                    'remote_addr': conn.raddr,
-                    'status': conn.status
-                })
-            except Exception:
-                continue
-        return connections
+    def get_network_io_per_nic(self, interfaces=None):
+        """Get network I/O, error and drop counters for each interface"""
+        interfaces = interfaces or self.read_net_dev()
+        if interfaces is not None:
+            return self.net_dev.per_nic_io(interfaces)
+        return {
+            name: {
+                'bytes_sent': io.bytes_sent,
+                'bytes_recv': io.bytes_recv,
+                'packets_sent': io.packets_sent,
+                'packets_recv': io.packets_recv,
+                'errin': io.errin,
+                'errout': io.errout,
+                'dropin': io.dropin,
+                'dropout': io.dropout
+            }
+            for name, io in psutil.net_io_counters(pernic=True).items()
+        }
+    
+    def get_connections(self, kind='inet'):
+        """
+        Sample the connections of a kind ('inet', 'tcp', 'udp4', ...) and
+        get the changes since the previous sample
+        """
+        added, closed, changed = self.connections.update(kind)
+        return {
+            'generation': self.connections.generation,
+            'added': tuple(added),
+            'closed': tuple(closed),
+            'changed': tuple(changed)
+        }
     
-    def get_all_info(self):
-        """Get all network information"""
+    def get_interfaces(self):
+        """Get address and status information for each network interface"""
+        interfaces = psutil.net_if_addrs()
+        stats = psutil.net_if_stats()
+        
+        table_data = []
+        for interface_name, addrs in interfaces.items():
+            interface_info = {
+                'name': interface_name,
+                'ip': '',
+                'netmask': '',
+                'mac': '',
+                'status': 'Down'
+            }
+            
+            # Get interface status
+            if interface_name in stats:
+                interface_info['status'] = 'Up' if stats[interface_name].isup else 'Down'
+            
+            # Get addresses
+            for addr in addrs:
+                if addr.family == socket.AF_INET:  # IPv4
+                    interface_info['ip'] = addr.address
+                    interface_info['netmask'] = addr.netmask
+                elif addr.family == psutil.AF_LINK:  # MAC address
+                    interface_info['mac'] = addr.address
+                    
+            table_data.append(interface_info)
+        return table_data
+
+    def get_wifi_info(self):
+        """Get the cached wireless link information, as {label: value}"""
+        return self.wireless.get_info()
+
+    def get_all_info(self, kind='inet'):
+        """
+        Get all network information. Connections come as the full table
+        (a tuple of read-only rows, reused while nothing changes) plus the
+        changes since the previous sample, which consumers can apply
+        instead of diffing the table while generations are consecutive.
+        """
+        # Totals and per-interface counters come from the same /proc read,
+        # and their rates are timed by that read
+        interfaces = self.read_net_dev()
+        timestamp = time.monotonic()
+        io = self.get_network_io(interfaces)
+        per_nic = self.get_network_io_per_nic(interfaces)
+        per_nic_rates = self.nic_rates.update_all(per_nic, timestamp)
+        changes = self.get_connections(kind)
         return {
-            'io': self.get_network_io(),
-            'connections': self.get_connections()
+            'io': io,
+            # Summed per interface, where a reset can be recognised (the
+            # counters of /proc/net/dev are 64-bit and never wrap)
+            'rates': sum_rates(per_nic_rates.values(), io),
+            'per_nic': per_nic,
+            'per_nic_rates': per_nic_rates,
+            'connections': self.connections.connections,
+            'connection_changes': changes,
+            'connection_summary': self.connections.summary(),
+            'connection_kind': kind,
+            'interfaces': self.get_interfaces(),
+            'wifi': self.get_wifi_info()
         }
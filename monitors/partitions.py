@@ -0,0 +1,217 @@
+"""
+Cached partition usage that never blocks on a slow filesystem.
+
+The mount list is only re-read when it changes: on Linux the kernel flags
+/proc/self/mountinfo with POLLPRI after every mount or unmount, elsewhere
+it is re-read every MOUNT_INTERVAL seconds. Mounts of the same filesystem
+(bind mounts, overlays of one device) are collapsed into one partition,
+using the device numbers from mountinfo so nothing has to stat a mount.
+Every mount is listed, as network and FUSE filesystems have no block
+device, and kernel pseudo filesystems (proc, sysfs, cgroup, tmpfs, ...)
+are dropped by type.
+
+Usage is never read on the sampling thread: every filesystem is statvfs'd
+in a background thread, local ones every LOCAL_INTERVAL seconds and
+network and FUSE ones (and local ones whose statvfs turned out to be
+slow) every NETWORK_INTERVAL seconds. Until a call returns, or when it
+takes longer than USAGE_TIMEOUT, the last good value is reported with
+'stale' set. At most one call per mount is in flight, so a hung NFS
+server costs one parked thread, not a frozen app. Only a newly mounted
+filesystem is waited for, up to FIRST_USAGE_WAIT seconds, so that it is
+listed from the first sample.
+"""
+import re
+import select
+import threading
+import time
+
+import psutil
+
+from . import procfs
+
+# Seconds between mount list refreshes where changes cannot be polled
+MOUNT_INTERVAL = 10.0
+
+# Seconds between usage refreshes of local and of network filesystems,
+# and how long one may take before its partition is reported as stale
+LOCAL_INTERVAL = 5.0
+NETWORK_INTERVAL = 30.0
+USAGE_TIMEOUT = 5.0
+
+# A local statvfs slower than this refreshes at the network interval
+SLOW_USAGE = 0.2
+
+# Seconds a sample waits for the first usage of new mounts
+FIRST_USAGE_WAIT = 0.2
+
+# Filesystem types whose usage is read in the background
+NETWORK_FSTYPES = {
+    'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'ncpfs', 'afs', '9p', 'ceph',
+    'glusterfs', 'lustre', 'gpfs', 'davfs', 'fuse.sshfs', 'fuse.s3fs',
+    'fuse.rclone', 'fuse.glusterfs', 'fuse.cephfs'
+}
+
+# Kernel and memory-backed filesystems that hold no user data
+PSEUDO_FSTYPES = {
+    'proc', 'sysfs', 'devtmpfs', 'devpts', 'tmpfs', 'ramfs', 'cgroup', 'cgroup2',
+    'cpuset', 'mqueue', 'debugfs', 'tracefs', 'securityfs', 'pstore', 'bpf',
+    'efivarfs', 'configfs', 'fusectl', 'hugetlbfs', 'autofs', 'binfmt_misc',
+    'rpc_pipefs', 'nfsd', 'nsfs', 'selinuxfs', 'sockfs', 'pipefs', 'overlay',
+    'fuse.lxcfs', 'fuse.portal', 'fuse.gvfsd-fuse', 'none', ''
+}
+
+OCTAL_ESCAPE = re.compile(r'\\([0-7]{3})')
+
+
+def unescape(path):
+    """Decode the octal escapes (e.g. \\040 for a space) of a mountinfo path"""
+    return OCTAL_ESCAPE.sub(lambda match: chr(int(match.group(1), 8)), path)
+
+
+def parse_mountinfo(data):
+    """Get {mountpoint: "major:minor"} from the content of mountinfo"""
+    devices = {}
+    for line in data.decode(errors='replace').split('\n'):
+        fields = line.split(' ', 5)
+        if len(fields) < 5:
+            continue
+        devices[unescape(fields[4])] = fields[2]
+    return devices
+
+
+def usage_of(mountpoint):
+    """Get (total, used, free, percent) of a mounted filesystem"""
+    usage = psutil.disk_usage(mountpoint)
+    return usage.total, usage.used, usage.free, usage.percent
+
+
+class MountUsage:
+    """
+    Usage of one mounted filesystem and how it is refreshed
+    """
+    def __init__(self, partition):
+        self.partition = partition
+        # FUSE filesystems are served by a user process that may hang
+        network = (partition.fstype in NETWORK_FSTYPES or
+                   partition.fstype.startswith('fuse'))
+        self.interval = NETWORK_INTERVAL if network else LOCAL_INTERVAL
+        # (total, used, free, percent) of the last successful statvfs
+        self.usage = None
+        self.updated = None
+        # Start of the background call in flight, if any
+        self.pending = None
+        # Set once the first call returned, successful or not
+        self.measured = threading.Event()
+
+    def refresh(self, now):
+        """Start a background statvfs when due and none is in flight"""
+        if self.pending is not None:
+            return
+        if self.updated is not None and now - self.updated < self.interval:
+            return
+        self.pending = now
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        """Background thread body; may block for as long as the server does"""
+        start = time.monotonic()
+        try:
+            usage = usage_of(self.partition.mountpoint)
+        except OSError:
+            usage = None
+        end = time.monotonic()
+        if usage is not None:
+            self.usage = usage
+            self.updated = end
+        if end - start > SLOW_USAGE:
+            self.interval = NETWORK_INTERVAL
+        self.pending = None
+        self.measured.set()
+
+    def is_stale(self, now):
+        """Check whether the usage is older than its refresh interval allows"""
+        if self.pending is not None and now - self.pending > USAGE_TIMEOUT:
+            return True
+        return self.updated is None or now - self.updated > self.interval + USAGE_TIMEOUT
+
+
+class PartitionCache:
+    """
+    Mounted partitions and their usage, refreshed without blocking
+    """
+    def __init__(self):
+        self.mounts = []
+        self.usages = {}
+        # Usages created by the last mount refresh, not waited for yet
+        self.new_usages = []
+        self.next_refresh = 0.0
+        self.mountinfo = None
+        self.poller = None
+        if procfs.available():
+            try:
+                self.mountinfo = open(f"{procfs.PROC_PATH}/self/mountinfo", 'rb')
+                self.poller = select.poll()
+                self.poller.register(self.mountinfo, select.POLLPRI)
+            except (OSError, AttributeError):
+                self.mountinfo = self.poller = None
+        self.refresh_mounts()
+
+    def mounts_changed(self, now):
+        """Check whether the mount table may have changed since the last refresh"""
+        if self.poller is not None:
+            # Polling also acknowledges the change
+            return any(events & select.POLLPRI for fd, events in self.poller.poll(0))
+        return now >= self.next_refresh
+
+    def refresh_mounts(self):
+        """Re-read the mount list, one mount per filesystem"""
+        self.next_refresh = time.monotonic() + MOUNT_INTERVAL
+        devices = {}
+        if self.mountinfo is not None:
+            self.mountinfo.seek(0)
+            devices = parse_mountinfo(self.mountinfo.read())
+
+        # The shortest mountpoint of each filesystem represents it
+        filesystems = {}
+        for partition in psutil.disk_partitions(all=True):
+            if partition.fstype in PSEUDO_FSTYPES:
+                continue
+            key = devices.get(partition.mountpoint, partition.device)
+            current = filesystems.get(key)
+            if current is None or len(partition.mountpoint) < len(current.mountpoint):
+                filesystems[key] = partition
+        self.mounts = list(filesystems.values())
+
+        usages = {}
+        for partition in self.mounts:
+            usage = self.usages.get(partition.mountpoint)
+            if usage is None or usage.partition != partition:
+                usage = MountUsage(partition)
+                self.new_usages.append(usage)
+            usages[partition.mountpoint] = usage
+        self.usages = usages
+
+    def get_partitions(self):
+        """
+        Get (psutil partition, usage tuple, stale) for every filesystem that
+        has been measured at least once
+        """
+        now = time.monotonic()
+        if self.mounts_changed(now):
+            self.refresh_mounts()
+        for usage in self.usages.values():
+            usage.refresh(now)
+        # Give new mounts a moment, once, so that they are listed right away
+        deadline = now + FIRST_USAGE_WAIT
+        for usage in self.new_usages:
+            usage.measured.wait(max(deadline - time.monotonic(), 0.0))
+        self.new_usages = []
+
+        now = time.monotonic()
+        partitions = []
+        for partition in self.mounts:
+            usage = self.usages[partition.mountpoint]
+            # Pseudo filesystems missing from PSEUDO_FSTYPES have no blocks
+            if usage.usage is not None and usage.usage[0]:
+                partitions.append((partition, usage.usage, usage.is_stale(now)))
+        return partitions
@@ -0,0 +1,163 @@
+"""
+Search index over the processes of a ProcessMonitor.
+
+The index follows the monitor's registry: processes are added when first
+seen, removed when they exit and their state is updated when it changes,
+all in one batch per sample. Names are indexed by trigram, users and
+states by exact value. Command lines are only read while a cmd: query
+is active (see the monitor's cmdlines option), once per process and on
+the collector thread, and kept in the index, so a query never reads
+/proc and can run on the GUI thread. Processes whose command line was
+not read yet match no cmd: query.
+
+Queries are words that must all appear in the name, plus optional terms:
+    user:NAME    processes of a user
+    state:STATE  processes in a state (running, sleeping, zombie, ...)
+    cmd:REGEX    processes whose command line matches a regular expression
+"""
+import re
+import threading
+from collections import defaultdict
+
+
+def trigrams(text):
+    """Get the set of three character substrings of text"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def parse_query(query):
+    """
+    Split a query into (name words, user, state, cmdline regex). Raises
+    re.error for an invalid regex.
+    """
+    words = []
+    user = state = cmdline = None
+    for word in query.split():
+        key, sep, value = word.partition(':')
+        if sep and value and key == 'user':
+            user = value
+        elif sep and value and key == 'state':
+            state = value.lower()
+        elif sep and value and key == 'cmd':
+            cmdline = re.compile(value, re.IGNORECASE)
+        else:
+            words.append(word.lower())
+    return words, user, state, cmdline
+
+
+class IndexEntry:
+    """
+    The indexed fields of one process
+    """
+    def __init__(self, name, username, status, cmdline):
+        self.name = name.lower()
+        self.username = username
+        self.status = status
+        self.cmdline = cmdline
+
+
+class ProcessIndex:
+    """
+    Trigram, user and state index of processes, safe to query from any
+    thread while the monitor updates it
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.by_trigram = defaultdict(set)
+        self.by_user = defaultdict(set)
+        self.by_state = defaultdict(set)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def apply(self, added, removed, states, cmdlines=None):
+        """
+        Apply the changes of one sample: added is a list of ProcessEntry,
+        removed a list of pids, states maps pids to their new state and
+        cmdlines to their command line once it was read
+        """
+        with self.lock:
+            for pid in removed:
+                self.remove(pid)
+            for entry in added:
+                self.add(entry)
+            for pid, status in states.items():
+                indexed = self.entries.get(pid)
+                if indexed is not None and indexed.status != status:
+                    self.discard(self.by_state, indexed.status, pid)
+                    indexed.status = status
+                    self.by_state[status].add(pid)
+            for pid, cmdline in (cmdlines or {}).items():
+                indexed = self.entries.get(pid)
+                if indexed is not None:
+                    indexed.cmdline = cmdline
+
+    def add(self, entry):
+        """Index a process (the lock must be held)"""
+        pid = entry.key[0]
+        if pid in self.entries:
+            self.remove(pid)
+        indexed = self.entries[pid] = IndexEntry(entry.name, entry.username,
+                                                 entry.status, entry.cmdline)
+        for trigram in trigrams(indexed.name):
+            self.by_trigram[trigram].add(pid)
+        self.by_user[indexed.username].add(pid)
+        self.by_state[indexed.status].add(pid)
+
+    def remove(self, pid):
+        """Forget a process (the lock must be held)"""
+        indexed = self.entries.pop(pid, None)
+        if indexed is None:
+            return
+        for trigram in trigrams(indexed.name):
+            self.discard(self.by_trigram, trigram, pid)
+        self.discard(self.by_user, indexed.username, pid)
+        self.discard(self.by_state, indexed.status, pid)
+
+    @staticmethod
+    def discard(postings, key, pid):
+        """Remove a pid from a posting set, dropping the set once empty"""
+        pids = postings.get(key)
+        if pids is not None:
+            pids.discard(pid)
+            if not pids:
+                del postings[key]
+
+    def search(self, query):
+        """Get the set of pids matching a query (see the module docstring)"""
+        words, user, state, cmdline = parse_query(query)
+        with self.lock:
+            candidates = None
+            if user is not None:
+                candidates = set(self.by_user.get(user, ()))
+            if state is not None:
+                pids = self.by_state.get(state, set())
+                candidates = pids & candidates if candidates is not None else set(pids)
+            for word in words:
+                candidates = self.match_name(word, candidates)
+            if candidates is None:
+                candidates = set(self.entries)
+            if cmdline is None:
+                return candidates
+            entries = self.entries
+            return {pid for pid in candidates
+                    if entries[pid].cmdline is not None and cmdline.search(entries[pid].cmdline)}
+
+    def match_name(self, text, candidates):
+        """Narrow candidates (None for all) to names containing text (lock held)"""
+        grams = trigrams(text)
+        if grams:
+            # Intersect the smallest posting sets first
+            postings = sorted((self.by_trigram.get(gram, set()) for gram in grams), key=len)
+            pids = set(postings[0])
+            for posting in postings[1:]:
+                pids &= posting
+                if not pids:
+                    break
+            if candidates is not None:
+                pids &= candidates
+        else:
+            pids = candidates if candidates is not None else self.entries.keys()
+        entries = self.entries
+        return {pid for pid in pids if text in entries[pid].name}
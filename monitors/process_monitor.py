@@ -1,38 +1,311 @@
 import psutil
+import heapq
 import time
 from datetime import datetime
 from collections import defaultdict, deque
+from operator import itemgetter
 import os
+from . import procfs
+from .process_index import ProcessIndex
+
+# Row field that each top-N mode ranks processes by
+SORT_FIELDS = {
+    'cpu': 'cpu_percent',
+    'memory': 'rss',
+    'io': 'io_rate'
+}
+
+# With a top-N limit, processes outside the last top N are only sampled
+# every TAIL_INTERVAL ticks (spread over the ticks by pid)
+TAIL_INTERVAL = 5
+
+# Socket counts are refreshed at most every SOCKET_INTERVAL ticks, and for
+# at most SOCKET_BUDGET processes per tick, stalest first
+SOCKET_INTERVAL = 5
+SOCKET_BUDGET = 100
+
+
+def count_sockets(process):
+    """Count the internet sockets of a process with psutil"""
+    if hasattr(process, 'net_connections'):
+        return len(process.net_connections(kind='inet'))
+    return len(process.connections(kind='inet'))
+
+
+class ProcessEntry:
+    """
+    A process kept alive across samples, with the state needed for CPU%
+    """
+    def __init__(self, process, now):
+        self.process = process
+        self.key = (process.pid, process.create_time())
+        self.cpu_total = None
+        self.io = None
+        self.ppid = None
+        self.status = None
+        self.time = now
+        # Last row sampled, reused on ticks where the process is skipped
+        self.row = None
+        self.sockets = None
+        self.sockets_tick = None
+
+        # Static fields are only fetched once per process
+        self.name = self.fetch(process.name)
+        self.exe = self.fetch(process.exe)
+        self.username = self.fetch(process.username)
+        # Only read while a cmd: search is active, then kept
+        self.cmdline = None
+
+    def read_cmdline(self):
+        """Read the command line once, on the collector thread"""
+        if self.cmdline is None:
+            self.cmdline = self.fetch(lambda: ' '.join(self.process.cmdline()))
+        return self.cmdline
+
+    @staticmethod
+    def fetch(getter):
+        """Get a static field, or '' when it is not readable"""
+        try:
+            return getter() or ''
+        except (psutil.AccessDenied, psutil.ZombieProcess):
+            # Zombies keep their pid but not their command line on some platforms
+            return ''
+
 
 class ProcessMonitor:
     """
     A simple class to monitor process statistics
     """
-    def __init__(self):
-        pass
+    def __init__(self, backend='auto'):
+        # Live processes by pid; each entry carries its (pid, create_time) key
+        self.registry = {}
+        self.total_memory = psutil.virtual_memory().total
+        self.tick = 0
+        # Pids sampled on every tick when a limit is set: the last top N
+        self.hot = set()
+        # Search index following the registry, queried from other threads
+        self.index = ProcessIndex()
+        # Socket tables parsed once per tick on Linux, psutil otherwise
+        self.socket_inodes = procfs.open_reader(procfs.SocketInodesReader, backend)
     
-    def get_process_list(self):
-        """Get list of running processes"""
+    def get_process_list(self, pids=None, hot=None, cmdlines=False):
+        """
+        Get list of running processes. With a set of hot pids, the other
+        processes are only sampled every TAIL_INTERVAL ticks and otherwise
+        keep their last row. With cmdlines, the command lines not read yet
+        are read for the search index.
+        """
+        self.tick += 1
+        tick = self.tick
+        now = time.monotonic()
         processes = []
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
+        live = set()
+        # Changes for the search index, applied in one batch
+        added = []
+        removed = []
+        states = {}
+        for pid in (pids if pids is not None else psutil.pids()):
+            entry = self.registry.get(pid)
             try:
-                processes.append({
-                    'pid': proc.info['pid'],
-                    'name': proc.info['name'],
-                    'cpu_percent': proc.info['cpu_percent'],
-                    'memory_percent': proc.info['memory_percent']
-                })
-            except Exception:
+                if entry is None:
+                    entry = self.registry[pid] = ProcessEntry(psutil.Process(pid), now)
+                elif hot is not None and pid not in hot and entry.row is not None and \
+                        (pid + tick) % TAIL_INTERVAL:
+                    # A quiet process on a tick it is not due: the rates of
+                    # its next sample cover the whole time since the last
+                    live.add(pid)
+                    processes.append(entry.row)
+                    continue
+                row = self.sample(entry, now)
+                if row is None:
+                    # The pid now belongs to a different process, so start
+                    # over with a fresh entry
+                    entry = self.registry[pid] = ProcessEntry(psutil.Process(pid), now)
+                    row = self.sample(entry, now)
+                entry.row = row
+            except psutil.ZombieProcess:
+                # Zombies keep their pid until reaped, but some platforms
+                # refuse to read their counters
+                row = self.zombie_row(pid, entry)
+                if entry is not None:
+                    entry.row = row
+            except psutil.NoSuchProcess:
+                self.registry.pop(pid, None)
+                removed.append(pid)
+                continue
+            except psutil.Error:
                 continue
+            live.add(pid)
+            processes.append(row)
+            status = row['status']
+            if entry is not None and status != entry.status:
+                # Processes are indexed once they were sampled successfully
+                if entry.status is None:
+                    added.append(entry)
+                else:
+                    states[pid] = status
+                entry.status = status
+
+        # Forget processes that exited
+        for pid in self.registry.keys() - live:
+            del self.registry[pid]
+            removed.append(pid)
+        commands = {}
+        if cmdlines:
+            for pid, entry in self.registry.items():
+                if entry.cmdline is None and entry.status is not None:
+                    commands[pid] = entry.read_cmdline()
+        self.index.apply(added, removed, states, commands)
         return processes
+
+    def sample(self, entry, now):
+        """Read the changing counters of a process and compute its CPU%"""
+        process = entry.process
+        with process.oneshot():
+            cpu_times = process.cpu_times()
+            rss = process.memory_info().rss
+            num_threads = process.num_threads()
+            status = process.status()
+            # Can change when a process is reparented
+            ppid = process.ppid()
+        cpu_total = cpu_times.user + cpu_times.system
+        try:
+            io = process.io_counters()
+            io = (io.read_bytes, io.write_bytes)
+        except (psutil.AccessDenied, AttributeError):
+            # Other users' processes (or platforms without I/O counters)
+            io = None
+        # A pid taken over by a new process shows as counters going back
+        # or a new parent; only then is the owner's create time checked
+        if entry.cpu_total is not None and (
+                cpu_total < entry.cpu_total or ppid != entry.ppid or
+                (io is not None and entry.io is not None and
+                 (io[0] < entry.io[0] or io[1] < entry.io[1]))) and \
+                not self.same_process(entry):
+            return None
+
+        read_rate = write_rate = 0.0
+        if entry.cpu_total is None:
+            # First sighting: average over the lifetime of the process
+            elapsed = time.time() - entry.key[1]
+            cpu_percent = cpu_total / elapsed * 100 if elapsed > 0 else 0.0
+        else:
+            elapsed = now - entry.time
+            cpu_percent = max(cpu_total - entry.cpu_total, 0) / elapsed * 100 if elapsed > 0 else 0.0
+            if io is not None and entry.io is not None and elapsed > 0:
+                read_rate = max(io[0] - entry.io[0], 0) / elapsed
+                write_rate = max(io[1] - entry.io[1], 0) / elapsed
+        entry.cpu_total = cpu_total
+        entry.io = io
+        entry.ppid = ppid
+        entry.time = now
+
+        return {
+            'pid': entry.key[0],
+            'create_time': entry.key[1],
+            'ppid': ppid,
+            'name': entry.name,
+            'exe': entry.exe,
+            'username': entry.username,
+            'cpu_percent': round(cpu_percent, 1),
+            'memory_percent': rss / self.total_memory * 100 if self.total_memory else 0.0,
+            'rss': rss,
+            'num_threads': num_threads,
+            'status': status,
+            'read_rate': read_rate,
+            'write_rate': write_rate,
+            'io_rate': read_rate + write_rate,
+            'sockets': entry.sockets
+        }
     
+    @staticmethod
+    def same_process(entry):
+        """
+        Check whether the entry's pid still belongs to its process. psutil
+        caches create_time() per Process and does not check cpu_times()
+        for pid reuse, so the create time of the pid's current owner is
+        read from a new Process (one /proc/<pid>/stat read on Linux).
+        """
+        return psutil.Process(entry.key[0]).create_time() == entry.key[1]
+
+    @staticmethod
+    def zombie_row(pid, entry):
+        """Get the row of a zombie whose counters could not be read"""
+        if entry is not None and entry.row is not None:
+            row = dict(entry.row)
+        else:
+            row = {
+                'pid': pid,
+                'create_time': entry.key[1] if entry is not None else 0.0,
+                'ppid': entry.ppid if entry is not None and entry.ppid is not None else 0,
+                'name': entry.name if entry is not None else '',
+                'exe': '',
+                'username': entry.username if entry is not None else '',
+                'memory_percent': 0.0,
+                'rss': 0,
+                'num_threads': 0,
+                'sockets': None
+            }
+        row.update(status=psutil.STATUS_ZOMBIE, cpu_percent=0.0,
+                   read_rate=0.0, write_rate=0.0, io_rate=0.0)
+        return row
+
     def get_process_count(self):
         """Get total number of processes"""
         return len(psutil.pids())
     
-    def get_all_info(self):
-        """Get all process information"""
+    def update_sockets(self, rows):
+        """Refresh the socket counts of rows that are due, within the budget"""
+        registry = self.registry
+        tick = self.tick
+        due = []
+        for row in rows:
+            entry = registry.get(row['pid'])
+            if entry is not None and (entry.sockets_tick is None or
+                                      tick - entry.sockets_tick >= SOCKET_INTERVAL):
+                due.append(entry)
+        due = heapq.nsmallest(SOCKET_BUDGET, due, key=lambda entry: entry.sockets_tick or 0)
+        if not due:
+            return
+        reader = self.socket_inodes
+        inodes = reader.read() if reader is not None else None
+        for entry in due:
+            entry.sockets_tick = tick
+            try:
+                if inodes is not None:
+                    entry.sockets = reader.count(entry.key[0], inodes)
+                else:
+                    entry.sockets = count_sockets(entry.process)
+            except (psutil.Error, OSError):
+                # Other users' sockets are not visible without privileges
+                entry.sockets = None
+            if entry.row is not None:
+                entry.row['sockets'] = entry.sockets
+
+    def get_top_processes(self, processes, limit, sort_by='cpu'):
+        """Select the limit busiest processes with a heap, busiest first"""
+        return heapq.nlargest(limit, processes, key=itemgetter(SORT_FIELDS[sort_by]))
+    
+    def get_all_info(self, limit=None, sort_by='cpu', pinned=(), cmdlines=False):
+        """
+        Get all process information. With a limit only the top processes by
+        sort_by ('cpu', 'memory' or 'io') are returned, plus the pinned pids.
+        cmdlines makes the command lines searchable (see ProcessIndex).
+        """
+        pids = psutil.pids()
+        processes = self.get_process_list(pids, self.hot if limit is not None else None,
+                                          cmdlines)
+        if limit is not None:
+            top = self.get_top_processes(processes, limit, sort_by)
+            if pinned:
+                shown = {p['pid'] for p in top}
+                top.extend(p for p in processes if p['pid'] in pinned and p['pid'] not in shown)
+            processes = top
+            self.hot = {p['pid'] for p in top}
+        self.update_sockets(processes)
         return {
-            'processes': self.get_process_list(),
-            'total_count': self.get_process_count()
+            'processes': processes,
+            'total_count': len(pids),
+            'limit': limit,
+            'sort_by': sort_by
         }
\ No newline at end of file
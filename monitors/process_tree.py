@@ -0,0 +1,267 @@
+"""
+Processes grouped by parent, with subtree totals.
+
+The tree is kept across samples: update() diffs the new process rows
+against the current nodes and only touches what changed. A changed value
+is applied as a delta to the node and its ancestors, a new process is
+linked under its parent and an exited one is unlinked, so a sample costs
+time in proportion to the changes rather than to the number of processes.
+"""
+
+# Row fields that are summed over subtrees
+FIELDS = ('cpu_percent', 'rss', 'num_threads', 'io_rate')
+
+# Updates between full recomputations of the totals, which clears any
+# floating point drift accumulated by applying deltas
+RESYNC_INTERVAL = 300
+
+
+def row_values(row):
+    """Get the summed fields of a process row"""
+    return [row.get(field) or 0 for field in FIELDS]
+
+
+class ProcessNode:
+    """
+    One process in the tree, with its own values and its subtree totals
+    """
+    def __init__(self, row):
+        self.pid = row['pid']
+        self.row = row
+        self.parent = None
+        self.children = []
+        # Positions of the children by pid, rebuilt lazily after changes
+        self.positions = None
+        self.own = row_values(row)
+        self.totals = list(self.own)
+
+    def position(self, child):
+        """Get the index of a child in self.children"""
+        if self.positions is None:
+            self.positions = {node.pid: i for i, node in enumerate(self.children)}
+        return self.positions[child.pid]
+
+
+class TreeListener:
+    """
+    Receives the changes of a ProcessTree as they happen, e.g. to keep a
+    Qt model in step. parent is None for top-level processes. An inserted
+    node brings its whole subtree with it.
+    """
+    def begin_insert(self, parent, index, node):
+        pass
+
+    def end_insert(self):
+        pass
+
+    def begin_remove(self, parent, index):
+        pass
+
+    def end_remove(self):
+        pass
+
+    def changed(self, nodes):
+        """Called once per update with the nodes whose values changed"""
+
+
+class ProcessTree:
+    """
+    Incrementally maintained process tree
+    """
+    def __init__(self, listener=None):
+        self.listener = listener if listener is not None else TreeListener()
+        self.nodes = {}
+        self.root = ProcessNode({'pid': None})
+        # Processes kept at the top level because their parent was below them
+        self.refused = set()
+        self.updates = 0
+
+    def parent_of(self, node):
+        """Get the node a process belongs under (the root if its parent is unknown)"""
+        parent = self.nodes.get(node.row.get('ppid'))
+        if parent is None or parent is node:
+            return self.root
+        # Never link a process below its own descendant
+        ancestor = parent
+        while ancestor is not None:
+            if ancestor is node:
+                self.refused.add(node)
+                return self.root
+            ancestor = ancestor.parent
+        return parent
+
+    def add_totals(self, node, delta, dirty):
+        """Add delta to the totals of node and every ancestor"""
+        while node is not None and node is not self.root:
+            totals = node.totals
+            for i, value in enumerate(delta):
+                totals[i] += value
+            dirty.add(node)
+            node = node.parent
+
+    def link(self, node, parent, dirty):
+        """Append a detached subtree to parent's children"""
+        self.listener.begin_insert(None if parent is self.root else parent,
+                                   len(parent.children), node)
+        node.parent = parent
+        parent.children.append(node)
+        if parent.positions is not None:
+            parent.positions[node.pid] = len(parent.children) - 1
+        self.listener.end_insert()
+        self.add_totals(parent, node.totals, dirty)
+
+    def unlink(self, node, dirty):
+        """Detach a subtree from its parent"""
+        parent = node.parent
+        index = parent.position(node)
+        self.listener.begin_remove(None if parent is self.root else parent, index)
+        del parent.children[index]
+        parent.positions = None
+        node.parent = None
+        self.listener.end_remove()
+        self.add_totals(parent, [-value for value in node.totals], dirty)
+
+    def update(self, rows):
+        """Apply a new list of process rows"""
+        self.updates += 1
+        dirty = set()
+        current = {row['pid']: row for row in rows}
+        nodes = self.nodes
+
+        # Exited processes (or reused pids): their children move to the
+        # top level until their new parent shows up in a ppid
+        for pid in [pid for pid, node in nodes.items()
+                    if pid not in current or
+                    current[pid].get('create_time') != node.row.get('create_time')]:
+            node = nodes[pid]
+            for child in list(node.children):
+                self.unlink(child, dirty)
+                self.link(child, self.root, dirty)
+            self.unlink(node, dirty)
+            del nodes[pid]
+
+        # Changed values and parents of the processes that are still here
+        added = []
+        for pid, row in current.items():
+            node = nodes.get(pid)
+            if node is None:
+                node = nodes[pid] = ProcessNode(row)
+                added.append(node)
+                continue
+            if row is node.row or row == node.row:
+                continue
+            moved = row.get('ppid') != node.row.get('ppid')
+            node.row = row
+            values = row_values(row)
+            delta = [new - old for new, old in zip(values, node.own)]
+            node.own = values
+            dirty.add(node)
+            if any(delta):
+                self.add_totals(node, delta, dirty)
+            if moved:
+                parent = self.parent_of(node)
+                if parent is not node.parent:
+                    self.unlink(node, dirty)
+                    self.link(node, parent, dirty)
+
+        # New processes: build their subtrees detached, then link each
+        # subtree once, so a new process group is a single insertion
+        for node in added:
+            parent = nodes.get(node.row.get('ppid'))
+            node.parent = parent if parent is not node else None
+        self.link_added(added, dirty)
+        if self.refused:
+            self.retry_refused(dirty)
+
+        if self.updates % RESYNC_INTERVAL == 0:
+            self.resync(dirty)
+        self.listener.changed([node for node in dirty if nodes.get(node.pid) is node])
+
+    def link_added(self, added, dirty):
+        """Link new processes under their parents, new subtrees first"""
+        new = set(added)
+        self.break_cycles(added, new)
+        tops = []
+        for node in added:
+            parent = node.parent
+            if parent in new:
+                parent.children.append(node)
+                parent.positions = None
+            else:
+                tops.append(node)
+        for node in tops:
+            node.parent = None
+            # A subtree of new processes is one insertion
+            self.sum_subtree(node)
+            self.link(node, self.parent_of(node), dirty)
+
+        # Top-level processes whose parent was not known until now
+        if added:
+            pids = {node.pid for node in added}
+            for node in [node for node in self.root.children
+                         if node.row.get('ppid') in pids and node not in new]:
+                self.unlink(node, dirty)
+                self.link(node, self.parent_of(node), dirty)
+
+    def retry_refused(self, dirty):
+        """Move processes kept out of a loop of ppids under their parent once it is gone"""
+        for node in list(self.refused):
+            if self.nodes.get(node.pid) is not node or node.parent is not self.root:
+                self.refused.discard(node)
+                continue
+            parent = self.parent_of(node)
+            if parent is not self.root:
+                self.refused.discard(node)
+                self.unlink(node, dirty)
+                self.link(node, parent, dirty)
+
+    @staticmethod
+    def break_cycles(added, new):
+        """
+        Make one process of every cycle of new parents a top, since ppids
+        read at different times (and reused pids) can form loops
+        """
+        state = {}
+        for node in added:
+            path = []
+            current = node
+            while current in new and current not in state:
+                state[current] = 'visiting'
+                path.append(current)
+                current = current.parent
+            if current in new and state[current] == 'visiting':
+                current.parent = None
+            for visited in path:
+                state[visited] = 'done'
+
+    def sum_subtree(self, node):
+        """Recompute the totals of a subtree from its own values"""
+        totals = list(node.own)
+        for child in node.children:
+            child.parent = node
+            for i, value in enumerate(self.sum_subtree(child)):
+                totals[i] += value
+        node.totals = totals
+        return totals
+
+    def resync(self, dirty):
+        """Recompute every total from scratch, flagging those that drifted"""
+        for node in self.root.children:
+            self.resync_subtree(node, dirty)
+
+    def resync_subtree(self, node, dirty):
+        """Recompute the totals of a subtree, returning those of node"""
+        totals = list(node.own)
+        for child in node.children:
+            for i, value in enumerate(self.resync_subtree(child, dirty)):
+                totals[i] += value
+        if totals != node.totals:
+            node.totals = totals
+            dirty.add(node)
+        return totals
+
+    def clear(self):
+        """Forget every process"""
+        self.nodes = {}
+        self.root = ProcessNode({'pid': None})
+        self.refused = set()
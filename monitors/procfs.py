@@ -0,0 +1,507 @@
+"""
+Fast-path readers for Linux /proc files.
+
+psutil reopens and reparses a /proc file and builds namedtuples on every
+call. The readers below keep their file open, re-read it from offset 0
+into a preallocated buffer and only decode the fields the monitors
+display. Monitors use them through open_reader(), which returns None when
+the platform (or the backend the caller asked for) means psutil should be
+used instead.
+"""
+import os
+import re
+import socket
+import struct
+import sys
+
+PROC_PATH = '/proc'
+
+# /proc/diskstats always counts 512-byte sectors, whatever the device uses
+SECTOR_SIZE = 512
+
+# Width of the kernel's unsigned long counters
+LONG_BITS = struct.calcsize('l') * 8
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+# Order of the per-CPU counters in /proc/stat (and psutil.cpu_times)
+CPU_FIELDS = ('user', 'nice', 'system', 'idle', 'iowait', 'irq',
+              'softirq', 'steal', 'guest', 'guest_nice')
+
+# Socket tables of /proc/net and the address family of each
+SOCKET_TABLES = {'tcp': socket.AF_INET, 'tcp6': socket.AF_INET6,
+                 'udp': socket.AF_INET, 'udp6': socket.AF_INET6}
+
+# TCP states as written in /proc/net/tcp, named like psutil names them
+TCP_STATES = {
+    b'01': 'ESTABLISHED', b'02': 'SYN_SENT', b'03': 'SYN_RECV',
+    b'04': 'FIN_WAIT1', b'05': 'FIN_WAIT2', b'06': 'TIME_WAIT',
+    b'07': 'CLOSE', b'08': 'CLOSE_WAIT', b'09': 'LAST_ACK',
+    b'0A': 'LISTEN', b'0B': 'CLOSING', b'0C': 'NEW_SYN_RECV'
+}
+
+
+def available():
+    """Check whether the /proc fast path can be used on this platform"""
+    return sys.platform.startswith('linux') and os.path.isfile(f"{PROC_PATH}/stat")
+
+
+def open_reader(reader_class, backend='auto'):
+    """Open a procfs reader, or return None when psutil should be used"""
+    if backend == 'psutil':
+        return None
+    if backend not in ('auto', 'procfs'):
+        raise ValueError(f"Unknown backend: {backend}")
+    try:
+        if not available():
+            raise OSError("procfs is not available on this platform")
+        reader = reader_class()
+        # Parse once up front so that a malformed file falls back right away
+        reader.read()
+        return reader
+    except (OSError, ValueError, IndexError):
+        if backend == 'procfs':
+            raise
+        return None
+
+
+class ProcFile:
+    """
+    A /proc or /sys file that stays open and is re-read in place
+    """
+    def __init__(self, path, size=16384):
+        self.path = path
+        self.file = open(path, 'rb', buffering=0)
+        self.buffer = bytearray(size)
+
+    def read(self):
+        """Re-read the file from the start and return its content"""
+        self.file.seek(0)
+        view = memoryview(self.buffer)
+        length = 0
+        while True:
+            count = self.file.readinto(view[length:])
+            if not count:
+                break
+            length += count
+            if length == len(self.buffer):
+                # The file outgrew the buffer: double it and keep reading
+                view.release()
+                self.buffer.extend(bytes(len(self.buffer)))
+                view = memoryview(self.buffer)
+        data = view[:length].tobytes()
+        view.release()
+        return data
+
+    def close(self):
+        """Close the underlying file"""
+        self.file.close()
+
+
+class CPUTimesReader:
+    """
+    Reads per-CPU time counters (in seconds) from /proc/stat
+    """
+    fields = CPU_FIELDS
+
+    def __init__(self):
+        self.stat = ProcFile(f"{PROC_PATH}/stat")
+
+    def read(self):
+        """Get one tuple of CPU_FIELDS counters per logical CPU"""
+        data = self.stat.read()
+        # Everything after the CPU lines (the long "intr" line and friends)
+        # is of no interest, so avoid splitting it
+        end = data.find(b'\nintr')
+        if end != -1:
+            data = data[:end]
+
+        cpus = []
+        for line in data.split(b'\n'):
+            # Per-CPU lines look like "cpu3 ..."; the aggregate "cpu " is skipped
+            if not line.startswith(b'cpu'):
+                if cpus:
+                    break
+                continue
+            if line[3:4] == b' ':
+                continue
+            values = [int(value) / CLOCK_TICKS for value in line.split()[1:]]
+            values.extend([0.0] * (len(CPU_FIELDS) - len(values)))
+            cpus.append(tuple(values[:len(CPU_FIELDS)]))
+        if not cpus:
+            raise ValueError("no per-CPU lines in /proc/stat")
+        return cpus
+
+
+class MeminfoReader:
+    """
+    Reads /proc/meminfo, decoding only the requested fields (in bytes)
+    """
+    FIELDS = (b'MemTotal', b'MemFree', b'MemAvailable', b'Buffers', b'Cached',
+              b'SReclaimable', b'Shmem', b'SwapTotal', b'SwapFree', b'Slab',
+              b'Dirty', b'Writeback', b'Committed_AS', b'CommitLimit',
+              b'HugePages_Total', b'HugePages_Free', b'Hugepagesize')
+
+    # Keys of breakdown() and the fields they come from
+    BREAKDOWN = (('cached', 'Cached'), ('buffers', 'Buffers'), ('shmem', 'Shmem'),
+                 ('slab', 'Slab'), ('slab_reclaimable', 'SReclaimable'),
+                 ('dirty', 'Dirty'), ('writeback', 'Writeback'),
+                 ('committed_as', 'Committed_AS'), ('commit_limit', 'CommitLimit'))
+
+    def __init__(self, fields=None):
+        self.meminfo = ProcFile(f"{PROC_PATH}/meminfo")
+        self.fields = frozenset(fields or self.FIELDS)
+
+    def read(self):
+        """Get a dict of field name to value in bytes"""
+        values = {}
+        for line in self.meminfo.read().split(b'\n'):
+            key, _, rest = line.partition(b':')
+            if key in self.fields:
+                parts = rest.split()
+                value = int(parts[0])
+                if len(parts) > 1 and parts[1] == b'kB':
+                    value *= 1024
+                values[key.decode()] = value
+        if 'MemTotal' not in values:
+            raise ValueError("MemTotal missing from /proc/meminfo")
+        return values
+
+    @staticmethod
+    def memory_info(mem):
+        """Turn read() output into the shape of MemoryMonitor.get_memory_info"""
+        total = mem['MemTotal']
+        free = mem.get('MemFree', 0)
+        available = mem.get('MemAvailable')
+        if not available:
+            # Kernels before 3.14 (or the occasional kernel bug) report no
+            # MemAvailable; estimate it the way free(1) does
+            available = free + mem.get('Buffers', 0) + mem.get('Cached', 0)
+        available = min(available, total)
+        return {
+            'total': total,
+            'available': available,
+            'used': total - available,
+            'free': free,
+            'percent': round((total - available) / total * 100, 1) if total else 0.0
+        }
+
+    @staticmethod
+    def breakdown(mem):
+        """Turn read() output into the shape of MemoryMonitor.get_memory_breakdown"""
+        info = {key: mem[field] for key, field in MeminfoReader.BREAKDOWN if field in mem}
+        if 'HugePages_Total' in mem:
+            # Huge pages are counted in pages of Hugepagesize
+            size = mem.get('Hugepagesize', 0)
+            info['hugepages_total'] = mem['HugePages_Total'] * size
+            info['hugepages_free'] = mem.get('HugePages_Free', 0) * size
+        return info
+
+    @staticmethod
+    def swap_info(mem):
+        """Turn read() output into the shape of MemoryMonitor.get_swap_info"""
+        total = mem.get('SwapTotal', 0)
+        free = mem.get('SwapFree', 0)
+        used = total - free
+        return {
+            'total': total,
+            'used': used,
+            'free': free,
+            'percent': round(used / total * 100, 1) if total else 0.0
+        }
+
+
+class VmstatReader:
+    """
+    Reads cumulative paging counters from /proc/vmstat
+    """
+    FIELDS = (b'pgfault', b'pgmajfault', b'pswpin', b'pswpout')
+
+    def __init__(self, fields=None):
+        self.vmstat = ProcFile(f"{PROC_PATH}/vmstat")
+        self.fields = frozenset(fields or self.FIELDS)
+
+    def read(self):
+        """Get a dict of counter name to value"""
+        values = {}
+        for line in self.vmstat.read().split(b'\n'):
+            key, _, value = line.partition(b' ')
+            if key in self.fields:
+                values[key.decode()] = int(value)
+        if 'pgmajfault' not in values:
+            raise ValueError("pgmajfault missing from /proc/vmstat")
+        return values
+
+
+class PressureReader:
+    """
+    Reads pressure stall information (Linux 4.20+) from /proc/pressure
+    """
+    RESOURCES = ('cpu', 'memory', 'io')
+
+    def __init__(self):
+        self.files = {}
+        for resource in self.RESOURCES:
+            try:
+                self.files[resource] = ProcFile(f"{PROC_PATH}/pressure/{resource}", size=256)
+            except OSError:
+                continue
+        if not self.files:
+            raise OSError("pressure stall information is not available")
+
+    def read(self):
+        """
+        Get {resource: {'some' or 'full': {'avg10', 'avg60', 'avg300',
+        'total'}}}: the share of time (in percent) some or all tasks were
+        stalled on the resource over 10, 60 and 300 seconds, and the total
+        stall time in microseconds. Booting with psi=0 makes reads fail.
+        """
+        pressure = {}
+        for resource, pfile in self.files.items():
+            lines = {}
+            for line in pfile.read().split(b'\n'):
+                kind, _, rest = line.partition(b' ')
+                if not rest:
+                    continue
+                values = {}
+                for field in rest.split():
+                    key, _, value = field.partition(b'=')
+                    values[key.decode()] = int(value) if key == b'total' else float(value)
+                lines[kind.decode()] = values
+            pressure[resource] = lines
+        return pressure
+
+
+class DiskstatsReader:
+    """
+    Reads per-device counters from /proc/diskstats
+    """
+    # Counters after the major, minor and name columns
+    FIELDS = ('read_count', 'read_merged_count', 'read_sectors', 'read_time',
+              'write_count', 'write_merged_count', 'write_sectors', 'write_time',
+              'in_flight', 'busy_time', 'weighted_time')
+    # Widths of the per_disk_io counters that can wrap: I/O counts are
+    # unsigned longs and times 32-bit milliseconds (sectors only wrap as
+    # multiples of SECTOR_SIZE, so byte counts cannot be corrected)
+    COUNTER_BITS = {'read_count': LONG_BITS, 'write_count': LONG_BITS,
+                    'read_time': 32, 'write_time': 32, 'busy_time': 32}
+
+    def __init__(self):
+        self.diskstats = ProcFile(f"{PROC_PATH}/diskstats")
+        # Whether each device name is a whole disk rather than a partition
+        self.whole_disks = {}
+
+    def is_whole_disk(self, name):
+        """Check whether a device is a whole disk, as psutil does"""
+        if name not in self.whole_disks:
+            self.whole_disks[name] = os.path.exists(
+                '/sys/block/' + name.replace('/', '!'))
+        return self.whole_disks[name]
+
+    def read(self):
+        """Get a dict of device name to a tuple of FIELDS counters"""
+        devices = {}
+        for line in self.diskstats.read().split(b'\n'):
+            parts = line.split()
+            if len(parts) < 14:
+                continue
+            devices[parts[2].decode()] = tuple(int(value) for value in parts[3:14])
+        return devices
+
+    def disk_io(self, devices=None):
+        """Get whole-disk totals in the same shape as StorageMonitor.get_disk_io"""
+        read_bytes = write_bytes = read_count = write_count = 0
+        for name, counters in (devices or self.read()).items():
+            if not self.is_whole_disk(name):
+                continue
+            read_count += counters[0]
+            read_bytes += counters[2] * SECTOR_SIZE
+            write_count += counters[4]
+            write_bytes += counters[6] * SECTOR_SIZE
+        return {
+            'read_bytes': read_bytes,
+            'write_bytes': write_bytes,
+            'read_count': read_count,
+            'write_count': write_count
+        }
+
+    def per_disk_io(self, devices=None):
+        """
+        Get per-device counters: those of get_disk_io, the milliseconds
+        spent on reads, writes and being busy, and the I/Os in flight
+        """
+        return {
+            name: {
+                'read_bytes': counters[2] * SECTOR_SIZE,
+                'write_bytes': counters[6] * SECTOR_SIZE,
+                'read_count': counters[0],
+                'write_count': counters[4],
+                'read_time': counters[3],
+                'write_time': counters[7],
+                'busy_time': counters[9],
+                'in_flight': counters[8]
+            }
+            for name, counters in (devices or self.read()).items()
+        }
+
+
+class NetDevReader:
+    """
+    Reads per-interface counters from /proc/net/dev
+    """
+    FIELDS = ('bytes_recv', 'packets_recv', 'errin', 'dropin',
+              'bytes_sent', 'packets_sent', 'errout', 'dropout')
+
+    def __init__(self):
+        self.net_dev = ProcFile(f"{PROC_PATH}/net/dev")
+
+    def read(self):
+        """Get a dict of interface name to a tuple of FIELDS counters"""
+        interfaces = {}
+        for line in self.net_dev.read().split(b'\n')[2:]:
+            name, _, rest = line.partition(b':')
+            parts = rest.split()
+            if len(parts) < 16:
+                continue
+            interfaces[name.strip().decode()] = (
+                int(parts[0]), int(parts[1]), int(parts[2]), int(parts[3]),
+                int(parts[8]), int(parts[9]), int(parts[10]), int(parts[11])
+            )
+        return interfaces
+
+    def network_io(self, interfaces=None):
+        """Get totals in the same shape as NetworkMonitor.get_network_io"""
+        bytes_recv = packets_recv = bytes_sent = packets_sent = 0
+        for counters in (interfaces or self.read()).values():
+            bytes_recv += counters[0]
+            packets_recv += counters[1]
+            bytes_sent += counters[4]
+            packets_sent += counters[5]
+        return {
+            'bytes_sent': bytes_sent,
+            'bytes_recv': bytes_recv,
+            'packets_sent': packets_sent,
+            'packets_recv': packets_recv
+        }
+
+    def per_nic_io(self, interfaces=None):
+        """Get per-interface counters, with errors and drops on top of network_io's"""
+        return {
+            name: {
+                'bytes_sent': counters[4],
+                'bytes_recv': counters[0],
+                'packets_sent': counters[5],
+                'packets_recv': counters[1],
+                'errin': counters[2],
+                'errout': counters[6],
+                'dropin': counters[3],
+                'dropout': counters[7]
+            }
+            for name, counters in (interfaces or self.read()).items()
+        }
+
+
+class NetSocketsReader:
+    """
+    Reads the socket tables of /proc/net/{tcp,tcp6,udp,udp6}.
+
+    Unlike psutil.net_connections() this never maps sockets to processes,
+    which means walking every /proc/<pid>/fd, and it decodes nothing: each
+    table is turned into a set of b"LOCAL REMOTE ST" entries by one regex
+    pass, so callers can diff samples with set operations and only decode()
+    the sockets that changed.
+    """
+    ENTRY = re.compile(rb': ([0-9A-F]{8,32}:[0-9A-F]{4} [0-9A-F]{8,32}:[0-9A-F]{4} [0-9A-F]{2}) ')
+
+    def __init__(self):
+        self.tables = {}
+        for proto in SOCKET_TABLES:
+            try:
+                self.tables[proto] = ProcFile(f"{PROC_PATH}/net/{proto}", 65536)
+            except FileNotFoundError:
+                # No IPv6 (or no UDP) on this kernel
+                if proto == 'tcp':
+                    raise
+
+    def read(self, protos=None):
+        """Get {proto: set of entries} for the given tables (all by default)"""
+        sockets = {}
+        for proto in protos or SOCKET_TABLES:
+            table = self.tables.get(proto)
+            sockets[proto] = set(self.ENTRY.findall(table.read())) if table else set()
+        return sockets
+
+    @staticmethod
+    def split(entry):
+        """Split an entry into its key (b"LOCAL REMOTE") and state"""
+        return entry[:-3], entry[-2:]
+
+    @staticmethod
+    def decode_address(address, family):
+        """Turn a hex "ADDR:PORT" into (ip, port), or () for an unset address"""
+        ip, _, port = address.partition(b':')
+        port = int(port, 16)
+        if not port:
+            return ()
+        raw = bytes.fromhex(ip.decode())
+        if family == socket.AF_INET:
+            raw = raw[::-1]
+        else:
+            # Four host-order 32-bit words
+            raw = struct.pack('>4I', *struct.unpack('<4I', raw))
+        return (socket.inet_ntop(family, raw), port)
+
+    def decode(self, proto, key, state):
+        """Get (local address, remote address, status) of one socket"""
+        family = SOCKET_TABLES[proto]
+        local, remote = key.split(b' ')
+        status = TCP_STATES.get(state, 'NONE') if proto.startswith('tcp') else 'NONE'
+        return (self.decode_address(local, family), self.decode_address(remote, family),
+                status)
+
+
+class SocketInodesReader:
+    """
+    Counts the internet sockets of processes. psutil's per-process
+    net_connections() parses every /proc/net table for each process;
+    here the tables are parsed once into a set of socket inodes, and each
+    process only has its /proc/<pid>/fd links matched against that set.
+    """
+    # The inode is the tenth column, after "sl:" and eight others
+    INODE = re.compile(rb'^ *\d+: (?:\S+ +){8}(\d+)', re.MULTILINE)
+
+    def __init__(self):
+        self.tables = []
+        for proto in SOCKET_TABLES:
+            try:
+                self.tables.append(ProcFile(f"{PROC_PATH}/net/{proto}", 65536))
+            except FileNotFoundError:
+                # No IPv6 (or no UDP) on this kernel
+                if proto == 'tcp':
+                    raise
+
+    def read(self):
+        """Get the set of inodes of every internet socket"""
+        inodes = set()
+        for table in self.tables:
+            inodes.update(self.INODE.findall(table.read()))
+        return inodes
+
+    @staticmethod
+    def count(pid, inodes):
+        """
+        Count the file descriptors of a process that are sockets in inodes.
+        Raises PermissionError for other users' processes and
+        FileNotFoundError once the process exited.
+        """
+        fd_dir = b'%s/%d/fd/' % (PROC_PATH.encode(), pid)
+        count = 0
+        for fd in os.listdir(fd_dir):
+            try:
+                target = os.readlink(fd_dir + fd)
+            except FileNotFoundError:
+                # Closed since the directory was listed
+                continue
+            if target.startswith(b'socket:[') and target[8:-1] in inodes:
+                count += 1
+        return count
@@ -0,0 +1,82 @@
+"""
+Per-second rates of cumulative counters.
+
+Rates are computed where the counters are read, against the monotonic
+time of the read itself, so a collector or UI that runs late still gets
+exact rates: a late sample simply covers a longer interval. Counters that
+go backwards either wrapped or were reset (a NIC that was reset, a disk
+that was unplugged and plugged back in). Only counters whose reader
+declares them narrower than 64 bits (e.g. the 32-bit millisecond fields
+of /proc/diskstats) are corrected for a wrap; any other decrease is a
+reset, which restarts the rate from the next sample instead of producing
+a huge or negative spike. psutil already corrects the wraps of the
+counters it reads.
+
+Wraps can only be told apart from resets on a single kernel counter, so
+totals over several devices are never differenced themselves: their
+rates are the sums of the per-device rates (see sum_rates).
+"""
+
+def counter_delta(old, new, bits=None):
+    """
+    Get how much a counter grew, or None if it was reset. Only a counter
+    of a known width (bits) can have wrapped.
+    """
+    delta = new - old
+    if delta >= 0:
+        return delta
+    if bits is None:
+        return None
+    # A counter that was in its upper half and restarted near 0
+    wrap = 2 ** bits
+    if wrap // 2 <= old < wrap and new < wrap // 2:
+        return delta + wrap
+    return None
+
+
+def sum_rates(groups, names):
+    """Sum the given rates of several groups (e.g. every NIC) into one total"""
+    total = dict.fromkeys(names, 0.0)
+    for rates in groups:
+        for name in names:
+            total[name] += rates.get(name, 0.0)
+    return total
+
+
+class RateCalculator:
+    """
+    Turns groups of counters (e.g. the counters of one NIC) into rates
+    """
+    def __init__(self):
+        # Group -> (timestamp, counters) of the previous sample
+        self.previous = {}
+
+    def update(self, group, counters, timestamp, widths=None):
+        """
+        Get {name: rate per second} for a group's counters read at a
+        monotonic timestamp. widths maps the names of counters that can
+        wrap to their width in bits. Rates are 0.0 on the first sample of
+        a group and for counters that were reset.
+        """
+        previous = self.previous.get(group)
+        self.previous[group] = (timestamp, counters)
+        if previous is None or timestamp <= previous[0]:
+            return {name: 0.0 for name in counters}
+        elapsed = timestamp - previous[0]
+        old = previous[1]
+        widths = widths or {}
+        rates = {}
+        for name, value in counters.items():
+            delta = counter_delta(old[name], value, widths.get(name)) if name in old else None
+            rates[name] = delta / elapsed if delta is not None else 0.0
+        return rates
+
+    def update_all(self, groups, timestamp, widths=None):
+        """
+        Get the rates of every group of {group: counters}, forgetting
+        groups that disappeared (so one that comes back starts over)
+        """
+        for group in self.previous.keys() - groups.keys():
+            del self.previous[group]
+        return {group: self.update(group, counters, timestamp, widths)
+                for group, counters in groups.items()}
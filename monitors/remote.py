@@ -0,0 +1,811 @@
+"""
+Remote agent mode: stream snapshots from many hosts to one dashboard.
+
+An AgentServer runs next to the collectors (`python -m monitors --serve`)
+and streams every snapshot to its clients over TCP or a Unix socket. An
+Aggregator on the dashboard side keeps one persistent connection per
+agent, reconnects when it drops and keeps the latest snapshot and a
+HistoryStore for every host. Neither side imports Qt.
+
+Wire format: each frame is a 4-byte big-endian length followed by a
+zlib-compressed binary message (see FrameEncoder): kind, family and
+timestamp, then the paths and typed values of a flattened snapshot.
+Snapshots are flattened into {path: value} and, after a keyframe, only the
+changed paths (and removed paths) are sent. Each connection numbers every
+path the first time it is sent, so a delta carries a 4-byte id and an
+8-byte number per changed counter instead of repeating path names;
+compressed JSON deltas of the same snapshots are about twice the size. A
+keyframe is sent on connect and every KEYFRAME_INTERVAL frames per family.
+
+Authentication: an agent started with a token sends a random challenge
+first and only streams to clients that answer with the HMAC-SHA256 of the
+challenge under the shared token. Frames are not encrypted; across
+untrusted networks use an SSH tunnel or a Unix socket. An agent without
+a token that listens beyond the loopback interface prints a warning.
+
+Backpressure: an agent only encodes the next frame for a client once the
+previous one has been fully written. Snapshots that arrive meanwhile
+replace each other, so a slow viewer gets the latest state of each family
+instead of an ever-growing queue.
+"""
+import errno
+import hashlib
+import hmac
+import os
+import selectors
+import socket
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections.abc import Mapping
+from .collector import Collector, freeze
+from .history import HistoryStore, sample_time
+
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME = 64 * 1024 * 1024
+# Aggregators only ever send an authentication frame
+MAX_CLIENT_FRAME = 4096
+KEYFRAME_INTERVAL = 30
+
+# Message kinds, numbered on the wire
+KINDS = ('hello', 'key', 'delta', 'challenge', 'auth')
+
+# Kind, flags, family length, timestamp; then the family name
+MESSAGE_HEADER = struct.Struct('<BBHd')
+COUNT = struct.Struct('<I')
+PATH_ID = struct.Struct('<I')
+FLOAT = struct.Struct('<d')
+INTEGER = struct.Struct('<q')
+# Flag: the sender forgot its path ids before this frame
+RESET_PATHS = 1
+# Path ids a connection keeps before starting over
+MAX_PATHS = 1 << 20
+
+CHALLENGE_SIZE = 32
+
+# Separates the segments of a flattened path. Each segment starts with
+# '.' for a dict key or '#' for a list index.
+SEP = '\x1f'
+
+RECONNECT_MIN = 0.5
+RECONNECT_MAX = 30.0
+
+
+def flatten(value, prefix='', flat=None):
+    """Flatten nested dicts and lists into an ordered {path: leaf} dict"""
+    if flat is None:
+        flat = {}
+    if isinstance(value, Mapping):
+        if not value:
+            flat[prefix] = {}
+        for key, item in value.items():
+            flatten(item, f'{prefix}{SEP}.{key}', flat)
+    elif isinstance(value, (list, tuple)):
+        if not value:
+            flat[prefix] = []
+        for i, item in enumerate(value):
+            flatten(item, f'{prefix}{SEP}#{i}', flat)
+    else:
+        flat[prefix] = value
+    return flat
+
+
+def build(node):
+    """Turn the intermediate tree of unflatten() into dicts and lists"""
+    if not isinstance(node, dict) or not node:
+        return node
+    if all(key.startswith('#') for key in node):
+        return [build(node[key]) for key in sorted(node, key=lambda key: int(key[1:]))]
+    return {key[1:]: build(item) for key, item in node.items()}
+
+
+def unflatten(flat):
+    """Rebuild the nested value that flatten() produced"""
+    root = {}
+    for path, value in flat.items():
+        if not path:
+            return value
+        parts = path.split(SEP)[1:]
+        node = root
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return build(root)
+
+
+def encode_value(out, value):
+    """Append one leaf value, tagged with its type"""
+    if value is None:
+        out += b'N'
+    elif value is True:
+        out += b'T'
+    elif value is False:
+        out += b'F'
+    elif isinstance(value, float):
+        out += b'd'
+        out += FLOAT.pack(value)
+    elif isinstance(value, int) and -(1 << 63) <= value < (1 << 63):
+        out += b'q'
+        out += INTEGER.pack(value)
+    elif isinstance(value, (str, int)):
+        # Integers beyond 64 bits travel as their decimal digits
+        encoded = str(value).encode()
+        out += b's' if isinstance(value, str) else b'i'
+        out += COUNT.pack(len(encoded))
+        out += encoded
+    elif isinstance(value, Mapping) and not value:
+        out += b'{'
+    elif isinstance(value, (list, tuple)) and not value:
+        out += b'['
+    else:
+        raise TypeError(f"cannot encode {type(value).__name__} values")
+
+
+def decode_value(data, offset):
+    """Get (value, next offset) of the leaf value at offset"""
+    tag = data[offset:offset + 1]
+    offset += 1
+    if tag == b'd':
+        return FLOAT.unpack_from(data, offset)[0], offset + FLOAT.size
+    if tag == b'q':
+        return INTEGER.unpack_from(data, offset)[0], offset + INTEGER.size
+    if tag in (b's', b'i'):
+        length, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        text = bytes(data[offset:offset + length]).decode()
+        return (text if tag == b's' else int(text)), offset + length
+    if tag == b'N':
+        return None, offset
+    if tag == b'T':
+        return True, offset
+    if tag == b'F':
+        return False, offset
+    if tag == b'{':
+        return {}, offset
+    if tag == b'[':
+        return [], offset
+    raise ValueError(f"unknown value tag {tag!r}")
+
+
+class FrameEncoder:
+    """
+    Encodes the messages of one connection. The body of a 'key' frame is
+    a flat snapshot, that of a 'delta' frame (changed, removed) as made by
+    diff(), and any other body a value that is flattened.
+
+    A message is the MESSAGE_HEADER and family name, then the paths seen
+    for the first time (count, then length and UTF-8 text of each; their
+    ids follow on from those already sent), the (path id, value) entries
+    and, for deltas, the ids of the removed paths.
+    """
+    def __init__(self):
+        self.paths = {}
+
+    def path_id(self, path, new_paths):
+        """Get the id of a path, numbering it if it was never sent"""
+        path_id = self.paths.get(path)
+        if path_id is None:
+            path_id = self.paths[path] = len(self.paths)
+            new_paths.append(path)
+        return path_id
+
+    def encode(self, kind, family, timestamp, body):
+        """Encode one message as a length-prefixed frame"""
+        flags = 0
+        if len(self.paths) >= MAX_PATHS:
+            self.paths = {}
+            flags |= RESET_PATHS
+        if kind == 'delta':
+            changed, removed = body
+        else:
+            changed, removed = (body if kind == 'key' else flatten(body)), ()
+
+        new_paths = []
+        entries = bytearray(COUNT.pack(len(changed)))
+        for path, value in changed.items():
+            entries += PATH_ID.pack(self.path_id(path, new_paths))
+            encode_value(entries, value)
+        entries += COUNT.pack(len(removed))
+        for path in removed:
+            entries += PATH_ID.pack(self.path_id(path, new_paths))
+
+        family_name = (family or '').encode()
+        message = bytearray(MESSAGE_HEADER.pack(KINDS.index(kind), flags,
+                                                len(family_name), timestamp))
+        message += family_name
+        message += COUNT.pack(len(new_paths))
+        for path in new_paths:
+            encoded = path.encode()
+            message += COUNT.pack(len(encoded))
+            message += encoded
+        message += entries
+        payload = zlib.compress(message, 1)
+        return FRAME_HEADER.pack(len(payload)) + payload
+
+
+class FrameDecoder:
+    """
+    Decodes the frames of one connection into [kind, family, timestamp,
+    body] messages, the inverse of FrameEncoder
+    """
+    def __init__(self, max_frame=MAX_FRAME):
+        self.max_frame = max_frame
+        self.paths = []
+
+    def decode(self, buffer):
+        """Pop every complete frame off a bytearray and yield its message"""
+        while len(buffer) >= FRAME_HEADER.size:
+            length, = FRAME_HEADER.unpack_from(buffer)
+            if length > self.max_frame:
+                raise ValueError(f"frame of {length} bytes exceeds the limit")
+            end = FRAME_HEADER.size + length
+            if len(buffer) < end:
+                return
+            payload = bytes(buffer[FRAME_HEADER.size:end])
+            del buffer[:end]
+            yield self.decode_message(zlib.decompress(payload))
+
+    def decode_message(self, data):
+        """Decode one decompressed message"""
+        kind, flags, family_length, timestamp = MESSAGE_HEADER.unpack_from(data, 0)
+        if flags & RESET_PATHS:
+            self.paths = []
+        offset = MESSAGE_HEADER.size
+        family = bytes(data[offset:offset + family_length]).decode() or None
+        offset += family_length
+
+        paths = self.paths
+        count, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        for _ in range(count):
+            length, = COUNT.unpack_from(data, offset)
+            offset += COUNT.size
+            paths.append(bytes(data[offset:offset + length]).decode())
+            offset += length
+
+        changed = {}
+        count, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        for _ in range(count):
+            path_id, = PATH_ID.unpack_from(data, offset)
+            changed[paths[path_id]], offset = decode_value(data, offset + PATH_ID.size)
+        count, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        removed = [paths[path_id] for path_id, in
+                   PATH_ID.iter_unpack(data[offset:offset + count * PATH_ID.size])]
+
+        kind = KINDS[kind]
+        if kind == 'delta':
+            body = [changed, removed]
+        elif kind == 'key':
+            body = changed
+        else:
+            body = unflatten(changed)
+        return [kind, family, timestamp, body]
+
+
+def read_token(path):
+    """Read a shared token from a file, ignoring surrounding whitespace"""
+    with open(path, 'rb') as f:
+        token = f.read().strip()
+    if not token:
+        raise ValueError(f"{path} holds no token")
+    return token
+
+
+def sign(token, challenge):
+    """Get the answer to an agent's challenge under a shared token"""
+    return hmac.new(token, challenge, hashlib.sha256).hexdigest()
+
+
+def diff(old, new):
+    """Get (changed, removed) between two flat snapshots"""
+    changed = {path: value for path, value in new.items()
+               if path not in old or old[path] != value}
+    removed = [path for path in old if path not in new]
+    return changed, removed
+
+
+def parse_address(address):
+    """
+    Turn 'host:port', 'port' or 'unix:/path' into (family, address).
+    A bare port means the loopback interface.
+    """
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[5:]
+    host, _, port = address.rpartition(':')
+    host = host.strip('[]') or '127.0.0.1'
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    return family, (host, int(port))
+
+
+def is_loopback(address):
+    """Check whether an AgentServer address is only reachable locally"""
+    family, bind_address = parse_address(address)
+    if family == socket.AF_UNIX:
+        return True
+    return bind_address[0] in ('localhost', '::1') or bind_address[0].startswith('127.')
+
+
+class AgentClient:
+    """
+    Per-connection state of an AgentServer
+    """
+    def __init__(self, sock, challenge=None):
+        self.sock = sock
+        self.out = bytearray()
+        self.inbox = bytearray()
+        self.encoder = FrameEncoder()
+        self.decoder = FrameDecoder(MAX_CLIENT_FRAME)
+        # Nonce the client must sign before it is sent snapshots, if any
+        self.challenge = challenge
+        # Families with a snapshot the client has not been sent yet
+        self.pending = set()
+        # Flat snapshot last sent for each family, and frames since keyframe
+        self.sent = {}
+        self.frames = {}
+        self.writing = False
+
+
+class AgentServer:
+    """
+    Streams snapshots to any number of aggregators from a background thread
+    """
+    def __init__(self, address='127.0.0.1:9840', hostname=None, token=None):
+        self.address = address
+        self.hostname = hostname or socket.gethostname()
+        self.token = token
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.clients = {}
+        # Latest (timestamp, flat snapshot) of every family
+        self.latest = {}
+        self.running = False
+        self.thread = None
+
+        family, bind_address = parse_address(address)
+        if family == socket.AF_UNIX and os.path.exists(bind_address):
+            os.unlink(bind_address)
+        self.listener = socket.socket(family, socket.SOCK_STREAM)
+        if family != socket.AF_UNIX:
+            self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(bind_address)
+        self.listener.listen(64)
+        self.listener.setblocking(False)
+        # Port 0 binds a free port; report the real address
+        self.bound_address = self.listener.getsockname()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        if token is None and not is_loopback(address):
+            print(f"Warning: the agent on {address} streams to anyone who connects; "
+                  "use --token-file or a loopback or Unix socket address",
+                  file=sys.stderr)
+
+        # Lets publish() wake the selector from another thread
+        self.wake_read, self.wake_write = socket.socketpair()
+        self.wake_read.setblocking(False)
+        self.wake_write.setblocking(False)
+        self.selector.register(self.wake_read, selectors.EVENT_READ)
+
+    def publish(self, family, snapshot):
+        """Collector listener: queue a snapshot for every client"""
+        flat = flatten(snapshot)
+        with self.lock:
+            self.latest[family] = (sample_time(), flat)
+            for client in self.clients.values():
+                client.pending.add(family)
+        try:
+            self.wake_write.send(b'\0')
+        except (BlockingIOError, OSError):
+            # Already woken (or shutting down)
+            pass
+
+    def start(self):
+        """Serve from a background thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='agent-server', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Close every connection and stop the server thread"""
+        self.running = False
+        try:
+            self.wake_write.send(b'\0')
+        except OSError:
+            pass
+        if self.thread is not None:
+            self.thread.join()
+        for client in list(self.clients.values()):
+            self.drop(client)
+        self.selector.close()
+        self.listener.close()
+        self.wake_read.close()
+        self.wake_write.close()
+        if isinstance(self.bound_address, str) and os.path.exists(self.bound_address):
+            os.unlink(self.bound_address)
+
+    def run(self):
+        """Accept clients and flush frames until stopped"""
+        while self.running:
+            for key, events in self.selector.select(timeout=1.0):
+                if key.fileobj is self.listener:
+                    self.accept()
+                elif key.fileobj is self.wake_read:
+                    try:
+                        while self.wake_read.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                else:
+                    client = key.data
+                    if events & selectors.EVENT_READ:
+                        self.read(client)
+                    if events & selectors.EVENT_WRITE and client.sock.fileno() != -1:
+                        self.write(client)
+            for client in list(self.clients.values()):
+                self.fill(client)
+
+    def accept(self):
+        """Accept a new aggregator and challenge or greet it"""
+        try:
+            sock, _ = self.listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        if sock.family != socket.AF_UNIX:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        challenge = None if self.token is None else os.urandom(CHALLENGE_SIZE).hex()
+        client = AgentClient(sock, challenge)
+        with self.lock:
+            self.clients[sock.fileno()] = client
+        self.selector.register(sock, selectors.EVENT_READ, client)
+        if challenge is None:
+            self.greet(client)
+        else:
+            client.out += client.encoder.encode('challenge', None, time.time(),
+                                                {'nonce': challenge})
+            self.write(client)
+
+    def greet(self, client):
+        """Queue the hello and every family for an accepted client"""
+        client.out += client.encoder.encode('hello', None, time.time(),
+                                            {'host': self.hostname})
+        with self.lock:
+            client.pending.update(self.latest)
+        self.fill(client)
+
+    def read(self, client):
+        """Check a client's answer to the challenge, or notice it closing"""
+        try:
+            data = client.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self.drop(client)
+            return
+        if client.challenge is None:
+            # Authenticated aggregators send nothing more
+            return
+
+        client.inbox += data
+        try:
+            for kind, _, _, body in client.decoder.decode(client.inbox):
+                expected = sign(self.token, client.challenge.encode())
+                if kind != 'auth' or not hmac.compare_digest(
+                        str(body.get('answer', '')), expected):
+                    raise ValueError("wrong answer to the challenge")
+                client.challenge = None
+                client.inbox.clear()
+                self.greet(client)
+                return
+        except (ValueError, TypeError, KeyError, AttributeError, IndexError,
+                struct.error, zlib.error):
+            self.drop(client)
+
+    def fill(self, client):
+        """Encode pending snapshots once the client's buffer has drained"""
+        if (client.out or not client.pending or client.challenge is not None
+                or client.sock.fileno() == -1):
+            self.watch_writes(client)
+            return
+        with self.lock:
+            pending, client.pending = client.pending, set()
+            snapshots = {family: self.latest[family] for family in pending}
+
+        for family, (timestamp, flat) in snapshots.items():
+            previous = client.sent.get(family)
+            frames = client.frames.get(family, 0)
+            if previous is None or frames >= KEYFRAME_INTERVAL:
+                client.out += client.encoder.encode('key', family, timestamp, flat)
+                client.frames[family] = 0
+            else:
+                client.out += client.encoder.encode('delta', family, timestamp,
+                                                    diff(previous, flat))
+                client.frames[family] = frames + 1
+            client.sent[family] = flat
+        self.write(client)
+
+    def write(self, client):
+        """Send as much of the client's buffer as the socket takes"""
+        try:
+            sent = client.sock.send(client.out)
+            del client.out[:sent]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.drop(client)
+            return
+        self.watch_writes(client)
+
+    def watch_writes(self, client):
+        """Only ask for writability while there is something to send"""
+        if client.sock.fileno() == -1:
+            return
+        writing = bool(client.out)
+        if writing != client.writing:
+            client.writing = writing
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0)
+            self.selector.modify(client.sock, events, client)
+
+    def drop(self, client):
+        """Forget a client whose connection closed"""
+        with self.lock:
+            self.clients.pop(client.sock.fileno(), None)
+        try:
+            self.selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+
+
+class RemoteHost:
+    """
+    The dashboard's view of one agent: its connection, latest snapshots and
+    history
+    """
+    def __init__(self, address, history_capacity=600, token=None):
+        self.address = address
+        self.token = token
+        self.name = None
+        self.sock = None
+        self.connected = False
+        self.inbox = bytearray()
+        self.decoder = FrameDecoder()
+        self.retry_at = 0.0
+        self.backoff = RECONNECT_MIN
+        # Flat state of every family, kept in step with the agent's
+        self.flat = {}
+        self.latest = {}
+        self.history = HistoryStore(capacity=history_capacity)
+        # Only used for its record_* methods, which fill self.history
+        self.recorder = Collector(history=self.history)
+
+    def label(self):
+        """Get a human readable name for the host"""
+        if self.name:
+            return f"{self.name} ({self.address})"
+        return self.address
+
+    def apply(self, kind, family, timestamp, body):
+        """Apply a key or delta frame and return the rebuilt snapshot"""
+        if kind == 'key':
+            flat = dict(body)
+        else:
+            flat = self.flat.get(family)
+            if flat is None:
+                # A delta without its keyframe; wait for the next keyframe
+                return None
+            changed, removed = body
+            for path in removed:
+                flat.pop(path, None)
+            flat.update(changed)
+        self.flat[family] = flat
+
+        info = unflatten(flat)
+        if family not in ('static', 'system'):
+            self.recorder.record(family, info, timestamp)
+        snapshot = self.latest[family] = freeze(info)
+        return snapshot
+
+
+class Aggregator:
+    """
+    Keeps a connection to every agent from a single background thread.
+
+    on_snapshot(host, family, snapshot) is called from that thread for
+    every snapshot received, and on_hosts_changed() whenever a host
+    connects, disconnects or is named.
+    """
+    def __init__(self, on_snapshot=None, on_hosts_changed=None, history_capacity=600):
+        self.on_snapshot = on_snapshot
+        self.on_hosts_changed = on_hosts_changed
+        self.history_capacity = history_capacity
+        self.hosts = {}
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        # Hosts removed by other threads, closed by the aggregator thread
+        self.removed = []
+        self.wake_read, self.wake_write = socket.socketpair()
+        self.wake_read.setblocking(False)
+        self.wake_write.setblocking(False)
+        self.selector.register(self.wake_read, selectors.EVENT_READ)
+
+    def add_host(self, address, token=None):
+        """Start following an agent, answering its challenge with token"""
+        with self.lock:
+            if address not in self.hosts:
+                self.hosts[address] = RemoteHost(address, self.history_capacity, token)
+        self.wake()
+        self.hosts_changed()
+
+    def remove_host(self, address):
+        """Stop following an agent"""
+        with self.lock:
+            host = self.hosts.pop(address, None)
+            if host is not None:
+                self.removed.append(host)
+        if host is not None:
+            self.wake()
+            self.hosts_changed()
+
+    def get_host(self, address):
+        """Get a RemoteHost, or None"""
+        return self.hosts.get(address)
+
+    def wake(self):
+        """Interrupt the selector so that it notices new hosts"""
+        try:
+            self.wake_write.send(b'\0')
+        except OSError:
+            pass
+
+    def hosts_changed(self):
+        if self.on_hosts_changed is not None:
+            self.on_hosts_changed()
+
+    def start(self):
+        """Run the connections from a background thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='aggregator', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Close every connection and stop the thread"""
+        self.running = False
+        self.wake()
+        if self.thread is not None:
+            self.thread.join()
+        for host in list(self.hosts.values()) + self.removed:
+            self.disconnect(host, retry=False)
+        self.selector.close()
+        self.wake_read.close()
+        self.wake_write.close()
+
+    def run(self):
+        """Connect, read and reconnect until stopped"""
+        while self.running:
+            now = time.monotonic()
+            with self.lock:
+                hosts = list(self.hosts.values())
+                removed, self.removed = self.removed, []
+            for host in removed:
+                self.disconnect(host, retry=False)
+            timeout = 1.0
+            for host in hosts:
+                if host.sock is None:
+                    if host.retry_at <= now:
+                        self.connect(host)
+                    else:
+                        timeout = min(timeout, host.retry_at - now)
+
+            for key, events in self.selector.select(timeout=max(timeout, 0.0)):
+                if key.fileobj is self.wake_read:
+                    try:
+                        while self.wake_read.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                host = key.data
+                if not host.connected and events & selectors.EVENT_WRITE:
+                    self.finish_connect(host)
+                elif events & selectors.EVENT_READ:
+                    self.read(host)
+
+    def connect(self, host):
+        """Start a non-blocking connection to an agent"""
+        try:
+            family, address = parse_address(host.address)
+            sock = socket.socket(family, socket.SOCK_STREAM)
+        except (OSError, ValueError):
+            self.schedule_retry(host)
+            return
+        sock.setblocking(False)
+        result = sock.connect_ex(address)
+        if result not in (0, errno.EINPROGRESS, errno.EAGAIN, errno.EWOULDBLOCK):
+            sock.close()
+            self.schedule_retry(host)
+            return
+        host.sock = sock
+        host.inbox.clear()
+        host.decoder = FrameDecoder()
+        self.selector.register(sock, selectors.EVENT_WRITE, host)
+
+    def finish_connect(self, host):
+        """Complete a connection once the socket is writable"""
+        if host.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR):
+            self.disconnect(host)
+            return
+        host.connected = True
+        host.backoff = RECONNECT_MIN
+        # Deltas only make sense against the state of this connection
+        host.flat = {}
+        self.selector.modify(host.sock, selectors.EVENT_READ, host)
+        self.hosts_changed()
+
+    def read(self, host):
+        """Read frames from an agent and publish the snapshots"""
+        try:
+            data = host.sock.recv(1 << 16)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self.disconnect(host)
+            return
+
+        host.inbox += data
+        try:
+            for kind, family, timestamp, body in host.decoder.decode(host.inbox):
+                if kind == 'challenge':
+                    self.answer(host, body)
+                    continue
+                if kind == 'hello':
+                    host.name = body.get('host')
+                    self.hosts_changed()
+                    continue
+                snapshot = host.apply(kind, family, timestamp, body)
+                if snapshot is not None and self.on_snapshot is not None:
+                    self.on_snapshot(host.address, family, snapshot)
+        except (ValueError, TypeError, KeyError, AttributeError, IndexError,
+                struct.error, zlib.error, OSError):
+            # A corrupt stream (or a delta whose paths conflict with the
+            # state it applies to): start over with a fresh connection
+            self.disconnect(host)
+
+    def answer(self, host, body):
+        """Sign an agent's challenge with the host's token"""
+        if host.token is None:
+            raise ValueError(f"{host.address} asks for a token but none is set")
+        frame = FrameEncoder().encode('auth', None, time.time(), {
+            'answer': sign(host.token, body['nonce'].encode())})
+        # The socket's buffer is empty this early, so the frame fits
+        if host.sock.send(frame) != len(frame):
+            raise OSError("could not send the answer to the challenge")
+
+    def disconnect(self, host, retry=True):
+        """Close a host's connection, reconnecting later if retry"""
+        if host.sock is not None:
+            try:
+                self.selector.unregister(host.sock)
+            except (KeyError, ValueError):
+                pass
+            host.sock.close()
+            host.sock = None
+        was_connected = host.connected
+        host.connected = False
+        if retry:
+            self.schedule_retry(host)
+        if was_connected:
+            self.hosts_changed()
+
+    def schedule_retry(self, host):
+        """Back off exponentially before reconnecting"""
+        host.retry_at = time.monotonic() + host.backoff
+        host.backoff = min(host.backoff * 2, RECONNECT_MAX)
@@ -0,0 +1,68 @@
+import time
+
+# How often a metric family changes
+STATIC = 'static'   # collected once and cached for the lifetime of the app
+SLOW = 'slow'
+FAST = 'fast'
+
+# Default refresh interval (seconds) of each cadence
+DEFAULT_INTERVALS = {
+    SLOW: 2.0,
+    FAST: 1.0
+}
+
+
+class Scheduler:
+    """
+    Runs jobs on fixed intervals against the monotonic clock.
+
+    Each job's next deadline is derived from its previous deadline rather
+    than from when the job finished, so intervals do not drift. When a run
+    overshoots one or more deadlines the missed ticks are skipped instead
+    of being replayed back to back.
+    """
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.jobs = {}
+
+    def __contains__(self, name):
+        return name in self.jobs
+
+    def add(self, name, interval, callback):
+        """Schedule a job, due immediately. A None interval runs it only once."""
+        self.jobs[name] = {
+            'interval': interval,
+            'callback': callback,
+            'deadline': self.clock()
+        }
+
+    def remove(self, name):
+        """Unschedule a job"""
+        self.jobs.pop(name, None)
+
+    def next_deadline(self):
+        """Get the monotonic time at which the next job is due"""
+        if not self.jobs:
+            return None
+        return min(job['deadline'] for job in self.jobs.values())
+
+    def run_pending(self):
+        """Run every job that is due and return their names"""
+        now = self.clock()
+        due = [name for name, job in self.jobs.items() if job['deadline'] <= now]
+        for name in due:
+            job = self.jobs.get(name)
+            if job is None:
+                continue
+
+            if job['interval'] is None:
+                del self.jobs[name]
+            else:
+                job['deadline'] += job['interval']
+                if job['deadline'] <= now:
+                    # Skip ticks that were missed while something ran long
+                    missed = int((now - job['deadline']) // job['interval']) + 1
+                    job['deadline'] += missed * job['interval']
+
+            job['callback']()
+        return due
@@ -2,35 +2,77 @@ import psutil
 import time
 from datetime import datetime
 import os
+from . import procfs
+from .partitions import PartitionCache
+from .rates import RateCalculator, sum_rates
+
+def find_backing_disk(device):
+    """Resolve a device path to the whole disk it belongs to, through sysfs"""
+    if not device.startswith('/dev/'):
+        return None
+    name = os.path.basename(os.path.realpath(device))
+    block = f"/sys/class/block/{name}"
+    if not os.path.exists(block):
+        # No sysfs (or not Linux): the device name is the best guess
+        return name
+    if os.path.exists(f"{block}/partition"):
+        # Partitions sit inside the directory of their disk
+        return os.path.basename(os.path.dirname(os.path.realpath(block)))
+    return name
+
 
 class StorageMonitor:
     """
     A simple class to monitor storage statistics
     """
-    def __init__(self):
-        pass
+    def __init__(self, backend='auto'):
+        # Use the /proc fast path when possible, psutil otherwise
+        self.diskstats = procfs.open_reader(procfs.DiskstatsReader, backend)
+        # Per-second rates of the per-device counters
+        self.disk_rates = RateCalculator()
+        # Whole disk behind each partition device
+        self.backing_disks = {}
+        # Mounted filesystems and their usage, refreshed without blocking
+        self.partitions = PartitionCache()
     
     def get_partitions(self):
-        """Get information about disk partitions"""
+        """
+        Get information about disk partitions, one per filesystem. 'stale'
+        marks usage that could not be refreshed in time (e.g. a hung NFS
+        server), which is then the last value that was read.
+        """
         partitions = []
-        for partition in psutil.disk_partitions():
-            try:
-                usage = psutil.disk_usage(partition.mountpoint)
-                partitions.append({
-                    'device': partition.device,
-                    'mountpoint': partition.mountpoint,
-                    'fstype': partition.fstype,
-                    'total': usage.total,
-                    'used': usage.used,
-                    'free': usage.free,
-                    'percent': usage.percent
-                })
-            except Exception:
-                continue
+        for partition, usage, stale in self.partitions.get_partitions():
+            total, used, free, percent = usage
+            partitions.append({
+                'device': partition.device,
+                'disk': self.get_backing_disk(partition.device),
+                'mountpoint': partition.mountpoint,
+                'fstype': partition.fstype,
+                'total': total,
+                'used': used,
+                'free': free,
+                'percent': percent,
+                'stale': stale
+            })
         return partitions
     
-    def get_disk_io(self):
+    def read_diskstats(self):
+        """Read /proc/diskstats once, or return None to use psutil"""
+        if self.diskstats is None:
+            return None
+        try:
+            return self.diskstats.read()
+        except (OSError, ValueError):
+            # Fall back to psutil for the rest of the session
+            self.diskstats = None
+            return None
+    
+    def get_disk_io(self, devices=None):
         """Get disk I/O statistics"""
+        devices = devices or self.read_diskstats()
+        if devices is not None:
+            return self.diskstats.disk_io(devices)
         io = psutil.disk_io_counters()
         return {
             'read_bytes': io.read_bytes,
@@ -39,9 +81,85 @@ class StorageMonitor:
             'write_count': io.write_count
         }
     
+    def get_disk_io_per_disk(self, devices=None):
+        """Get disk I/O statistics for each device"""
+        devices = devices or self.read_diskstats()
+        if devices is not None:
+            return self.diskstats.per_disk_io(devices)
+        per_disk = {}
+        for name, io in (psutil.disk_io_counters(perdisk=True) or {}).items():
+            counters = per_disk[name] = {
+                'read_bytes': io.read_bytes,
+                'write_bytes': io.write_bytes,
+                'read_count': io.read_count,
+                'write_count': io.write_count
+            }
+            # Timings are not available on every platform
+            for key in ('read_time', 'write_time', 'busy_time'):
+                if hasattr(io, key):
+                    counters[key] = getattr(io, key)
+        return per_disk
+
+    def is_whole_disk(self, name):
+        """Check whether a device is a whole disk (always true without sysfs)"""
+        if self.diskstats is not None:
+            return self.diskstats.is_whole_disk(name)
+        # psutil's totals on Linux also only count the disks in /sys/block
+        return not os.path.isdir('/sys/block') or \
+            os.path.exists('/sys/block/' + name.replace('/', '!'))
+
+    def get_backing_disk(self, device):
+        """
+        Get the whole disk a partition's device (e.g. /dev/sda1 or
+        /dev/mapper/root) lives on, as named in the per-disk counters, or
+        None for filesystems without a block device
+        """
+        if device not in self.backing_disks:
+            self.backing_disks[device] = find_backing_disk(device)
+        return self.backing_disks[device]
+
+    def get_disk_stats(self, per_disk, per_disk_rates):
+        """Get IOPS, throughput, utilisation, latency and queue depth of each whole disk"""
+        stats = {}
+        for name, rates in per_disk_rates.items():
+            counters = per_disk[name]
+            # Partitions are covered by their disk; unused devices (e.g.
+            # spare loop devices) are left out
+            if not self.is_whole_disk(name) or not (counters['read_count'] or counters['write_count']):
+                continue
+            iops = rates['read_count'] + rates['write_count']
+            latency = rates.get('read_time', 0.0) + rates.get('write_time', 0.0)
+            stats[name] = {
+                'read_iops': rates['read_count'],
+                'write_iops': rates['write_count'],
+                'read_rate': rates['read_bytes'],
+                'write_rate': rates['write_bytes'],
+                # Milliseconds busy per second, as a percentage
+                'util_percent': min(rates.get('busy_time', 0.0) / 10, 100.0),
+                # Milliseconds spent per completed I/O
+                'await_ms': latency / iops if iops else 0.0,
+                'queue_depth': counters.get('in_flight', 0)
+            }
+        return stats
+    
     def get_all_info(self):
         """Get all storage information"""
+        # Totals and per-device counters come from the same diskstats read,
+        # and their rates are timed by that read
+        devices = self.read_diskstats()
+        timestamp = time.monotonic()
+        io = self.get_disk_io(devices)
+        per_disk = self.get_disk_io_per_disk(devices)
+        # psutil corrects the wraps of the counters it reads
+        widths = procfs.DiskstatsReader.COUNTER_BITS if devices is not None else None
+        per_disk_rates = self.disk_rates.update_all(per_disk, timestamp, widths)
         return {
             'partitions': self.get_partitions(),
-            'io': self.get_disk_io()
-        }
\ No newline at end of file
+            'io': io,
+            # Summed per disk, where a wrap or reset can be recognised
+            'rates': sum_rates((rates for name, rates in per_disk_rates.items()
+                                if self.is_whole_disk(name)), io),
+            'per_disk': per_disk,
+            'per_disk_rates': per_disk_rates,
+            'disk_stats': self.get_disk_stats(per_disk, per_disk_rates)
+        }
@@ -11,7 +11,10 @@ class SystemMonitor:
     A simple class to monitor system-wide statistics
     """
     def __init__(self):
-        pass
+        # Facts that cannot change while the app runs are cached
+        self.os_info = None
+        self.python_info = None
+        self.cpu_count = None
     
     def get_boot_time(self):
         """Get system boot time"""
@@ -31,7 +34,12 @@ class SystemMonitor:
     
     def get_os_info(self):
         """Get operating system information"""
-        
+        if self.os_info is None:
+            self.os_info = self.read_os_info()
+        return self.os_info
+    
+    def read_os_info(self):
+        """Query the platform module for operating system information"""
         return {
             'system': platform.system(),
             'release': platform.release(),
@@ -43,13 +51,47 @@ class SystemMonitor:
             'platform': platform.platform(),
         }
     
-    def get_all_info(self):
-        """Get all system information"""
+    def get_python_info(self):
+        """Get information about the running Python interpreter"""
+        if self.python_info is None:
+            self.python_info = {
+                'version': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'compiler': platform.python_compiler(),
+                'build': platform.python_build()
+            }
+        return self.python_info
+    
+    def get_cpu_count(self):
+        """Get CPU core counts"""
+        if self.cpu_count is None:
+            self.cpu_count = {
+                'logical': psutil.cpu_count(),
+                'physical': psutil.cpu_count(logical=False)
+            }
+        return self.cpu_count
+    
+    def get_static_info(self):
+        """Get system information that never changes while the app runs"""
+        return {
+            'os_info': self.get_os_info(),
+            'python': self.get_python_info(),
+            'cpu_count': self.get_cpu_count()
+        }
+    
+    def get_dynamic_info(self):
+        """Get system information that changes over time"""
         return {
             'boot_time': self.get_boot_time(),
             'users': self.get_users(),
-            'os_info': self.get_os_info()
+            'cpu_percent': psutil.cpu_percent()
         }
+    
+    def get_all_info(self):
+        """Get all system information"""
+        info = self.get_static_info()
+        info.update(self.get_dynamic_info())
+        return info
 
 # Example usage:
 if __name__ == "__main__":
@@ -0,0 +1,196 @@
+"""
+Wireless link information, refreshed on a slow cadence.
+
+On Linux the link is read without forking anything: wireless interfaces
+are found in /sys/class/net/*/wireless, signal and noise come from
+/proc/net/wireless and the SSID and bit rate from wireless extension
+ioctls. Other platforms run their wireless tool (netsh, airport) in a
+background thread with a timeout. Either way get_info() only returns the
+cached result, which is refreshed at most every WIRELESS_INTERVAL seconds.
+"""
+import array
+import os
+import platform
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+from . import procfs
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, which never uses the ioctls
+    fcntl = None
+
+# Looked up once; it never changes while the app runs
+SYSTEM = platform.system()
+
+SYS_NET_PATH = '/sys/class/net'
+
+# Seconds between refreshes, and the longest a wireless tool may run
+WIRELESS_INTERVAL = 10.0
+COMMAND_TIMEOUT = 5.0
+
+# Wireless extension ioctls (linux/wireless.h)
+SIOCGIWESSID = 0x8B1B
+SIOCGIWRATE = 0x8B21
+IW_ESSID_MAX_SIZE = 32
+
+# Wireless tool and the fields shown from its output, per platform
+COMMANDS = {
+    'Windows': (["netsh", "wlan", "show", "interfaces"],
+                ('Name', 'State', 'SSID', 'Signal', 'Channel', 'Authentication', 'Radio type')),
+    'Darwin': (["/System/Library/PrivateFrameworks/Apple80211.framework/Versions/Current/"
+                "Resources/airport", "-I"],
+               ('SSID', 'channel', 'agrCtlRSSI', 'agrCtlNoise', 'lastTxRate', 'maxRate')),
+    'Linux': (["iwconfig"], ())
+}
+
+
+def wireless_interfaces():
+    """Get the names of the wireless interfaces listed in sysfs"""
+    return sorted(name for name in os.listdir(SYS_NET_PATH)
+                  if os.path.isdir(os.path.join(SYS_NET_PATH, name, 'wireless')))
+
+
+def read_proc_wireless():
+    """Get {interface: (link quality, signal dBm, noise dBm)} from /proc/net/wireless"""
+    links = {}
+    try:
+        with open(f"{procfs.PROC_PATH}/net/wireless") as f:
+            lines = f.read().splitlines()[2:]
+    except OSError:
+        return links
+    for line in lines:
+        name, _, rest = line.partition(':')
+        parts = rest.split()
+        if len(parts) < 4:
+            continue
+        try:
+            links[name.strip()] = tuple(float(value.rstrip('.')) for value in parts[1:4])
+        except ValueError:
+            continue
+    return links
+
+
+def ioctl_essid(sock, name):
+    """Get the SSID of an interface through SIOCGIWESSID"""
+    buffer = array.array('B', bytes(IW_ESSID_MAX_SIZE + 1))
+    address, length = buffer.buffer_info()
+    request = struct.pack('16sPHH', name.encode()[:15], address, length, 0)
+    result = fcntl.ioctl(sock.fileno(), SIOCGIWESSID, request.ljust(32, b'\0'))
+    size = struct.unpack_from('H', result, 16 + struct.calcsize('P'))[0]
+    return buffer.tobytes()[:size].rstrip(b'\0').decode(errors='replace')
+
+
+def ioctl_bitrate(sock, name):
+    """Get the bit rate (bit/s) of an interface through SIOCGIWRATE"""
+    request = struct.pack('16s', name.encode()[:15]).ljust(32, b'\0')
+    result = fcntl.ioctl(sock.fileno(), SIOCGIWRATE, request)
+    return struct.unpack_from('i', result, 16)[0]
+
+
+def parse_fields(output):
+    """Parse "Key : Value" lines of a wireless tool"""
+    fields = {}
+    for line in output.split('\n'):
+        if ': ' in line:
+            key, value = line.split(': ', 1)
+            fields[key.strip()] = value.strip()
+    return fields
+
+
+def parse_iwconfig(output):
+    """Pick the SSID and bit rate out of iwconfig's output"""
+    fields = {}
+    if 'ESSID:"' in output:
+        fields['SSID'] = output.split('ESSID:"')[1].split('"')[0]
+    if "Bit Rate=" in output:
+        fields['Bit Rate'] = output.split('Bit Rate=')[1].split(' ')[0] + " Mb/s"
+    return fields
+
+
+class WirelessMonitor:
+    """
+    Cached wireless link information of this computer, as {label: value}
+    ready for display (empty without a wireless link)
+    """
+    def __init__(self, interval=WIRELESS_INTERVAL):
+        self.interval = interval
+        self.info = {}
+        self.next_refresh = 0.0
+        # Background thread running the wireless tool, if any
+        self.thread = None
+        # Use sysfs and ioctls when the kernel exposes them
+        self.native = SYSTEM == 'Linux' and fcntl is not None and os.path.isdir(SYS_NET_PATH)
+
+    def get_info(self):
+        """Get the latest wireless information, refreshing it when due"""
+        now = time.monotonic()
+        if now >= self.next_refresh:
+            self.next_refresh = now + self.interval
+            if self.native:
+                self.info = self.read_linux()
+            elif SYSTEM in COMMANDS and (self.thread is None or not self.thread.is_alive()):
+                self.thread = threading.Thread(target=self.run_command, daemon=True)
+                self.thread.start()
+        return self.info
+
+    def read_linux(self):
+        """Read the first wireless interface (preferring a linked one) without forking"""
+        try:
+            names = wireless_interfaces()
+        except OSError:
+            return {}
+        if not names:
+            return {}
+        links = read_proc_wireless()
+        name = next((name for name in names if name in links), names[0])
+
+        info = {'Interface': name}
+        try:
+            with open(os.path.join(SYS_NET_PATH, name, 'operstate')) as f:
+                info['State'] = f.read().strip()
+        except OSError:
+            pass
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            try:
+                essid = ioctl_essid(sock, name)
+                if essid:
+                    info['SSID'] = essid
+            except OSError:
+                pass
+            try:
+                rate = ioctl_bitrate(sock, name)
+                if rate > 0:
+                    info['Bit Rate'] = f"{rate / 1e6:g} Mb/s"
+            except OSError:
+                pass
+        finally:
+            sock.close()
+        if name in links:
+            quality, signal, noise = links[name]
+            info['Link Quality'] = f"{quality:g}/70"
+            info['Signal'] = f"{signal:g} dBm"
+            if noise > -256:
+                info['Noise'] = f"{noise:g} dBm"
+        return info
+
+    def run_command(self):
+        """Run the platform's wireless tool and cache what it reports"""
+        command, keys = COMMANDS[SYSTEM]
+        try:
+            output = subprocess.run(command, capture_output=True, text=True,
+                                    timeout=COMMAND_TIMEOUT).stdout
+        except (OSError, subprocess.SubprocessError):
+            self.info = {}
+            return
+        if SYSTEM == 'Linux':
+            self.info = parse_iwconfig(output)
+            return
+        fields = parse_fields(output)
+        self.info = {key: fields[key] for key in keys if key in fields}
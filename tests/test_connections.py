@@ -0,0 +1,126 @@
+"""
+Tests of connection tracking against fake /proc/net socket tables
+"""
+import socket
+from collections import namedtuple
+
+import pytest
+
+from monitors import connections, procfs
+from monitors.connections import ConnectionTracker
+
+HEADER = ('  sl  local_address rem_address   st tx_queue rx_queue tr tm->when '
+          'retrnsmt   uid  timeout inode\n')
+
+Connection = namedtuple('Connection', 'fd family type laddr raddr status pid')
+
+
+def socket_line(index, local, remote, state):
+    return (f"{index:4}: {local} {remote} {state} 00000000:00000000 00:00000000 "
+            f"00000000  1000        0 {1000 + index} 1 0000000000000000 20 4 30 10 -1\n")
+
+
+@pytest.fixture
+def proc(tmp_path, monkeypatch):
+    """Fake /proc whose socket tables are rewritten by write(proto, entries)"""
+    (tmp_path / 'net').mkdir()
+    (tmp_path / 'stat').write_text('cpu  1 0 1 100 0 0 0 0 0 0\n')
+
+    def write(proto, entries):
+        lines = [socket_line(i, *entry) for i, entry in enumerate(entries)]
+        (tmp_path / 'net' / proto).write_text(HEADER + ''.join(lines))
+
+    for proto in procfs.SOCKET_TABLES:
+        write(proto, [])
+    monkeypatch.setattr(procfs, 'PROC_PATH', str(tmp_path))
+    monkeypatch.setattr(procfs, 'available', lambda: True)
+    return write
+
+
+# 127.0.0.1:8080 listening, and connections to it from 127.0.0.1 and 10.0.0.2
+LISTEN = ('0100007F:1F90', '00000000:0000', '0A')
+LOCAL = ('0100007F:1F90', '0100007F:C350', '01')
+REMOTE = ('0100007F:1F90', '0200000A:C351', '01')
+
+
+def test_rows_are_decoded(proc):
+    # ::1 port 443, listening
+    proc('tcp6', [('00000000000000000000000001000000:01BB',
+                   '00000000000000000000000000000000:0000', '0A')])
+    proc('udp', [('00000000:0035', '00000000:0000', '07')])
+    tracker = ConnectionTracker(backend='procfs')
+    added, closed, changed = tracker.update()
+    assert (closed, changed) == ([], [])
+    rows = {row['proto']: row for row in added}
+    assert dict(rows['tcp6']) == {'proto': 'tcp6', 'family': 'IPv6', 'type': 'TCP',
+                                  'local_addr': ('::1', 443), 'remote_addr': (),
+                                  'status': 'LISTEN'}
+    # UDP sockets have no state
+    assert rows['udp']['local_addr'] == ('0.0.0.0', 53)
+    assert rows['udp']['status'] == 'NONE'
+
+
+def test_updates_report_only_the_differences(proc):
+    proc('tcp', [LISTEN, LOCAL])
+    tracker = ConnectionTracker(backend='procfs')
+    added, closed, changed = tracker.update()
+    assert len(added) == 2 and not closed and not changed
+    connections_before = tracker.connections
+
+    # Nothing changed: nothing is reported and the table is reused
+    assert tracker.update() == ([], [], [])
+    assert tracker.connections is connections_before
+
+    # One connection arrives, one closes and the listener's state changes
+    proc('tcp', [REMOTE, (LISTEN[0], LISTEN[1], '07')])
+    added, closed, changed = tracker.update()
+    assert [row['remote_addr'] for row in added] == [('10.0.0.2', 50001)]
+    assert [row['remote_addr'] for row in closed] == [('127.0.0.1', 50000)]
+    assert [row['status'] for row in changed] == ['CLOSE']
+    assert len(tracker.connections) == 2
+    assert tracker.generation == 3
+
+
+def test_counts_follow_the_differences(proc):
+    proc('tcp', [LISTEN, LOCAL, REMOTE])
+    tracker = ConnectionTracker(backend='procfs')
+    tracker.update()
+    summary = tracker.summary()
+    assert summary['count'] == 3
+    assert summary['states'] == {'LISTEN': 1, 'ESTABLISHED': 2}
+    assert summary['protocols'] == {'tcp': 3}
+    assert sorted(summary['remote_hosts']) == [['10.0.0.2', 1], ['127.0.0.1', 1]]
+
+    # Counts that fall to zero are dropped
+    proc('tcp', [LISTEN, (REMOTE[0], REMOTE[1], '08')])
+    tracker.update()
+    summary = tracker.summary()
+    assert summary['count'] == 2
+    assert summary['states'] == {'LISTEN': 1, 'CLOSE_WAIT': 1}
+    assert summary['remote_hosts'] == [['10.0.0.2', 1]]
+
+
+def test_kind_selects_the_tables(proc):
+    proc('tcp', [LISTEN])
+    proc('udp', [('00000000:0035', '00000000:0000', '07')])
+    tracker = ConnectionTracker(backend='procfs')
+    added, _, _ = tracker.update('udp')
+    assert [row['proto'] for row in added] == ['udp']
+    with pytest.raises(ValueError):
+        tracker.update('unix')
+
+
+def test_psutil_backend(monkeypatch):
+    table = [Connection(3, socket.AF_INET, socket.SOCK_STREAM, ('127.0.0.1', 8080), (),
+                        'LISTEN', None),
+             Connection(4, socket.AF_INET6, socket.SOCK_DGRAM, ('::', 53), (), 'NONE', None)]
+    monkeypatch.setattr(connections.psutil, 'net_connections', lambda kind: list(table))
+    tracker = ConnectionTracker(backend='psutil')
+    added, _, _ = tracker.update()
+    assert sorted(row['proto'] for row in added) == ['tcp', 'udp6']
+
+    table[0] = table[0]._replace(raddr=(), status='CLOSE')
+    added, closed, changed = tracker.update()
+    assert (added, closed) == ([], [])
+    assert [(row['local_addr'], row['status']) for row in changed] == \
+        [(('127.0.0.1', 8080), 'CLOSE')]
@@ -0,0 +1,103 @@
+"""
+Tests of the directory size scanner and its cache, on a temporary tree
+"""
+import os
+
+import pytest
+
+from monitors.dir_scanner import DirScanner, DirSizeCache, allocated
+
+
+def scan(root, cache=None):
+    scanner = DirScanner(str(root), cache=cache, workers=2)
+    scanner.start()
+    assert scanner.finished.wait(10.0)
+    return scanner.progress()
+
+
+def write(path, size):
+    with open(path, 'ab') as f:
+        f.write(os.urandom(size))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def du(root):
+    """Allocated bytes below root, counting hard links once, as du does"""
+    seen = set()
+    total = allocated(os.lstat(root))
+    for directory, subdirs, files in os.walk(root):
+        for name in subdirs + files:
+            info = os.lstat(os.path.join(directory, name))
+            if info.st_ino not in seen:
+                seen.add(info.st_ino)
+                total += allocated(info)
+    return total
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / 'a' / 'deep').mkdir(parents=True)
+    (tmp_path / 'b').mkdir()
+    write(tmp_path / 'a' / 'one', 10000)
+    write(tmp_path / 'a' / 'deep' / 'two', 50000)
+    write(tmp_path / 'b' / 'three', 20000)
+    write(tmp_path / 'top', 1000)
+    return tmp_path
+
+
+def test_sizes_match_du(tree):
+    progress = scan(tree)
+    assert progress['done'] and not progress['errors']
+    assert progress['size'] == du(tree)
+    assert progress['files'] == 4
+    assert progress['directories'] == 4
+    assert [name for name, size in progress['children']] == ['a', 'b', None]
+
+
+def test_hard_links_are_counted_once(tree):
+    os.link(tree / 'a' / 'deep' / 'two', tree / 'b' / 'two-again')
+    cache = DirSizeCache()
+    for _ in range(2):
+        progress = scan(tree, cache)
+        assert progress['size'] == du(tree)
+        assert progress['files'] == 4
+
+
+def test_rescans_reuse_unchanged_listings(tree):
+    cache = DirSizeCache()
+    scan(tree, cache)
+    assert len(cache) == 4
+    progress = scan(tree, cache)
+    assert progress['cached_directories'] == 4
+
+    # A new file changes its directory, which is listed again
+    write(tree / 'b' / 'four', 30000)
+    progress = scan(tree, cache)
+    assert progress['cached_directories'] == 3
+    assert progress['size'] == du(tree)
+    assert progress['files'] == 5
+
+
+def test_files_that_grow_in_place_are_measured_again(tree):
+    cache = DirSizeCache()
+    scan(tree, cache)
+    mtime = os.stat(tree / 'a' / 'deep').st_mtime_ns
+    write(tree / 'a' / 'deep' / 'two', 200000)
+    assert os.stat(tree / 'a' / 'deep').st_mtime_ns == mtime
+
+    progress = scan(tree, cache)
+    assert progress['cached_directories'] == 4
+    assert progress['size'] == du(tree)
+
+
+def test_removed_entries_are_skipped(tree):
+    cache = DirSizeCache()
+    scan(tree, cache)
+    # Pretend the directory's mtime did not move when a file went away
+    mtime = os.stat(tree / 'b').st_mtime_ns
+    os.remove(tree / 'b' / 'three')
+    os.utime(tree / 'b', ns=(mtime, mtime))
+    progress = scan(tree, cache)
+    assert progress['size'] == du(tree)
+    assert progress['files'] == 3
@@ -0,0 +1,59 @@
+"""
+Tests of the OpenMetrics exporter and of the daemon enabling its families
+"""
+import urllib.request
+
+import pytest
+
+from monitors.daemon import build_daemon, parse_args
+from monitors.exporter import MetricsExporter
+
+
+@pytest.fixture
+def daemon():
+    daemon = build_daemon(parse_args(['--no-log', '--metrics-port', '0',
+                                      '--top-processes', '3']))
+    yield daemon
+    daemon.exporter.stop()
+
+
+def test_exporter_enables_the_process_family():
+    assert 'process' in parse_args(['--metrics-port', '9839']).families
+    assert 'process' not in parse_args([]).families
+    # An explicit list is kept as given
+    assert parse_args(['--metrics-port', '9839', '--collectors', 'cpu']).families == ['cpu']
+
+
+def test_scrape_serves_every_family(daemon):
+    for family in daemon.families:
+        daemon.collect(family)
+    daemon.exporter.start()
+    url = f"http://127.0.0.1:{daemon.exporter.port}/metrics"
+    with urllib.request.urlopen(url) as response:
+        text = response.read().decode()
+    assert text.endswith('# EOF\n')
+    assert 'resmon_cpu_core_usage_percent{core="0"}' in text
+    assert 'resmon_network_receive_errors_total{interface="lo"}' in text
+    assert 'resmon_network_transmit_drops_total{' in text
+    process_lines = [line for line in text.splitlines()
+                     if line.startswith('resmon_process_cpu_percent{')]
+    assert 0 < len(process_lines) <= 3
+
+
+def test_disk_timings_are_exported_in_seconds():
+    exporter = MetricsExporter()
+    exporter.update('storage', {
+        'partitions': [],
+        'per_disk': {'sda': {'read_bytes': 1, 'write_bytes': 2, 'read_count': 3,
+                             'write_count': 4, 'read_time': 1500, 'write_time': 500,
+                             'busy_time': 2000, 'in_flight': 0},
+                     # psutil on some platforms has no timings
+                     'disk1': {'read_bytes': 1, 'write_bytes': 2, 'read_count': 3,
+                               'write_count': 4}},
+        'disk_stats': {'sda': {'util_percent': 12.5}}
+    })
+    text = exporter.get_payload().decode()
+    assert 'resmon_disk_io_time_seconds_total{device="sda"} 2.0' in text
+    assert 'resmon_disk_read_time_seconds_total{device="sda"} 1.5' in text
+    assert 'resmon_disk_io_time_seconds_total{device="disk1"}' not in text
+    assert 'resmon_disk_utilisation_percent{device="sda"} 12.5' in text
@@ -0,0 +1,106 @@
+"""
+Tests of the in-memory history store
+"""
+import time
+
+import pytest
+
+from monitors.history import HistoryStore, RingBuffer, RollupTier, sample_time, slope
+
+real_time = time.time
+
+
+def samples(segments):
+    """Flatten (timestamps, values) segments into a list of pairs"""
+    return [pair for timestamps, values in segments for pair in zip(timestamps, values)]
+
+
+def test_ring_buffer_keeps_the_latest_samples_in_order():
+    buffer = RingBuffer(4)
+    for i in range(10):
+        buffer.append(float(i), i * 10.0)
+    assert len(buffer) == 4
+    assert buffer.latest() == (9.0, 90.0)
+    assert samples(buffer.last(3)) == [(7.0, 70.0), (8.0, 80.0), (9.0, 90.0)]
+    # The retained samples wrap around the end of the arrays
+    assert samples(buffer.between(6.5, 9.0)) == [(7.0, 70.0), (8.0, 80.0)]
+
+
+def test_rollup_buckets():
+    tier = RollupTier(10, 4)
+    for timestamp, value in [(0, 1.0), (5, 3.0), (12, 2.0), (25, 7.0), (27, 5.0)]:
+        tier.add(float(timestamp), value)
+    # The open bucket (20 s) is not visible yet
+    (starts, mins, maxs, means, lasts), = tier.between(0.0, 100.0)
+    assert list(starts) == [0.0, 10.0]
+    assert list(mins) == [1.0, 2.0]
+    assert list(maxs) == [3.0, 2.0]
+    assert list(means) == [2.0, 2.0]
+    assert list(lasts) == [3.0, 2.0]
+    tier.close()
+    assert len(tier) == 3 and tier.means[2] == 6.0
+
+
+def test_query_picks_the_coarsest_tier_within_the_resolution():
+    store = HistoryStore(capacity=100, tiers=((10, 10), (60, 10)))
+    for i in range(200):
+        store.append('cpu.total', float(i), float(i))
+    width, segments = store.query('cpu.total', 0.0, 200.0, resolution=30)
+    assert width == 10
+    # Ten buckets are retained; the one starting at 190 s is still open
+    assert [start for segment in segments for start in segment[0]] == \
+        [float(start) for start in range(90, 190, 10)]
+    width, segments = store.query('cpu.total', 150.0, 160.0)
+    assert width == 0
+    assert list(segments[0][0]) == [float(i) for i in range(150, 160)]
+
+
+def test_only_matching_series_get_rollups():
+    store = HistoryStore(capacity=10, max_rollups=1)
+    store.append('cpu.total', 0.0, 1.0)
+    store.append('cpu.core.0', 0.0, 1.0)
+    store.append('memory.ram.used', 0.0, 1.0)
+    assert list(store.rollups) == ['cpu.total']
+
+
+def test_full_store_keeps_live_series(capsys):
+    store = HistoryStore(capacity=10, max_series=2)
+    store.append('a', 0.0, 1.0)
+    store.append('b', 0.0, 1.0)
+    store.append('c', 1.0, 1.0)
+    store.append('d', 1.0, 1.0)
+    assert store.names() == ['a', 'b']
+    # Reported once, not on every refused sample
+    assert capsys.readouterr().err.count('not recorded') == 1
+    store.append('a', 1.0, 2.0)
+    assert store.get('a').latest() == (1.0, 2.0)
+    store.drop('b')
+    store.append('c', 2.0, 3.0)
+    assert 'c' in store
+
+
+def test_slope():
+    assert slope([([0.0, 1.0, 2.0], [1.0, 3.0, 5.0])]) == pytest.approx(2.0)
+    assert slope([([0.0], [1.0])]) is None
+
+
+def test_samples_stay_ordered_when_the_clock_goes_back():
+    store = HistoryStore(capacity=10, tiers=((10, 10),))
+    store.append('cpu.total', 100.0, 1.0)
+    store.append('cpu.total', 125.0, 2.0)
+    # e.g. a remote agent whose clock was stepped back
+    store.append('cpu.total', 50.0, 3.0)
+    buffer = store.get('cpu.total')
+    assert samples(buffer.between(0.0, 200.0)) == [(100.0, 1.0), (125.0, 2.0), (125.0, 3.0)]
+    tier, = store.rollups['cpu.total']
+    tier.close()
+    assert list(tier.starts[:len(tier)]) == [100.0, 120.0]
+    assert tier.means[1] == 2.5
+
+
+def test_sample_time_never_decreases(monkeypatch):
+    first = sample_time()
+    # A wall clock step does not move sample timestamps
+    monkeypatch.setattr(time, 'time', lambda: 0.0)
+    assert sample_time() >= first
+    assert abs(first - real_time()) < 5
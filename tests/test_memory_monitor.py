@@ -0,0 +1,150 @@
+"""
+Tests of the /proc/meminfo, /proc/vmstat and /proc/pressure readers and
+the memory monitor built on them, against fake files
+"""
+import pytest
+
+from monitors import memory_monitor, procfs
+from monitors.memory_monitor import MemoryMonitor
+from monitors.procfs import MeminfoReader, PressureReader, VmstatReader
+
+MEMINFO = """\
+MemTotal:       16000000 kB
+MemFree:         2000000 kB
+MemAvailable:    6000000 kB
+Buffers:          500000 kB
+Cached:          3000000 kB
+SwapCached:            0 kB
+Shmem:            250000 kB
+Slab:             400000 kB
+SReclaimable:     300000 kB
+SwapTotal:       4000000 kB
+SwapFree:        3000000 kB
+Dirty:              1200 kB
+Writeback:             0 kB
+CommitLimit:    12000000 kB
+Committed_AS:   20000000 kB
+HugePages_Total:       4
+HugePages_Free:        1
+Hugepagesize:       2048 kB
+"""
+
+VMSTAT = """\
+nr_free_pages 500000
+pgfault 1000
+pgmajfault 10
+pswpin 2
+pswpout 5
+"""
+
+PRESSURE = {
+    'cpu': "some avg10=1.50 avg60=0.75 avg300=0.20 total=123456\n"
+           "full avg10=0.00 avg60=0.00 avg300=0.00 total=0\n",
+    'memory': "some avg10=12.00 avg60=4.00 avg300=1.00 total=999\n"
+              "full avg10=8.25 avg60=2.50 avg300=0.50 total=500\n"
+}
+
+
+@pytest.fixture
+def proc(tmp_path, monkeypatch):
+    """Fake /proc with the memory files; returns a function to rewrite them"""
+    (tmp_path / 'pressure').mkdir()
+    (tmp_path / 'stat').write_text('cpu  1 0 1 100 0 0 0 0 0 0\n')
+
+    def write(name, text):
+        (tmp_path / name).write_text(text)
+
+    write('meminfo', MEMINFO)
+    write('vmstat', VMSTAT)
+    for resource, text in PRESSURE.items():
+        write(f'pressure/{resource}', text)
+    monkeypatch.setattr(procfs, 'PROC_PATH', str(tmp_path))
+    monkeypatch.setattr(procfs, 'available', lambda: True)
+    return write
+
+
+def test_meminfo_is_read_in_bytes(proc):
+    mem = MeminfoReader().read()
+    assert mem['MemTotal'] == 16000000 * 1024
+    # Huge page counts have no unit
+    assert mem['HugePages_Total'] == 4
+    # Fields nobody asked for are skipped
+    assert 'SwapCached' not in mem
+
+    info = MeminfoReader.memory_info(mem)
+    assert info['available'] == 6000000 * 1024
+    assert info['used'] == 10000000 * 1024
+    assert info['percent'] == 62.5
+
+    swap = MeminfoReader.swap_info(mem)
+    assert swap['used'] == 1000000 * 1024
+    assert swap['percent'] == 25.0
+
+
+def test_meminfo_breakdown(proc):
+    breakdown = MeminfoReader.breakdown(MeminfoReader().read())
+    assert breakdown['cached'] == 3000000 * 1024
+    assert breakdown['slab_reclaimable'] == 300000 * 1024
+    assert breakdown['committed_as'] == 20000000 * 1024
+    assert breakdown['hugepages_total'] == 4 * 2048 * 1024
+    assert breakdown['hugepages_free'] == 2048 * 1024
+
+
+def test_meminfo_without_available_is_estimated(proc):
+    proc('meminfo', "MemTotal: 1000 kB\nMemFree: 100 kB\nBuffers: 50 kB\nCached: 200 kB\n")
+    info = MeminfoReader.memory_info(MeminfoReader().read())
+    assert info['available'] == 350 * 1024
+    assert info['percent'] == 65.0
+
+
+def test_malformed_files_are_refused(proc):
+    proc('meminfo', "MemFree: 100 kB\n")
+    with pytest.raises(ValueError):
+        MeminfoReader().read()
+    proc('vmstat', "pgfault 1000\n")
+    with pytest.raises(ValueError):
+        VmstatReader().read()
+    # open_reader() falls back to psutil instead
+    assert procfs.open_reader(VmstatReader) is None
+
+
+def test_vmstat(proc):
+    assert VmstatReader().read() == {'pgfault': 1000, 'pgmajfault': 10,
+                                     'pswpin': 2, 'pswpout': 5}
+
+
+def test_pressure(proc):
+    pressure = PressureReader().read()
+    # No io file: the resource is left out
+    assert set(pressure) == {'cpu', 'memory'}
+    assert pressure['memory']['full'] == {'avg10': 8.25, 'avg60': 2.5, 'avg300': 0.5,
+                                          'total': 500}
+    assert pressure['cpu']['some']['total'] == 123456
+
+
+def test_pressure_without_any_file(proc, tmp_path):
+    for resource in PRESSURE:
+        (tmp_path / 'pressure' / resource).unlink()
+    with pytest.raises(OSError):
+        PressureReader()
+    assert MemoryMonitor().get_pressure() == {}
+
+
+def test_paging_rates(proc, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(memory_monitor.time, 'monotonic', lambda: now[0])
+    monitor = MemoryMonitor()
+    monitor.get_paging_rates()
+    proc('vmstat', "pgfault 1600\npgmajfault 30\npswpin 2\npswpout 9\n")
+    now[0] = 102.0
+    rates = monitor.get_paging_rates()
+    assert rates == {'page_faults': 300.0, 'major_faults': 10.0, 'swap_in': 0.0,
+                     'swap_out': 2 * memory_monitor.PAGE_SIZE}
+
+
+def test_all_info_from_one_meminfo_read(proc):
+    info = MemoryMonitor().get_all_info()
+    assert info['ram']['total'] == 16000000 * 1024
+    assert info['swap']['free'] == 3000000 * 1024
+    assert info['breakdown']['dirty'] == 1200 * 1024
+    assert info['pressure']['memory']['some']['avg10'] == 12.0
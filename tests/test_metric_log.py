@@ -0,0 +1,107 @@
+"""
+Tests of the on-disk metric log
+"""
+import os
+
+import pytest
+
+from monitors import metric_log
+from monitors.history import HistoryStore
+from monitors.metric_log import (MetricLogReader, MetricLogWriter, list_segments,
+                                 read_trailer, restore_history)
+
+
+def read_series(reader, name, start_time=0.0, end_time=float('inf')):
+    """Get the samples of a series as a list of (timestamp, value) pairs"""
+    return [pair for timestamps, values in reader.read(name, start_time, end_time)
+            for pair in zip(timestamps, values)]
+
+
+def write(directory, samples, **options):
+    """Write (name, timestamp, value) samples, one flush each, leaving the segment open"""
+    writer = MetricLogWriter(str(directory), **options)
+    for name, timestamp, value in samples:
+        writer.append(name, timestamp, value)
+        writer.flush()
+    return writer
+
+
+def test_sealed_round_trip(tmp_path):
+    writer = write(tmp_path, [('a', 1.0, 10.0), ('b', 1.0, 20.0), ('a', 2.0, 11.0)])
+    writer.close()
+    path, = list_segments(str(tmp_path))
+    with open(path, 'rb') as f:
+        assert read_trailer(f.read()) is not None
+
+    reader = MetricLogReader(str(tmp_path))
+    assert reader.series_names() == ['a', 'b']
+    assert read_series(reader, 'a') == [(1.0, 10.0), (2.0, 11.0)]
+    assert read_series(reader, 'a', 1.5, 3.0) == [(2.0, 11.0)]
+    reader.close()
+
+
+def test_torn_tail_is_dropped_and_the_segment_sealed(tmp_path):
+    writer = write(tmp_path, [('a', 1.0, 10.0), ('a', 2.0, 11.0)])
+    # A crash: the segment is never sealed and the last write is torn
+    os.write(writer.fd, b'DATA\x40\x00\x00\x00garbage')
+    os.close(writer.fd)
+    writer.lock_file.close()
+    path, = list_segments(str(tmp_path))
+
+    MetricLogWriter(str(tmp_path)).close()
+    with open(path, 'rb') as f:
+        assert read_trailer(f.read()) is not None
+    reader = MetricLogReader(str(tmp_path))
+    assert read_series(reader, 'a') == [(1.0, 10.0), (2.0, 11.0)]
+    reader.close()
+
+
+def test_segments_rotate_by_size(tmp_path):
+    writer = write(tmp_path, [('a', float(i), float(i)) for i in range(5)], segment_size=1)
+    writer.close()
+    assert len(list_segments(str(tmp_path))) == 5
+    reader = MetricLogReader(str(tmp_path))
+    assert [value for _, value in read_series(reader, 'a')] == [0.0, 1.0, 2.0, 3.0, 4.0]
+    reader.close()
+
+
+def test_unsealed_segments_are_remapped_and_the_old_map_closed(tmp_path):
+    writer = write(tmp_path, [('a', 1.0, 10.0)])
+    reader = MetricLogReader(str(tmp_path))
+    first, = reader.open_segments()
+    assert read_series(reader, 'a') == [(1.0, 10.0)]
+
+    writer.append('a', 2.0, 11.0)
+    writer.flush()
+    second, = reader.open_segments()
+    assert second is not first
+    assert first.map.closed
+    assert read_series(reader, 'a') == [(1.0, 10.0), (2.0, 11.0)]
+    reader.close()
+    writer.close()
+
+
+def test_one_writer_per_directory(tmp_path):
+    if metric_log.fcntl is None:
+        pytest.skip("no flock on this platform")
+    writer = MetricLogWriter(str(tmp_path))
+    with pytest.raises(OSError):
+        MetricLogWriter(str(tmp_path))
+    writer.close()
+    MetricLogWriter(str(tmp_path)).close()
+
+
+def test_restore_history(tmp_path):
+    writer = write(tmp_path, [('cpu.total', 100.0, 1.0), ('cpu.total', 950.0, 2.0),
+                              ('proc.42.rss', 950.0, 3.0)])
+    writer.close()
+    writer = write(tmp_path, [('cpu.total', 990.0, 4.0)])
+
+    history = HistoryStore(capacity=10)
+    # The unsealed segment of the running writer is read too
+    restore_history(history, str(tmp_path), seconds=100.0, now=1000.0)
+    writer.close()
+    assert history.names() == ['cpu.total']
+    buffer = history.get('cpu.total')
+    assert [pair for segment in buffer.between(0.0, 2000.0) for pair in zip(*segment)] == \
+        [(950.0, 2.0), (990.0, 4.0)]
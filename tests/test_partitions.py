@@ -0,0 +1,62 @@
+"""
+Tests of the partition cache against fake mounts
+"""
+import threading
+import time
+from collections import namedtuple
+
+import pytest
+
+from monitors import partitions
+from monitors.partitions import PartitionCache
+
+Partition = namedtuple('Partition', 'device mountpoint fstype opts')
+
+
+@pytest.fixture
+def mounts(monkeypatch):
+    """Fake mount table, with usage reads that block while a mount is hung"""
+    table = [Partition('/dev/sda1', '/', 'ext4', 'rw'),
+             Partition('server:/export', '/mnt/nfs', 'nfs4', 'rw'),
+             Partition('proc', '/proc', 'proc', 'rw')]
+    hung = threading.Event()
+    reads = []
+
+    def usage_of(mountpoint):
+        reads.append((mountpoint, threading.current_thread()))
+        if mountpoint == '/mnt/nfs':
+            hung.wait()
+        return 100, 40, 60, 40.0
+
+    monkeypatch.setattr(partitions.procfs, 'available', lambda: False)
+    monkeypatch.setattr(partitions.psutil, 'disk_partitions', lambda all=False: table)
+    monkeypatch.setattr(partitions, 'usage_of', usage_of)
+    monkeypatch.setattr(partitions, 'USAGE_TIMEOUT', 0.1)
+    yield table, reads
+    hung.set()
+
+
+def test_usage_is_never_read_on_the_sampling_thread(mounts):
+    _, reads = mounts
+    cache = PartitionCache()
+    start = time.monotonic()
+    listed = cache.get_partitions()
+    assert time.monotonic() - start < 1.0
+    # The local mount is listed from the first sample; the hung one is not
+    assert [(p.mountpoint, stale) for p, usage, stale in listed] == [('/', False)]
+    assert all(thread is not threading.current_thread() for _, thread in reads)
+
+    # Local usage is cached between refreshes
+    count = len(reads)
+    cache.get_partitions()
+    assert len(reads) == count
+
+
+def test_slow_usage_is_reported_stale(mounts):
+    cache = PartitionCache()
+    cache.get_partitions()
+    nfs = cache.usages['/mnt/nfs']
+    nfs.usage, nfs.updated = (10, 1, 9, 10.0), time.monotonic()
+    time.sleep(0.15)
+    listed = {p.mountpoint: stale for p, usage, stale in cache.get_partitions()}
+    assert listed == {'/': False, '/mnt/nfs': True}
@@ -0,0 +1,83 @@
+"""
+Tests of the process search index and the command lines it is given
+"""
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+from monitors.process_index import ProcessIndex, parse_query
+from monitors.process_monitor import ProcessMonitor
+
+
+class FakeEntry:
+    """
+    The fields of a ProcessEntry that the index reads
+    """
+    def __init__(self, pid, name, username='alice', status='sleeping', cmdline=None):
+        self.key = (pid, 0.0)
+        self.name = name
+        self.username = username
+        self.status = status
+        self.cmdline = cmdline
+
+
+@pytest.fixture
+def index():
+    index = ProcessIndex()
+    index.apply([FakeEntry(1, 'systemd', 'root'),
+                 FakeEntry(2, 'python3', cmdline='python3 -m http.server'),
+                 FakeEntry(3, 'Python', status='running', cmdline='python manage.py'),
+                 FakeEntry(4, 'bash', 'bob')], [], {})
+    return index
+
+
+def test_parse_query():
+    words, user, state, cmdline = parse_query('Py user:alice state:Running cmd:http')
+    assert (words, user, state, cmdline.pattern) == (['py'], 'alice', 'running', 'http')
+    with pytest.raises(re.error):
+        parse_query('cmd:(')
+
+
+def test_name_user_and_state_terms(index):
+    assert index.search('pyth') == {2, 3}
+    assert index.search('py') == {2, 3}
+    assert index.search('python user:alice state:running') == {3}
+    assert index.search('user:bob') == {4}
+    assert index.search('user:carol') == set()
+    assert index.search('') == {1, 2, 3, 4}
+
+
+def test_changes_are_applied_in_batches(index):
+    index.apply([FakeEntry(5, 'pythonw')], [2], {3: 'sleeping'})
+    assert index.search('python') == {3, 5}
+    assert index.search('state:running') == set()
+    assert index.search('state:sleeping') == {1, 3, 4, 5}
+    assert 2 not in index.by_user['alice']
+
+
+def test_cmd_terms_only_match_command_lines_that_were_read(index):
+    assert index.search('cmd:HTTP') == {2}
+    # Bash's command line was never read
+    assert index.search('cmd:.') == {2, 3}
+    index.apply([], [], {}, {4: 'bash --login'})
+    assert index.search('cmd:login user:bob') == {4}
+
+
+def test_monitor_reads_command_lines_only_when_asked():
+    child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)',
+                              'marker-argument'])
+    try:
+        monitor = ProcessMonitor()
+        monitor.get_process_list(pids=[os.getpid(), child.pid])
+        assert monitor.registry[child.pid].cmdline is None
+        assert monitor.index.search('cmd:marker') == set()
+
+        monitor.get_process_list(pids=[os.getpid(), child.pid], cmdlines=True)
+        assert 'marker-argument' in monitor.registry[child.pid].cmdline
+        assert monitor.index.search('cmd:marker-arg') == {child.pid}
+    finally:
+        child.kill()
+        child.wait()
@@ -0,0 +1,62 @@
+"""
+Tests of the process sampling loop against real processes
+"""
+import os
+import subprocess
+import time
+
+import psutil
+import pytest
+
+from monitors.process_monitor import ProcessMonitor
+
+
+@pytest.fixture
+def zombie():
+    """A child that exited but was not reaped yet"""
+    child = subprocess.Popen(['true'])
+    deadline = time.monotonic() + 5.0
+    while psutil.Process(child.pid).status() != psutil.STATUS_ZOMBIE:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    yield child.pid
+    child.wait()
+
+
+def test_steady_ticks_do_not_check_for_pid_reuse(monkeypatch):
+    monitor = ProcessMonitor()
+    monitor.get_process_list(pids=[os.getpid()])
+
+    def fail(entry):
+        raise AssertionError("create time read on a steady tick")
+    monkeypatch.setattr(ProcessMonitor, 'same_process', staticmethod(fail))
+    row, = monitor.get_process_list(pids=[os.getpid()])
+    assert row['pid'] == os.getpid()
+
+
+def test_reused_pid_gets_a_fresh_entry():
+    monitor = ProcessMonitor()
+    monitor.get_process_list(pids=[os.getpid()])
+    entry = monitor.registry[os.getpid()]
+    # Pretend the pid belonged to an older, busier process
+    entry.key = (os.getpid(), entry.key[1] - 100)
+    entry.cpu_total += 1000
+    monitor.get_process_list(pids=[os.getpid()])
+    assert monitor.registry[os.getpid()] is not entry
+    assert monitor.registry[os.getpid()].key[1] == psutil.Process().create_time()
+
+
+def test_zombies_are_listed(zombie, monkeypatch):
+    monitor = ProcessMonitor()
+    row, = monitor.get_process_list(pids=[zombie])
+    assert row['status'] == psutil.STATUS_ZOMBIE
+
+    # Platforms that refuse to read a zombie's counters still list it
+    def refuse(process):
+        raise psutil.ZombieProcess(process.pid)
+    monkeypatch.setattr(psutil.Process, 'num_threads', refuse)
+    for monitor in (monitor, ProcessMonitor()):
+        row, = monitor.get_process_list(pids=[zombie])
+        assert row['pid'] == zombie
+        assert row['status'] == psutil.STATUS_ZOMBIE
+    assert zombie in monitor.registry
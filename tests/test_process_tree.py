@@ -0,0 +1,179 @@
+"""
+Tests of the incrementally maintained process tree and its totals
+"""
+import random
+
+import pytest
+
+from monitors.process_tree import ProcessTree, TreeListener
+
+
+def row(pid, ppid, cpu=0.0, rss=0, threads=1, io=0.0, create_time=0.0):
+    return {'pid': pid, 'ppid': ppid, 'cpu_percent': cpu, 'rss': rss,
+            'num_threads': threads, 'io_rate': io, 'create_time': create_time}
+
+
+class Mirror(TreeListener):
+    """
+    Rebuilds the tree from the listener's calls alone, as a Qt model does
+    """
+    def __init__(self):
+        self.children = {None: []}
+        self.pending = None
+        self.changes = []
+
+    def begin_insert(self, parent, index, node):
+        self.pending = ('insert', parent, index, node)
+
+    def end_insert(self):
+        _, parent, index, node = self.pending
+        self.children[parent.pid if parent else None].insert(index, node.pid)
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            self.children[current.pid] = [child.pid for child in current.children]
+            stack.extend(current.children)
+
+    def begin_remove(self, parent, index):
+        self.pending = ('remove', parent, index)
+
+    def end_remove(self):
+        _, parent, index = self.pending
+        del self.children[parent.pid if parent else None][index]
+
+    def changed(self, nodes):
+        self.changes.append({node.pid for node in nodes})
+
+
+def structure(node):
+    return [child.pid for child in node.children]
+
+
+def check(tree, mirror=None):
+    """Check the totals, parent links and the listener's view of the tree"""
+    def visit(node):
+        totals = list(node.own)
+        for child in node.children:
+            assert child.parent is node
+            for i, value in enumerate(visit(child)):
+                totals[i] += value
+        assert node.totals == pytest.approx(totals)
+        if mirror is not None:
+            assert mirror.children[node.pid] == structure(node)
+        return totals
+    for node in tree.root.children:
+        assert node.parent is tree.root
+        visit(node)
+    # Every process is reachable from the top level
+    reachable = set()
+    stack = list(tree.root.children)
+    while stack:
+        node = stack.pop()
+        reachable.add(node.pid)
+        stack.extend(node.children)
+    assert reachable == tree.nodes.keys()
+    if mirror is not None:
+        assert mirror.children[None] == structure(tree.root)
+
+
+def test_children_are_grouped_under_their_parents():
+    tree = ProcessTree()
+    tree.update([row(1, 0, cpu=1.0), row(2, 1, cpu=2.0), row(3, 2, cpu=4.0), row(4, 1, rss=10)])
+    assert structure(tree.root) == [1]
+    assert structure(tree.nodes[1]) == [2, 4]
+    assert tree.nodes[1].totals == [7.0, 10, 4, 0.0]
+    assert tree.nodes[2].totals[0] == 6.0
+
+
+def test_value_changes_update_ancestors():
+    tree = ProcessTree()
+    rows = [row(1, 0, cpu=1.0), row(2, 1, cpu=2.0), row(3, 2, cpu=4.0)]
+    tree.update(rows)
+    mirror_changes = []
+    tree.listener.changed = lambda nodes: mirror_changes.append({n.pid for n in nodes})
+    tree.update([rows[0], rows[1], row(3, 2, cpu=10.0)])
+    assert tree.nodes[1].totals[0] == 13.0
+    assert mirror_changes == [{1, 2, 3}]
+
+
+def test_exits_reparenting_and_pid_reuse():
+    mirror = Mirror()
+    tree = ProcessTree(mirror)
+    tree.update([row(1, 0), row(2, 1, cpu=1.0), row(3, 2, cpu=2.0), row(4, 2, cpu=3.0)])
+    check(tree, mirror)
+
+    # 2 exits: its children wait at the top level
+    tree.update([row(1, 0), row(3, 2, cpu=2.0), row(4, 2, cpu=3.0)])
+    check(tree, mirror)
+    assert structure(tree.root) == [1, 3, 4]
+
+    # 3 is reparented to 1; pid 4 is reused by a process of 1
+    tree.update([row(1, 0), row(3, 1, cpu=2.0), row(4, 1, cpu=5.0, create_time=9.0)])
+    check(tree, mirror)
+    assert structure(tree.nodes[1]) == [3, 4]
+    assert tree.nodes[1].totals[0] == 7.0
+
+    # A parent that shows up after its children adopts them
+    tree.update([row(1, 0), row(3, 1), row(4, 1, create_time=9.0), row(5, 9), row(9, 1)])
+    check(tree, mirror)
+    assert structure(tree.nodes[9]) == [5]
+
+
+def test_parent_cycles_stay_at_the_top_level():
+    tree = ProcessTree()
+    tree.update([row(1, 2), row(2, 1), row(3, 4), row(4, 5), row(5, 3, cpu=1.0)])
+    check(tree)
+    assert len(tree.root.children) == 2
+    # Cycles formed by processes that were already known are refused too
+    tree.update([row(1, 2), row(2, 1), row(3, 4), row(4, 5), row(5, 3, cpu=1.0), row(6, 7),
+                 row(7, 0)])
+    tree.update([row(1, 2), row(2, 1), row(3, 4), row(4, 5), row(5, 3, cpu=1.0), row(6, 7),
+                 row(7, 6)])
+    check(tree)
+
+    # Once the loop is broken, the process kept out of it rejoins its parent
+    tree.update([row(6, 7), row(7, 0)])
+    check(tree)
+    assert structure(tree.root) == [7]
+    assert structure(tree.nodes[7]) == [6]
+
+
+def in_cycle(rows, pid):
+    """Tell whether pid's chain of ppids loops back on itself"""
+    seen = set()
+    while pid in rows:
+        if pid in seen:
+            return True
+        seen.add(pid)
+        pid = rows[pid]['ppid']
+    return False
+
+
+def test_random_updates_match_a_tree_built_from_scratch():
+    generator = random.Random(3)
+    mirror = Mirror()
+    tree = ProcessTree(mirror)
+    rows = {}
+    for step in range(200):
+        for pid in generator.sample(sorted(rows), min(len(rows), 3)):
+            del rows[pid]
+        for _ in range(4):
+            pid = generator.randint(1, 60)
+            rows[pid] = row(pid, generator.choice([0] + sorted(rows)),
+                            cpu=generator.random() * 10, rss=generator.randint(0, 100),
+                            create_time=float(step))
+        for pid in generator.sample(sorted(rows), min(len(rows), 5)):
+            rows[pid] = dict(rows[pid], cpu_percent=generator.random() * 10,
+                             io_rate=generator.random())
+        tree.update(list(rows.values()))
+        check(tree, mirror)
+
+        fresh = ProcessTree()
+        fresh.update(list(rows.values()))
+        for pid, node in fresh.nodes.items():
+            if in_cycle(rows, pid):
+                # Where a loop of ppids is cut depends on the order processes appeared
+                continue
+            assert tree.nodes[pid].parent.pid == node.parent.pid
+            assert tree.nodes[pid].totals == pytest.approx(node.totals)
+        assert tree.nodes.keys() == fresh.nodes.keys()
@@ -0,0 +1,56 @@
+"""
+Tests of counter deltas and per-second rates
+"""
+from monitors.rates import RateCalculator, counter_delta, sum_rates
+
+
+def test_counter_delta_growth_and_resets():
+    assert counter_delta(10, 15) == 5
+    assert counter_delta(10, 10) == 0
+    # Counters of unknown width never wrap
+    assert counter_delta(100, 5) is None
+    assert counter_delta(3 * 2 ** 31, 5) is None
+
+
+def test_counter_delta_corrects_wraps_of_narrow_counters():
+    assert counter_delta(2 ** 32 - 10, 5, bits=32) == 15
+    # Not near the top of the range: a reset
+    assert counter_delta(1000, 5, bits=32) is None
+    # A 64-bit counter reset from where a 32-bit one would wrap
+    assert counter_delta(2 ** 32 - 10, 5, bits=64) is None
+    assert counter_delta(2 ** 64 - 1, 1, bits=64) == 2
+
+
+def test_rates_per_second():
+    rates = RateCalculator()
+    assert rates.update('eth0', {'bytes': 100, 'packets': 1}, 10.0) == \
+        {'bytes': 0.0, 'packets': 0.0}
+    assert rates.update('eth0', {'bytes': 300, 'packets': 5}, 12.0) == \
+        {'bytes': 100.0, 'packets': 2.0}
+    # A timestamp that did not move forward gives no rate
+    assert rates.update('eth0', {'bytes': 500, 'packets': 5}, 12.0)['bytes'] == 0.0
+
+
+def test_rates_wrap_only_declared_counters():
+    widths = {'time': 32}
+    rates = RateCalculator()
+    rates.update('sda', {'time': 2 ** 32 - 100, 'count': 2 ** 32 - 100}, 0.0, widths)
+    assert rates.update('sda', {'time': 100, 'count': 100}, 2.0, widths) == \
+        {'time': 100.0, 'count': 0.0}
+    # Rates resume from the value after a reset
+    assert rates.update('sda', {'time': 300, 'count': 150}, 3.0, widths) == \
+        {'time': 200.0, 'count': 50.0}
+
+
+def test_update_all_forgets_groups_that_disappear():
+    rates = RateCalculator()
+    rates.update_all({'a': {'x': 1}, 'b': {'x': 1}}, 0.0)
+    assert rates.update_all({'a': {'x': 3}}, 1.0) == {'a': {'x': 2.0}}
+    # 'b' comes back and starts over rather than spanning its absence
+    assert rates.update_all({'a': {'x': 3}, 'b': {'x': 50}}, 2.0)['b'] == {'x': 0.0}
+
+
+def test_sum_rates():
+    groups = [{'bytes': 1.0, 'packets': 2.0}, {'bytes': 3.0}]
+    assert sum_rates(groups, ['bytes', 'packets']) == {'bytes': 4.0, 'packets': 2.0}
+    assert sum_rates([], {'bytes': 0}) == {'bytes': 0.0}
@@ -0,0 +1,310 @@
+"""
+Tests of the remote agent protocol against agents on the loopback interface
+"""
+import os
+import socket
+import threading
+import time
+import zlib
+
+import pytest
+
+from monitors import remote
+from monitors.remote import (SEP, Aggregator, AgentServer, FrameDecoder, FrameEncoder,
+                             RemoteHost, diff, flatten, unflatten)
+
+
+def wait_for(condition, timeout=5.0):
+    """Poll condition until it is true, failing the test after timeout"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            pytest.fail("timed out waiting for a condition")
+        time.sleep(0.01)
+
+
+class Received:
+    """
+    Collects the snapshots an Aggregator publishes, by host and family
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshots = []
+
+    def __call__(self, host, family, snapshot):
+        with self.lock:
+            self.snapshots.append((host, family, snapshot))
+
+    def latest(self, family):
+        with self.lock:
+            for _, received_family, snapshot in reversed(self.snapshots):
+                if received_family == family:
+                    return snapshot
+        return None
+
+
+def thaw(value):
+    """Turn a frozen snapshot back into plain dicts and lists"""
+    if hasattr(value, 'items'):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+@pytest.fixture
+def server():
+    server = AgentServer('127.0.0.1:0', hostname='test-agent')
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def aggregator():
+    received = Received()
+    aggregator = Aggregator(received)
+    aggregator.received = received
+    aggregator.start()
+    yield aggregator
+    aggregator.stop()
+
+
+def address_of(server):
+    host, port = server.bound_address[:2]
+    return f"{host}:{port}"
+
+
+def test_unflatten_round_trip():
+    snapshot = {
+        'ram': {'total': 8, 'percent': 12.5},
+        'per_cpu': [1.0, 2.0, 3.0],
+        'partitions': [{'device': '/dev/sda1', 'opts': []}, {'device': '/dev/sdb1', 'opts': ['ro']}],
+        'empty': {},
+        'name': None,
+        # Ten or more list items must keep their numeric order
+        'cores': list(range(12))
+    }
+    assert unflatten(flatten(snapshot)) == snapshot
+    assert unflatten(flatten(42)) == 42
+    assert unflatten(flatten([])) == []
+
+
+def test_diff_applies_to_the_previous_state():
+    old = flatten({'a': 1, 'b': [1, 2, 3], 'c': {'d': 4}})
+    new = flatten({'a': 2, 'b': [1, 2], 'c': {'d': 4, 'e': 5}})
+    changed, removed = diff(old, new)
+    assert SEP + '.c' + SEP + '.d' not in changed
+    host = RemoteHost('test')
+    host.apply('key', 'static', 0.0, old)
+    assert thaw(host.apply('delta', 'static', 0.0, [changed, removed])) == \
+        {'a': 2, 'b': [1, 2], 'c': {'d': 4, 'e': 5}}
+
+
+def test_frames_survive_partial_reads():
+    encoder = FrameEncoder()
+    decoder = FrameDecoder()
+    buffer = bytearray(encoder.encode('key', 'cpu', 1.0, {'x': 1}) +
+                       encoder.encode('delta', 'cpu', 2.0, [{'x': 2}, []]))
+    tail = buffer[-3:]
+    del buffer[-3:]
+    assert [frame[0] for frame in decoder.decode(buffer)] == ['key']
+    buffer += tail
+    assert list(decoder.decode(buffer)) == [['delta', 'cpu', 2.0, [{'x': 2}, []]]]
+    assert not buffer
+
+
+def test_values_keep_their_types():
+    encoder = FrameEncoder()
+    decoder = FrameDecoder()
+    flat = {'float': 0.1, 'int': -(1 << 40), 'huge': 1 << 70, 'text': 'caf\u00e9',
+            'none': None, 'yes': True, 'no': False, 'dict': {}, 'list': []}
+    decoded = list(decoder.decode(bytearray(encoder.encode('key', 'x', 1.5, flat))))
+    assert decoded == [['key', 'x', 1.5, flat]]
+    assert [type(value) for value in decoded[0][3].values()] == \
+        [type(value) for value in flat.values()]
+
+
+def test_deltas_only_name_new_paths():
+    encoder = FrameEncoder()
+    decoder = FrameDecoder()
+    old = flatten({'per_cpu': [float(i) for i in range(64)], 'total': 1.0})
+    new = flatten({'per_cpu': [float(i) + 1 for i in range(64)], 'total': 2.0})
+    key = encoder.encode('key', 'cpu', 0.0, old)
+    delta = encoder.encode('delta', 'cpu', 1.0, diff(old, new))
+    # The delta refers to the paths by the ids the keyframe gave them
+    assert b'per_cpu' not in zlib.decompress(delta[4:])
+    frames = list(decoder.decode(bytearray(key + delta)))
+    assert frames[1][3] == [new, []]
+
+    # Either side can start numbering paths over
+    encoder.paths = dict.fromkeys(range(remote.MAX_PATHS))
+    reset = encoder.encode('delta', 'cpu', 2.0, [{SEP + '.total': 3.0}, [SEP + '.gone']])
+    assert list(decoder.decode(bytearray(reset))) == \
+        [['delta', 'cpu', 2.0, [{SEP + '.total': 3.0}, [SEP + '.gone']]]]
+    assert decoder.paths == [SEP + '.total', SEP + '.gone']
+
+
+def test_keyframe_then_deltas(server, aggregator, monkeypatch):
+    monkeypatch.setattr(remote, 'KEYFRAME_INTERVAL', 3)
+    address = address_of(server)
+    aggregator.add_host(address)
+    host = aggregator.get_host(address)
+    wait_for(lambda: host.connected and host.name == 'test-agent')
+
+    for i in range(8):
+        snapshot = {'usage': {'total': float(i), 'per_cpu': [i, i + 1], 'states': {'user': i}},
+                    'count': i}
+        server.publish('cpu', snapshot)
+        wait_for(lambda: aggregator.received.latest('cpu') is not None and
+                 aggregator.received.latest('cpu')['count'] == i)
+        assert thaw(aggregator.received.latest('cpu')) == snapshot
+
+    # Deltas were sent between keyframes, and the history was recorded
+    client, = server.clients.values()
+    assert 0 < client.frames['cpu'] <= 3
+    assert len(host.history.get('cpu.total')) == 8
+
+
+def test_new_clients_get_the_latest_state(server, aggregator):
+    server.publish('memory', {'ram': {'used': 1, 'percent': 1.0, 'available': 2},
+                              'swap': {'used': 0, 'percent': 0.0}})
+    aggregator.add_host(address_of(server))
+    wait_for(lambda: aggregator.received.latest('memory') is not None)
+    assert aggregator.received.latest('memory')['ram']['used'] == 1
+
+
+def test_reconnects_after_the_agent_restarts(aggregator, monkeypatch):
+    monkeypatch.setattr(remote, 'RECONNECT_MIN', 0.05)
+    first = AgentServer('127.0.0.1:0', hostname='first')
+    first.start()
+    address = address_of(first)
+    aggregator.add_host(address)
+    host = aggregator.get_host(address)
+    wait_for(lambda: host.connected and host.name == 'first')
+    first.publish('static', {'value': 1})
+    wait_for(lambda: aggregator.received.latest('static') is not None)
+
+    first.stop()
+    wait_for(lambda: not host.connected)
+
+    second = AgentServer(address, hostname='second')
+    second.start()
+    try:
+        second.publish('static', {'value': 2})
+        wait_for(lambda: host.connected and host.name == 'second', timeout=10.0)
+        # The new connection starts from a keyframe, not the old state
+        wait_for(lambda: aggregator.received.latest('static')['value'] == 2)
+    finally:
+        second.stop()
+
+
+def test_slow_client_only_gets_the_latest_snapshots(server):
+    """Snapshots published while a client is not reading are coalesced"""
+    family, address = remote.parse_address(address_of(server))
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.connect(address)
+    try:
+        wait_for(lambda: len(server.clients) == 1)
+        client, = server.clients.values()
+
+        # Incompressible snapshots fill the socket buffers quickly
+        published = 200
+        for i in range(published):
+            server.publish('blob', {'i': i, 'data': os.urandom(32 * 1024).hex()})
+        time.sleep(0.2)
+        # Only one encoded frame is ever waiting in the client's buffer
+        assert len(client.out) < 256 * 1024
+
+        # Draining the socket delivers the last snapshot, after far fewer frames
+        host = RemoteHost('slow')
+        inbox = bytearray()
+        decoder = FrameDecoder()
+        frames = 0
+        last = None
+        sock.settimeout(2.0)
+        while last is None or last['i'] != published - 1:
+            data = sock.recv(1 << 16)
+            assert data
+            inbox += data
+            for kind, frame_family, timestamp, body in decoder.decode(inbox):
+                if kind == 'hello':
+                    continue
+                frames += 1
+                last = host.apply(kind, frame_family, timestamp, body)
+        assert frames < published
+    finally:
+        sock.close()
+
+
+def test_conflicting_delta_drops_only_that_connection(monkeypatch):
+    """A delta whose paths do not fit the state must not kill the aggregator"""
+    monkeypatch.setattr(remote, 'RECONNECT_MIN', 0.05)
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(4)
+    bad_address = '127.0.0.1:%d' % listener.getsockname()[1]
+
+    good = AgentServer('127.0.0.1:0', hostname='good')
+    good.start()
+    received = Received()
+    aggregator = Aggregator(received)
+    aggregator.start()
+    try:
+        aggregator.add_host(bad_address)
+        aggregator.add_host(address_of(good))
+        conn, _ = listener.accept()
+        # '.a' is a leaf, so a delta adding '.a.b.c' cannot be applied
+        encoder = FrameEncoder()
+        conn.sendall(encoder.encode('hello', None, 0.0, {'host': 'bad'}) +
+                     encoder.encode('key', 'static', 0.0, {f'{SEP}.a': 1}) +
+                     encoder.encode('delta', 'static', 0.0, [{f'{SEP}.a{SEP}.b{SEP}.c': 2}, []]))
+
+        # The aggregator hangs up, reconnects and keeps serving the good agent
+        conn.settimeout(5.0)
+        assert conn.recv(1) == b''
+        conn.close()
+        listener.settimeout(5.0)
+        listener.accept()[0].close()
+        assert aggregator.thread.is_alive()
+        good.publish('static', {'value': 3})
+        wait_for(lambda: received.latest('static') is not None)
+    finally:
+        aggregator.stop()
+        good.stop()
+        listener.close()
+
+
+def test_token_admits_only_aggregators_that_know_it(aggregator, monkeypatch):
+    monkeypatch.setattr(remote, 'RECONNECT_MIN', 0.05)
+    server = AgentServer('127.0.0.1:0', hostname='secret', token=b'right')
+    server.start()
+    outsiders = [Aggregator(Received()) for _ in range(2)]
+    try:
+        server.publish('static', {'value': 1})
+        for outsider, token in zip(outsiders, (b'wrong', None)):
+            outsider.start()
+            outsider.add_host(address_of(server), token=token)
+        aggregator.add_host(address_of(server), token=b'right')
+        host = aggregator.get_host(address_of(server))
+        wait_for(lambda: host.name == 'secret')
+        wait_for(lambda: aggregator.received.latest('static') is not None)
+        time.sleep(0.2)
+        for outsider in outsiders:
+            assert outsider.on_snapshot.latest('static') is None
+            assert outsider.get_host(address_of(server)).name is None
+    finally:
+        for outsider in outsiders:
+            outsider.stop()
+        server.stop()
+
+
+def test_unauthenticated_agent_warns_beyond_loopback(capsys):
+    AgentServer('127.0.0.1:0').stop()
+    assert 'Warning' not in capsys.readouterr().err
+    AgentServer('127.0.0.1:0', token=b'token').stop()
+    AgentServer('0.0.0.0:0', token=b'token').stop()
+    assert 'Warning' not in capsys.readouterr().err
+    AgentServer('0.0.0.0:0').stop()
+    assert 'Warning' in capsys.readouterr().err
@@ -0,0 +1,99 @@
+"""
+Tests of the keyed table model and its sorting and filtering proxy
+"""
+import os
+import random
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+QtCore = pytest.importorskip('PyQt6.QtCore')
+QtWidgets = pytest.importorskip('PyQt6.QtWidgets')
+
+from monitor_windows.table_models import Column, KeyedTableModel, SortFilterProxyModel
+
+Qt = QtCore.Qt
+
+COLUMNS = [
+    Column("Key", lambda r: r['key']),
+    Column("Name", lambda r: r['name']),
+    Column("Value", lambda r: r['value'], numeric=True)
+]
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def make_proxy(rows, order=Qt.SortOrder.DescendingOrder):
+    model = KeyedTableModel(COLUMNS, lambda r: r['key'])
+    model.set_rows(rows)
+    proxy = SortFilterProxyModel()
+    proxy.setSourceModel(model)
+    proxy.sort(2, order)
+    return model, proxy
+
+
+def shown(proxy):
+    return [proxy.index(i, 0).data() for i in range(proxy.rowCount())]
+
+
+def expected(rows, order, needle=''):
+    rows = [r for r in rows if needle in r['name']]
+    ranked = sorted(rows, key=lambda r: r['value'],
+                    reverse=order == Qt.SortOrder.DescendingOrder)
+    return [str(r['key']) for r in ranked]
+
+
+def values(proxy):
+    return [proxy.index(i, 2).data(Qt.ItemDataRole.UserRole) for i in range(proxy.rowCount())]
+
+
+@pytest.mark.parametrize('order', [Qt.SortOrder.AscendingOrder, Qt.SortOrder.DescendingOrder])
+def test_updates_keep_the_rows_sorted_and_filtered(app, order):
+    generator = random.Random(1)
+    rows = {key: {'key': key, 'name': f"p{key % 7}", 'value': generator.randint(0, 20)}
+            for key in range(200)}
+    model, proxy = make_proxy(list(rows.values()), order)
+    proxy.setFilterKeyColumn(1)
+    proxy.setFilterFixedString('p')
+    for step in range(50):
+        for key in generator.sample(sorted(rows), 20):
+            rows[key] = dict(rows[key], value=generator.randint(0, 20))
+        for key in generator.sample(sorted(rows), 3):
+            del rows[key]
+        for key in range(1000 + step * 3, 1003 + step * 3):
+            rows[key] = {'key': key, 'name': f"p{key % 7}", 'value': generator.randint(0, 20)}
+        if step == 25:
+            proxy.setFilterFixedString('p3')
+        model.set_rows(list(rows.values()))
+        assert values(proxy) == sorted(values(proxy), reverse=order == Qt.SortOrder.DescendingOrder)
+        assert sorted(shown(proxy)) == sorted(expected(list(rows.values()), order,
+                                                       'p3' if step >= 25 else 'p'))
+
+
+def test_only_changed_rows_are_signalled(app):
+    rows = [{'key': key, 'name': 'p', 'value': key} for key in range(100)]
+    model, proxy = make_proxy(rows)
+    changes = []
+    moves = []
+    proxy.dataChanged.connect(lambda top, bottom: changes.append((top.row(), bottom.row())))
+    proxy.layoutChanged.connect(lambda: moves.append(True))
+
+    # Same sort value: the row stays put and only it repaints
+    rows[10] = dict(rows[10], name='q')
+    model.set_rows(rows)
+    assert changes == [(89, 89)] and not moves
+
+    # A new sort value moves the row
+    changes.clear()
+    rows[10] = dict(rows[10], value=1000)
+    model.set_rows(rows)
+    assert moves and shown(proxy)[0] == '10'
+    assert changes == [(0, 0)]
+
+    # Unchanged rows signal nothing
+    changes.clear()
+    model.set_rows(list(rows))
+    assert not changes